@@ -0,0 +1,283 @@
+"""Vectorized statistics over sessions and checkpoints for /api/v1/analytics.
+
+Each section bulk-loads the columns it needs with one query per table into
+pandas/NumPy arrays and computes every statistic for all bots at once with
+grouped operations, instead of a query or a Python loop per bot. Timestamps
+arrive as Unix seconds converted by SQLite; only compressed values are
+decoded in Python.
+
+Results are cached per process under the TableVersions counters of the tables
+they read (see migrations/0008_table_versions.sql), so until one of those
+tables changes a request costs one small indexed read.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+import storage_codec
+from content_store import PAYLOAD_FIELDS
+
+QUANTILES = (0.5, 0.9, 0.99)
+# Rule-of-thumb characters per token for English text with BPE tokenizers
+CHARS_PER_TOKEN = 4
+UNIX_EPOCH_JULIAN_DAY = 2440587.5
+
+
+def _unix_seconds(column):
+    return f'ROUND((julianday({column}) - {UNIX_EPOCH_JULIAN_DAY}) * 86400.0, 3)'
+
+
+def _frame(db, sql, dtypes):
+    """All rows of a query as a DataFrame; `dtypes` also fixes the types of empty results"""
+    cursor = db.cursor()
+    # Plain tuples are cheaper than a sqlite3.Row per row for bulk loads
+    cursor.row_factory = None
+    cursor.execute(sql)
+    columns = [d[0] for d in cursor.description]
+    return pd.DataFrame.from_records(cursor.fetchall(), columns=columns, coerce_float=True).astype(dtypes)
+
+
+def _number(value):
+    if pd.isna(value):
+        return None
+    return float(value)
+
+
+def _distribution(values):
+    """count, mean, min, percentiles and max of a Series, ignoring NaN"""
+    values = values.dropna()
+    if values.empty:
+        return {'count': 0}
+    result = {'count': int(values.size), 'mean': _number(values.mean()), 'min': _number(values.min())}
+    for q, value in zip(QUANTILES, np.quantile(values.to_numpy(), QUANTILES)):
+        result[f'p{q * 100:g}'] = _number(value)
+    result['max'] = _number(values.max())
+    return result
+
+
+def _distributions(values, groups):
+    """_distribution() of `values` for each group, computed for every group in one pass"""
+    frame = pd.DataFrame({'value': values.to_numpy(), 'group': groups.to_numpy()}).dropna()
+    if frame.empty:
+        return {}
+    grouped = frame.groupby('group')['value']
+    stats = grouped.agg(['count', 'mean', 'min', 'max'])
+    quantiles = grouped.quantile(list(QUANTILES)).unstack()
+    result = {}
+    for group, row in stats.iterrows():
+        item = {'count': int(row['count']), 'mean': _number(row['mean']), 'min': _number(row['min'])}
+        for q in QUANTILES:
+            item[f'p{q * 100:g}'] = _number(quantiles.at[group, q])
+        item['max'] = _number(row['max'])
+        result[int(group)] = item
+    return result
+
+
+def _content_length(value):
+    """Length of a compressed message's content, as SQLite measures it for plain ones"""
+    text = storage_codec.decode_text(value)
+    message = json.loads(text)
+    content = message.get('content') if isinstance(message, dict) else None
+    if content is None:
+        return len(text)
+    return len(content if isinstance(content, str) else json.dumps(content, separators=(',', ':')))
+
+
+def session_stats(db):
+    """Per-bot and overall session counts, durations, and message counts and sizes"""
+    sessions = _frame(
+        db,
+        f'''
+        SELECT id, bot_id, {_unix_seconds('started_at')} AS started, {_unix_seconds('ended_at')} AS ended
+        FROM Sessions
+        ''',
+        {'id': 'int64', 'bot_id': 'int64', 'started': 'float64', 'ended': 'float64'}
+    )
+    # Content length is measured by SQLite; only compressed messages come back as bytes
+    messages = _frame(
+        db,
+        '''
+        SELECT session_id,
+               CASE WHEN typeof(message) = 'text'
+                    THEN length(COALESCE(json_extract(message, '$.content'), message)) END AS chars,
+               CASE WHEN typeof(message) = 'blob' THEN message END AS encoded
+        FROM SessionMessages
+        ''',
+        {'session_id': 'int64', 'chars': 'float64', 'encoded': 'object'}
+    )
+    compressed = messages['encoded'].notna()
+    if compressed.any():
+        messages.loc[compressed, 'chars'] = [_content_length(v) for v in messages.loc[compressed, 'encoded']]
+    messages['tokens'] = np.ceil(messages['chars'] / CHARS_PER_TOKEN)
+    messages['bot_id'] = messages['session_id'].map(pd.Series(sessions['bot_id'].to_numpy(), index=sessions['id']))
+
+    sessions['open'] = sessions['ended'].isna()
+    sessions['duration'] = sessions['ended'] - sessions['started']
+    sessions['messages'] = messages.groupby('session_id').size().reindex(sessions['id'], fill_value=0).to_numpy()
+
+    columns = {
+        'session_duration': (sessions, 'duration'),
+        'messages_per_session': (sessions, 'messages'),
+        'message_chars': (messages, 'chars'),
+        'message_tokens': (messages, 'tokens'),
+    }
+    per_bot = {name: _distributions(frame[column], frame['bot_id']) for name, (frame, column) in columns.items()}
+    counts = sessions.groupby('bot_id').agg(
+        sessions=('id', 'size'), open_sessions=('open', 'sum'), messages=('messages', 'sum')
+    )
+    bots = []
+    for bot_id, row in counts.iterrows():
+        bot = {'bot_id': int(bot_id), **{name: int(value) for name, value in row.items()}}
+        for name, distributions in per_bot.items():
+            bot[name] = distributions.get(int(bot_id), {'count': 0})
+        bots.append(bot)
+
+    overall = {
+        'sessions': len(sessions),
+        'open_sessions': int(sessions['open'].sum()),
+        'messages': len(messages),
+        **{name: _distribution(frame[column]) for name, (frame, column) in columns.items()},
+    }
+    return {'overall': overall, 'bots': bots}
+
+
+def checkpoint_stats(db):
+    """Per-bot and overall checkpoint counts, payload sizes and growth rates.
+
+    Payload size is the UTF-8 size of a checkpoint's payload fields, whether
+    they are stored inline (plain or compressed) or as chunks.
+    """
+    inline_columns = ', '.join(
+        f'''CASE WHEN typeof({field}) = 'blob' THEN NULL ELSE length(CAST({field} AS BLOB)) END AS {field}_bytes,
+            CASE WHEN typeof({field}) = 'blob' THEN {field} END AS {field}_encoded'''
+        for field in PAYLOAD_FIELDS
+    )
+    checkpoints = _frame(
+        db,
+        f'''
+        SELECT id, bot_id, checkpoint_number, {_unix_seconds('created_at')} AS created, {inline_columns}
+        FROM Checkpoints
+        ''',
+        {
+            'id': 'int64', 'bot_id': 'int64', 'checkpoint_number': 'int64', 'created': 'float64',
+            **{f'{field}_bytes': 'float64' for field in PAYLOAD_FIELDS},
+            **{f'{field}_encoded': 'object' for field in PAYLOAD_FIELDS},
+        }
+    )
+    payloads = _frame(
+        db, 'SELECT checkpoint_id, size FROM CheckpointPayloads',
+        {'checkpoint_id': 'int64', 'size': 'float64'}
+    )
+
+    payload_bytes = checkpoints['id'].map(payloads.groupby('checkpoint_id')['size'].sum()).fillna(0)
+    for field in PAYLOAD_FIELDS:
+        sizes = checkpoints[f'{field}_bytes']
+        encoded = checkpoints[f'{field}_encoded']
+        compressed = encoded.notna()
+        if compressed.any():
+            sizes = sizes.copy()
+            sizes[compressed] = [len(storage_codec.decompress(v)) for v in encoded[compressed]]
+        payload_bytes += sizes.fillna(0)
+    checkpoints = checkpoints[['id', 'bot_id', 'checkpoint_number', 'created']].assign(payload_bytes=payload_bytes)
+
+    checkpoints = checkpoints.sort_values(['bot_id', 'checkpoint_number'], ignore_index=True)
+    by_bot = checkpoints.groupby('bot_id')
+    checkpoints['growth'] = by_bot['payload_bytes'].diff()
+    checkpoints['interval'] = by_bot['created'].diff()
+
+    columns = {
+        'payload_bytes': 'payload_bytes',
+        'payload_growth': 'growth',
+        'checkpoint_interval': 'interval',
+    }
+    per_bot = {name: _distributions(checkpoints[column], checkpoints['bot_id']) for name, column in columns.items()}
+    summary = by_bot.agg(
+        checkpoints=('id', 'size'),
+        first_checkpoint=('checkpoint_number', 'first'), last_checkpoint=('checkpoint_number', 'last'),
+        first_created=('created', 'min'), last_created=('created', 'max'),
+        first_bytes=('payload_bytes', 'first'), last_bytes=('payload_bytes', 'last'),
+    )
+    span_days = (summary['last_created'] - summary['first_created']) / 86400
+    span_days = span_days.where(span_days > 0)
+    summary['checkpoints_per_day'] = (summary['checkpoints'] - 1) / span_days
+    summary['bytes_per_day'] = (summary['last_bytes'] - summary['first_bytes']) / span_days
+
+    bots = []
+    for bot_id, row in summary.iterrows():
+        bot = {
+            'bot_id': int(bot_id),
+            'checkpoints': int(row['checkpoints']),
+            'checkpoint_numbers': [int(row['first_checkpoint']), int(row['last_checkpoint'])],
+            'created': [_number(row['first_created']), _number(row['last_created'])],
+            'checkpoints_per_day': _number(row['checkpoints_per_day']),
+            'bytes_per_day': _number(row['bytes_per_day']),
+        }
+        for name, distributions in per_bot.items():
+            bot[name] = distributions.get(int(bot_id), {'count': 0})
+        bots.append(bot)
+
+    overall = {
+        'checkpoints': len(checkpoints),
+        'bots': len(summary),
+        **{name: _distribution(checkpoints[column]) for name, column in columns.items()},
+    }
+    return {'overall': overall, 'bots': bots}
+
+
+SECTIONS = {
+    'sessions': (session_stats, ('Sessions', 'SessionMessages')),
+    'checkpoints': (checkpoint_stats, ('Checkpoints', 'CheckpointPayloads')),
+}
+
+
+def table_versions(db, tables):
+    """{table: change counter} for the given tables"""
+    rows = db.execute(
+        f"SELECT name, version FROM TableVersions WHERE name IN ({', '.join('?' * len(tables))})",
+        list(tables)
+    )
+    return {row['name']: row['version'] for row in rows}
+
+
+class AnalyticsCache:
+    """Computed sections of one database, each kept until a table it reads changes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._results = {}
+
+    def get(self, db, section, versions):
+        """The section's result for these table versions, computing it if the cached one is stale.
+
+        Versions are read before the data, so a write that lands in between
+        only makes the next request recompute.
+        """
+        compute, tables = SECTIONS[section]
+        key = tuple(versions.get(table) for table in tables)
+        cached = self._results.get(section)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        # One computation at a time; requests that waited usually find it done
+        with self._lock:
+            cached = self._results.get(section)
+            if cached is None or cached[0] != key:
+                cached = (key, compute(db))
+                self._results[section] = cached
+        return cached[1]
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(config):
+    """Return this process's analytics cache for the configured database"""
+    key = (os.getpid(), str(config['DATABASE']))
+    cache = _caches.get(key)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.setdefault(key, AnalyticsCache())
+    return cache
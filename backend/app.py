@@ -1,8 +1,10 @@
 from flask import Flask
 from flask_cors import CORS
 from config import Config
-from routes import bots_bp, checkpoints_bp, stacks_bp, metrics_bp, sessions_bp, images_bp, python_ide_bp
-from database import init_db
+from routes import bots_bp, checkpoints_bp, stacks_bp, metrics_bp, metrics_query_bp, sessions_bp, session_batches_bp, images_bp, python_ide_bp, analytics_bp, search_bp, memories_bp
+from database import init_app
+from migrations import migrate_app
+import script_catalog
 from werkzeug.exceptions import HTTPException
 import logging
 import os
@@ -13,13 +15,13 @@ def create_app(test_config=None):
         r"/*": {
             "origins": ["http://localhost:5173", "http://127.0.0.1:5173"],
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type"]
+            "allow_headers": ["Content-Type"],
+            "expose_headers": ["X-Next-Cursor", "Link", "ETag", "Last-Modified"]
         }
     })
 
-    if test_config is None:
-        app.config.from_object(Config)
-    else:
+    app.config.from_object(Config)
+    if test_config is not None:
         app.config.update(test_config)
 
     try:
@@ -28,14 +30,28 @@ def create_app(test_config=None):
         pass
 
 
+    init_app(app)
+    if app.config['AUTO_MIGRATE']:
+        migrate_app(app)
+
     # Register Blueprints
     app.register_blueprint(bots_bp, url_prefix='/api/v1/bots')
     app.register_blueprint(checkpoints_bp, url_prefix='/api/v1/bots/<int:bot_id>/checkpoints')
     app.register_blueprint(stacks_bp, url_prefix='/api/v1/stacks')
     app.register_blueprint(metrics_bp, url_prefix='/api/v1/bots/<int:bot_id>')
+    app.register_blueprint(metrics_query_bp, url_prefix='/api/v1/metrics')
     app.register_blueprint(sessions_bp, url_prefix='/api/v1/bots/<int:bot_id>/sessions')
+    app.register_blueprint(session_batches_bp, url_prefix='/api/v1/sessions')
     app.register_blueprint(images_bp, url_prefix='/api/v1/images')
     app.register_blueprint(python_ide_bp, url_prefix='/api/v1/python-ide')
+    app.register_blueprint(analytics_bp, url_prefix='/api/v1/analytics')
+    app.register_blueprint(search_bp, url_prefix='/api/v1/search')
+    app.register_blueprint(memories_bp, url_prefix='/api/v1/memories')
+
+    # Index the IDE's script templates now rather than on the first request
+    catalog, _ = script_catalog.get_catalog(app.config)
+    if catalog is not None:
+        catalog.listing()
 
     # Error Handlers
     @app.errorhandler(HTTPException)
@@ -0,0 +1,110 @@
+"""ASGI entry point for production serving.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+
+a2wsgi serves the Flask app, which runs with its database calls on a bounded
+thread pool (ASGI_THREADS per worker). The addition here is how the response
+body is sent: a2wsgi iterates it inside the request's thread, which then
+waits on the client, so a few stalled downloads could use up the pool.
+Instead the thread is released when the app returns, and the event loop
+pulls the body one executor call per chunk. Bodies that are async-iterable,
+such as the session tail, are consumed on the loop itself, so an idle stream
+holds no thread at all.
+
+Each worker process builds its own app, connection pools and stream broker;
+migrations take the database write lock, so workers can start together.
+"""
+import asyncio
+
+from a2wsgi.wsgi import WSGIMiddleware, WSGIResponder
+
+from app import create_app
+
+_DONE = object()
+
+
+# Overrides WSGIResponder.wsgi and .sender and uses its send_queue, loop and executor,
+# which are a2wsgi internals rather than API; requirements.txt pins the exact version
+class _Responder(WSGIResponder):
+    """WSGIResponder that sends the response body from the event loop instead of a thread"""
+
+    body = None
+
+    async def __call__(self, scope, receive, send):
+        self.receive = receive
+        await super().__call__(scope, receive, send)
+
+    def wsgi(self, environ, start_response):
+        # Sent by sender() once this thread is released
+        self.body = self.app(environ, start_response)
+
+    async def sender(self, send):
+        # start_response() and write() calls made until the app returned
+        await super().sender(send)
+        if self.body is not None:
+            await self._send_body(send)
+
+    async def _flush(self, send):
+        # A generator body may call start_response() or write() only when first iterated
+        while not self.send_queue.empty():
+            await send(self.send_queue.get_nowait())
+
+    async def _wait_disconnect(self):
+        while (await self.receive())['type'] != 'http.disconnect':
+            pass
+
+    async def _send_body(self, send):
+        body = self.body
+        is_async = hasattr(body, '__aiter__')
+        chunks = body.__aiter__() if is_async else iter(body)
+        disconnected = asyncio.ensure_future(self._wait_disconnect())
+        try:
+            while True:
+                if is_async:
+                    next_chunk = asyncio.ensure_future(anext(chunks, _DONE))
+                    # An idle stream must notice a closed socket without waiting for its next event
+                    await asyncio.wait({next_chunk, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                    if not next_chunk.done():
+                        next_chunk.cancel()
+                        # Let the cancellation unwind the generator before closing it
+                        await asyncio.gather(next_chunk, return_exceptions=True)
+                        return
+                    chunk = next_chunk.result()
+                else:
+                    # One executor call per chunk: a slow client holds a socket, not a thread
+                    chunk = await self.loop.run_in_executor(self.executor, next, chunks, _DONE)
+                    await self._flush(send)
+                    if disconnected.done():
+                        return
+                if chunk is _DONE:
+                    break
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            disconnected.cancel()
+            if is_async and hasattr(chunks, 'aclose'):
+                await chunks.aclose()
+            if hasattr(body, 'close'):
+                await self.loop.run_in_executor(self.executor, body.close)
+
+
+class StreamingWSGIMiddleware(WSGIMiddleware):
+    """a2wsgi's WSGIMiddleware, with response bodies sent from the event loop"""
+
+    _loop = None
+
+    async def __call__(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Work that async bodies hand to run_in_executor(None, ...) shares the same bound
+            loop.set_default_executor(self.executor)
+            self._loop = loop
+        if scope['type'] == 'http':
+            await _Responder(self.app, self.executor, self.send_queue_size)(scope, receive, send)
+        else:
+            await super().__call__(scope, receive, send)
+
+
+flask_app = create_app()
+app = StreamingWSGIMiddleware(flask_app, workers=flask_app.config['ASGI_THREADS'])
@@ -0,0 +1,100 @@
+"""GET /api/v1/analytics: cold computation, cached responses and invalidation.
+
+Seeds sessions, messages and checkpoints for many bots, then times the first
+(computing) request, cached requests and conditional 304s, and the
+recomputation after one new message. Also reports what the TableVersions
+triggers add to batched message ingest.
+
+    python benchmarks/bench_analytics.py [bots] [sessions_per_bot] [messages_per_session]
+"""
+import json
+import random
+import sys
+import time
+
+from common import temp_app, timed
+from database import get_db
+
+
+def seed(db, bots, sessions, messages):
+    rng = random.Random(1)
+    db.executemany(
+        'INSERT INTO Bots (name, orchestrator_bot) VALUES (?, 0)',
+        [(f'bot-{i}',) for i in range(bots)]
+    )
+    db.executemany(
+        '''
+        INSERT INTO Sessions (bot_id, started_at, ended_at, messages)
+        VALUES (?, datetime(1700000000 + ?, 'unixepoch'), datetime(1700000000 + ?, 'unixepoch'), '[]')
+        ''',
+        [
+            (bot, n * 3600, n * 3600 + rng.randint(60, 3000))
+            for bot in range(1, bots + 1) for n in range(sessions)
+        ]
+    )
+    db.executemany(
+        'INSERT INTO SessionMessages (session_id, seq, message) VALUES (?, ?, ?)',
+        (
+            (session, seq, json.dumps({'role': 'user', 'content': 'word ' * rng.randint(1, 200)}))
+            for session in range(1, bots * sessions + 1) for seq in range(1, messages + 1)
+        )
+    )
+    db.executemany(
+        '''
+        INSERT INTO Checkpoints (bot_id, checkpoint_number, version, created_at, session_history)
+        VALUES (?, ?, '1.0', datetime(1700000000 + ?, 'unixepoch'), ?)
+        ''',
+        [(bot, n, n * 86400, 'x' * (n * 100)) for bot in range(1, bots + 1) for n in range(1, 21)]
+    )
+    db.commit()
+
+
+def ingest(client, bots, batch):
+    body = [{'bot_id': 1 + i % bots, 'message': {'role': 'user', 'content': 'hello'}} for i in range(batch)]
+    start = time.perf_counter()
+    response = client.post('/api/v1/sessions/messages', json=body)
+    assert response.status_code == 201, response.get_json()
+    return (time.perf_counter() - start) * 1000
+
+
+def main(bots=100, sessions=100, messages=20):
+    with temp_app() as app:
+        client = app.test_client()
+        with app.app_context():
+            seed(get_db(), bots, sessions, messages)
+        print(f"{bots} bots, {bots * sessions} sessions, {bots * sessions * messages} messages, {bots * 20} checkpoints")
+
+        start = time.perf_counter()
+        response = client.get('/api/v1/analytics')
+        print(f"first request (computes):       {(time.perf_counter() - start) * 1000:8.1f} ms")
+        etag = response.headers['ETag']
+        print(f"cached request:                 {timed(lambda: client.get('/api/v1/analytics')):8.1f} ms")
+        print(f"cached request, one bot:        {timed(lambda: client.get('/api/v1/analytics?bot_id=7')):8.1f} ms")
+        print(f"conditional request (304):      "
+              f"{timed(lambda: client.get('/api/v1/analytics', headers={'If-None-Match': etag})):8.1f} ms")
+
+        client.post('/api/v1/bots/1/sessions')
+        client.post('/api/v1/bots/1/sessions/current', json={'message': 'new'})
+        start = time.perf_counter()
+        client.get('/api/v1/analytics/sessions')
+        print(f"after a new message (sessions): {(time.perf_counter() - start) * 1000:8.1f} ms")
+        print(f"checkpoints still cached:       {timed(lambda: client.get('/api/v1/analytics/checkpoints')):8.1f} ms")
+
+        for bot in range(2, bots + 1):
+            client.post(f'/api/v1/bots/{bot}/sessions')
+        with_triggers = min(ingest(client, bots, 10000) for _ in range(3))
+        with app.app_context():
+            db = get_db()
+            triggers = db.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'SessionMessages'"
+            ).fetchall()
+            for trigger in triggers:
+                db.execute(f"DROP TRIGGER {trigger['name']}")
+            db.commit()
+        without_triggers = min(ingest(client, bots, 10000) for _ in range(3))
+        print(f"10k-message batch ingest:       {with_triggers:8.1f} ms with version triggers, "
+              f"{without_triggers:.1f} ms without")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,63 @@
+"""GET .../checkpoints/<a>/diff/<b> against downloading both checkpoints.
+
+Creates checkpoints of one bot whose session history keeps growing (the way
+agent runs checkpoint), then compares response size and latency of diffing
+consecutive checkpoints, cold and cached, with fetching both full
+checkpoints. Also times a diff whose history was edited in the middle, which
+falls back to parsing both sides.
+
+    python benchmarks/bench_checkpoint_diff.py [messages] [messages_per_checkpoint]
+"""
+import json
+import random
+import sys
+
+from common import temp_app, timed
+import checkpoint_diff
+
+WORDS = 'the agent reads the file and writes a summary of what it found in the logs'.split()
+
+
+def message(rng, i):
+    return {'role': 'user' if i % 2 else 'assistant', 'content': ' '.join(rng.choices(WORDS, k=rng.randint(20, 120)))}
+
+
+def main(messages=5000, per_checkpoint=50):
+    rng = random.Random(1)
+    history = [message(rng, i) for i in range(messages)]
+    with temp_app() as app:
+        client = app.test_client()
+        client.post('/api/v1/bots', json={'name': 'bot', 'orchestrator_bot': False})
+
+        def create(session_history):
+            response = client.post('/api/v1/bots/1/checkpoints', json={
+                'bot_id': 1, 'version': '1.0', 'system_prompt': 'You are a helpful agent.',
+                'session_history': json.dumps(session_history),
+            })
+            assert response.status_code == 201, response.get_json()
+            return response.get_json()['checkpoint_number']
+
+        old = create(history[:-per_checkpoint])
+        new = create(history)
+        edited = create(history[:messages // 2] + [message(rng, -1)] + history[messages // 2 + 1:])
+
+        full_bytes = sum(len(client.get(f'/api/v1/bots/1/checkpoints/{n}').data) for n in (old, new))
+        full_ms = timed(lambda: [client.get(f'/api/v1/bots/1/checkpoints/{n}') for n in (old, new)])
+        print(f"history of {messages} messages, {per_checkpoint} added per checkpoint")
+        print(f"{'':>24} {'bytes':>10} {'ms':>8}")
+        print(f"{'both checkpoints':>24} {full_bytes:>10} {full_ms:>8.1f}")
+
+        cache = checkpoint_diff.get_cache(app.config)
+        for label, a, b in (('diff, appended', old, new), ('diff, edited', new, edited)):
+            url = f'/api/v1/bots/1/checkpoints/{a}/diff/{b}'
+            size = len(client.get(url).data)
+
+            def cold():
+                cache._diffs.clear()
+                client.get(url)
+            print(f"{label + ' (cold)':>24} {size:>10} {timed(cold):>8.1f}")
+            print(f"{label + ' (cached)':>24} {size:>10} {timed(lambda: client.get(url)):>8.1f}")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,64 @@
+"""Concurrent checkpoint creation: correctness and throughput.
+
+32 threads create checkpoints for the same bot through the API at once, the
+way a stack's agents all checkpoint at the end of a run. The script fails if
+any checkpoint number is duplicated or skipped, and reports checkpoints/sec.
+
+    python benchmarks/bench_checkpoint_numbering.py [writers] [per_writer]
+"""
+import sys
+import threading
+import time
+
+from common import temp_app
+from database import get_db
+
+
+def main(writers=32, per_writer=25):
+    with temp_app() as app:
+        with app.app_context():
+            db = get_db()
+            db.execute("INSERT INTO Bots (name, orchestrator_bot) VALUES ('bot', 0)")
+            db.commit()
+
+        errors = []
+        start_gate = threading.Barrier(writers)
+
+        def writer(n):
+            client = app.test_client()
+            start_gate.wait()
+            for i in range(per_writer):
+                response = client.post(
+                    '/api/v1/bots/1/checkpoints',
+                    json={'bot_id': 1, 'version': '1.0', 'system_prompt': f'writer {n} #{i}'}
+                )
+                if response.status_code != 201:
+                    errors.append(response.get_data(as_text=True))
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        with app.app_context():
+            numbers = [row[0] for row in get_db().execute(
+                'SELECT checkpoint_number FROM Checkpoints WHERE bot_id = 1 ORDER BY checkpoint_number'
+            )]
+
+    total = writers * per_writer
+    print(f"writers: {writers}, checkpoints: {total}, failed requests: {len(errors)}")
+    print(f"elapsed: {elapsed:.2f}s, throughput: {total / elapsed:.0f} checkpoints/s")
+    if errors:
+        print(f"first error: {errors[0]}")
+    if numbers != list(range(1, total + 1)):
+        duplicates = len(numbers) - len(set(numbers))
+        print(f"FAIL: expected 1..{total}, got {len(numbers)} rows with {duplicates} duplicates")
+        sys.exit(1)
+    print("OK: checkpoint numbers are unique and contiguous")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,80 @@
+"""On-disk size, write throughput and read latency per storage codec.
+
+Writes a synthetic corpus of checkpoints whose session history grows by a
+few messages each time (the way agent runs checkpoint) and whose memories
+and datasets are large JSON documents, once per codec:
+
+    python benchmarks/bench_codecs.py [checkpoints]
+"""
+import json
+import os
+import random
+import sys
+import time
+
+from common import temp_app, timed
+from database import get_db
+from storage_codec import zstandard
+
+CODECS = ['none', 'zlib'] + (['zstd'] if zstandard is not None else [])
+WORDS = 'the agent model memory context tool result user assistant plan step observation answer'.split()
+
+
+def sentence(rng, words=40):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def corpus(count, seed=7):
+    rng = random.Random(seed)
+    history = []
+    memories = [{'title': f'memory {i}', 'description': sentence(rng, 12), 'messages': []} for i in range(50)]
+    datasets = [{'title': f'dataset {i}', 'description': sentence(rng), 'messages': []} for i in range(20)]
+    for n in range(count):
+        for _ in range(rng.randint(2, 6)):
+            history.append({'role': rng.choice(['user', 'assistant']), 'content': sentence(rng), 'images': False})
+        if n % 5 == 0:
+            memories.append({'title': f'memory {len(memories)}', 'description': sentence(rng, 12), 'messages': []})
+        yield {
+            'bot_id': 1,
+            'version': '1.0',
+            'system_prompt': sentence(rng, 200),
+            'session_history': json.dumps(history),
+            'memories': json.dumps(memories),
+            'datasets': json.dumps(datasets),
+        }
+
+
+def disk_size(app):
+    with app.app_context():
+        get_db().execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    path = app.config['DATABASE']
+    return sum(os.path.getsize(p) for p in (path, f'{path}-wal') if os.path.exists(p))
+
+
+def main(count=200):
+    payloads = list(corpus(count))
+    raw = sum(len(json.dumps(p)) for p in payloads)
+    print(f"{count} checkpoints, {raw / 1e6:.1f} MB of raw payload\n")
+    print(f"{'codec':>6} {'disk (MB)':>10} {'writes/s':>10} {'read history (ms)':>18} {'read detail (ms)':>17}")
+    for codec in CODECS:
+        with temp_app(STORAGE_CODEC=codec) as app:
+            with app.app_context():
+                db = get_db()
+                db.execute("INSERT INTO Bots (name, orchestrator_bot) VALUES ('bot', 0)")
+                db.commit()
+            client = app.test_client()
+
+            start = time.perf_counter()
+            for payload in payloads:
+                client.post('/api/v1/bots/1/checkpoints', json=payload)
+            writes = count / (time.perf_counter() - start)
+
+            size = disk_size(app)
+            last = count
+            history = timed(lambda: client.get(f'/api/v1/bots/1/checkpoints/{last}/session_history'))
+            detail = timed(lambda: client.get(f'/api/v1/bots/1/checkpoints/{last}'))
+            print(f"{codec:>6} {size / 1e6:>10.2f} {writes:>10.0f} {history:>18.2f} {detail:>17.2f}")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
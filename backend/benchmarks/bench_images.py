@@ -0,0 +1,79 @@
+"""Image serving throughput and peak memory: streamed BLOB reads vs BytesIO.
+
+Stores images of a few sizes and downloads each through GET /api/v1/images,
+once with the streaming handler and once the way it used to be served (the
+whole BLOB loaded into BytesIO), reporting MB/s and the peak Python memory
+allocated while serving. Also times a small Range request at the end of the
+largest image.
+
+    python benchmarks/bench_images.py [max_size_mb]
+"""
+import os
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+
+from flask import send_file
+
+from common import temp_app, timed
+from database import get_db, get_read_db
+
+
+def legacy_get_image(image_name):
+    image = get_read_db().execute(
+        "SELECT image_blob FROM images WHERE name = ?", (image_name,)
+    ).fetchone()
+    return send_file(BytesIO(image["image_blob"]), mimetype="image/jpeg")
+
+
+def download(client, url, headers=None):
+    response = client.get(url, headers=headers or {}, buffered=False)
+    received = sum(len(piece) for piece in response.response)
+    response.close()
+    return received
+
+
+def measure(client, url, size):
+    tracemalloc.start()
+    start = time.perf_counter()
+    received = download(client, url)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert received == size, (received, size)
+    return size / 1e6 / elapsed, peak / 1e6
+
+
+def main(max_size_mb=64):
+    sizes = [s for s in (1, 8, 32, 64, 128) if s <= max_size_mb]
+    with temp_app() as app:
+        app.add_url_rule('/legacy/<string:image_name>', view_func=legacy_get_image)
+        with app.app_context():
+            db = get_db()
+            for mb in sizes:
+                data = b'\x89PNG\r\n\x1a\n' + os.urandom(mb * 1024 * 1024 - 8)
+                db.execute(
+                    "INSERT INTO images (name, image_path, image_blob) VALUES (?, ?, ?)",
+                    (f'{mb}mb.png', f'{mb}mb.png', data)
+                )
+            db.commit()
+        client = app.test_client()
+
+        print(f"{'size':>6} {'stream MB/s':>12} {'stream peak MB':>15} {'BytesIO MB/s':>13} {'BytesIO peak MB':>16}")
+        for mb in sizes:
+            size = mb * 1024 * 1024
+            download(client, f'/api/v1/images/{mb}mb.png')  # warm the page cache
+            stream_rate, stream_peak = measure(client, f'/api/v1/images/{mb}mb.png', size)
+            legacy_rate, legacy_peak = measure(client, f'/legacy/{mb}mb.png', size)
+            print(f"{mb:>4}MB {stream_rate:>12.0f} {stream_peak:>15.1f} {legacy_rate:>13.0f} {legacy_peak:>16.1f}")
+
+        largest = sizes[-1]
+        tail = timed(lambda: download(
+            client, f'/api/v1/images/{largest}mb.png', {'Range': 'bytes=-65536'}
+        ), repeat=20)
+        print(f"\nLast 64 KiB of the {largest}MB image via Range: {tail:.2f} ms")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,62 @@
+"""Stored JSON payloads sent as is against parsed and re-encoded.
+
+Creates a checkpoint with a multi-MB session history and times
+GET .../session_history and GET .../checkpoints/<n>?payloads=json with the
+checkpoint marked as checked on write (passthrough) and with the mark
+cleared, which takes the parse + jsonify path of unchecked rows.
+Also reports the peak Python allocation of one request of each.
+
+    python benchmarks/bench_json_passthrough.py [messages]
+"""
+import json
+import random
+import sys
+import tracemalloc
+
+from common import temp_app, timed
+from database import get_db
+
+WORDS = 'the agent reads the file and writes a summary of what it found in the logs'.split()
+
+
+def peak_mb(fn):
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1e6
+
+
+def main(messages=20000):
+    rng = random.Random(1)
+    history = [
+        {'role': 'user' if i % 2 else 'assistant', 'content': ' '.join(rng.choices(WORDS, k=rng.randint(20, 120)))}
+        for i in range(messages)
+    ]
+    with temp_app() as app:
+        client = app.test_client()
+        client.post('/api/v1/bots', json={'name': 'bot', 'orchestrator_bot': False})
+        response = client.post('/api/v1/bots/1/checkpoints', json={
+            'bot_id': 1, 'version': '1.0', 'session_history': json.dumps(history),
+        })
+        assert response.status_code == 201, response.get_json()
+
+        urls = ('/api/v1/bots/1/checkpoints/1/session_history', '/api/v1/bots/1/checkpoints/1?payloads=json')
+        size = len(client.get(urls[0]).data)
+        print(f"session history of {messages} messages, {size / 1e6:.1f} MB")
+        print(f"{'':>44} {'ms':>8} {'peak MB':>8}")
+        for checked in (1, 0):
+            with app.app_context():
+                db = get_db()
+                db.execute('UPDATE Checkpoints SET payloads_json = ?', (checked,))
+                db.commit()
+            label = 'passthrough' if checked else 'parse + encode'
+            for url in urls:
+                body = client.get(url).data
+                assert json.loads(body) is not None
+                print(f"{label + ' ' + url.split('/checkpoints/1')[1]:>44} "
+                      f"{timed(lambda: client.get(url)):>8.1f} {peak_mb(lambda: client.get(url)):>8.1f}")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,119 @@
+"""Memory vector search: brute force vs the IVF index, and incremental inserts.
+
+Seeds checkpoints whose memories have 768-d embeddings drawn around a few
+hundred topics, then reports load and build times, latency of
+/api/v1/memories/search with brute force and with the IVF index, the IVF
+index's recall of the exact top 10, and the cost of creating a checkpoint
+with vectors and searching right after it.
+
+    python benchmarks/bench_memory_vectors.py [vectors] [memories_per_checkpoint]
+"""
+import json
+import sys
+import time
+
+import numpy as np
+
+from common import temp_app, timed
+from database import get_db, get_read_db
+import vector_index
+
+DIM = 768
+TOPICS = 500
+BOTS = 50
+QUERIES = 50
+LIMIT = 10
+
+
+def embeddings(rng, centers, n):
+    # Noise as long as the topic vector: memories of one topic are about 45 degrees apart
+    noise = rng.normal(size=(n, DIM)).astype(np.float32) / np.sqrt(DIM)
+    vectors = centers[rng.integers(len(centers), size=n)] + noise
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def seed(db, rng, centers, vectors, per_checkpoint):
+    db.executemany('INSERT INTO Bots (name, orchestrator_bot) VALUES (?, 0)', [(f'bot-{i}',) for i in range(BOTS)])
+    memories = json.dumps([{'title': f'memory {i}', 'description': '', 'messages': []} for i in range(per_checkpoint)])
+    checkpoints = vectors // per_checkpoint
+    db.executemany(
+        'INSERT INTO Checkpoints (id, bot_id, checkpoint_number, version, memories) VALUES (?, ?, ?, ?, ?)',
+        [(i + 1, 1 + i % BOTS, 1 + i // BOTS, '1.0', memories) for i in range(checkpoints)]
+    )
+    for start in range(0, checkpoints, 1000):
+        batch = range(start, min(start + 1000, checkpoints))
+        matrix = embeddings(rng, centers, len(batch) * per_checkpoint).astype(vector_index.DTYPE)
+        db.executemany(
+            'INSERT INTO MemoryVectors (checkpoint_id, bot_id, memory_index, vector) VALUES (?, ?, ?, ?)',
+            [
+                (i + 1, 1 + i % BOTS, m, matrix[n * per_checkpoint + m].tobytes())
+                for n, i in enumerate(batch) for m in range(per_checkpoint)
+            ]
+        )
+    db.commit()
+    return checkpoints * per_checkpoint
+
+
+def search_all(client, queries):
+    results = []
+    for query in queries:
+        response = client.post('/api/v1/memories/search', json={'q_vector': query.tolist(), 'limit': LIMIT})
+        assert response.status_code == 200, response.get_json()
+        results.append([(hit['checkpoint_id'], hit['memory_index']) for hit in response.get_json()])
+    return results
+
+
+def main(vectors=200000, per_checkpoint=10):
+    rng = np.random.default_rng(1)
+    centers = rng.normal(size=(TOPICS, DIM)).astype(np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    queries = embeddings(rng, centers, QUERIES)
+
+    with temp_app() as app:
+        client = app.test_client()
+        with app.app_context():
+            vectors = seed(get_db(), rng, centers, vectors, per_checkpoint)
+        print(f"{vectors} vectors of {DIM} dimensions")
+
+        # Brute force: an index that never builds IVF lists
+        exact = vector_index.VectorIndex(DIM, exact_max=vectors + 1, nprobe=app.config['MEMORY_INDEX_NPROBE'])
+        with app.app_context():
+            start = time.perf_counter()
+            exact.sync(get_read_db())
+        print(f"load: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+        index = vector_index.get_index(app.config)
+        with app.app_context():
+            index.sync(get_read_db())
+        start = time.perf_counter()
+        index.wait_for_build()
+        print(f"IVF build ({int(np.sqrt(vectors))} lists): {(time.perf_counter() - start) * 1000:.0f} ms (background)")
+
+        with app.app_context():
+            truth = [set(exact.search(query, LIMIT)[0].tolist()) for query in queries]
+            found = [set(index.search(query, LIMIT)[0].tolist()) for query in queries]
+            exact_ms = timed(lambda: [exact.search(query, LIMIT) for query in queries]) / QUERIES
+            ivf_ms = timed(lambda: [index.search(query, LIMIT) for query in queries]) / QUERIES
+            bot_ms = timed(lambda: [index.search(query, LIMIT, bot_ids=[3]) for query in queries]) / QUERIES
+        recall = sum(len(t & f) for t, f in zip(truth, found)) / (LIMIT * QUERIES)
+        print(f"index search: brute force {exact_ms:.2f} ms, IVF {ivf_ms:.2f} ms "
+              f"(recall@{LIMIT} {recall:.3f}), one bot {bot_ms:.2f} ms")
+
+        http_ms = timed(lambda: search_all(client, queries), repeat=3) / QUERIES
+        print(f"POST /api/v1/memories/search: {http_ms:.2f} ms per query")
+
+        memories = json.dumps([{'title': f'new {i}', 'description': '', 'messages': []} for i in range(per_checkpoint)])
+
+        def create_and_search():
+            response = client.post('/api/v1/bots/1/checkpoints', json={
+                'bot_id': 1, 'version': '1.0', 'memories': memories,
+                'memory_vectors': embeddings(rng, centers, per_checkpoint).tolist(),
+            })
+            assert response.status_code == 201, response.get_json()
+            search_all(client, queries[:1])
+
+        print(f"create checkpoint with {per_checkpoint} vectors + search: {timed(create_and_search, repeat=10):.1f} ms")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,82 @@
+"""Latency of GET /api/v1/metrics/query over 100k checkpoints.
+
+Seeds one metric for 100 bots x 1000 checkpoints, one point per minute,
+checks the server's aggregates against a plain Python computation, then times
+dashboard-style queries: summaries with percentiles, a downsampled series and
+hourly buckets, per bot and across all bots.
+
+    python benchmarks/bench_metrics.py [bots] [checkpoints_per_bot]
+"""
+import math
+import random
+import statistics
+import sys
+
+from common import temp_app, timed
+from database import get_db
+
+QUERIES = [
+    ('one bot: stats + p50/p90/p99', 'metric=loss&bot_id=1&percentile=50,90,99'),
+    ('one bot: 200-point series', 'metric=loss&bot_id=1&points=200&stats=count'),
+    ('all bots: stats + p50/p99', 'metric=loss&group_by=none&percentile=50,99'),
+    ('all bots: hourly buckets', 'metric=loss&group_by=none&bucket=3600&stats=count'),
+    ('per bot: stats + p50', 'metric=loss&percentile=50'),
+    ('per bot: 100-point series', 'metric=loss&points=100&stats=avg'),
+    ('stack of 5 bots: stats + p90', 'metric=loss&stack_id=1&group_by=none&percentile=90'),
+]
+
+
+def seed(db, bots, checkpoints):
+    rng = random.Random(1)
+    db.executemany(
+        'INSERT INTO Bots (name, orchestrator_bot) VALUES (?, 0)',
+        [(f'bot-{i}',) for i in range(bots)]
+    )
+    db.execute("INSERT INTO Stacks (id, name, orchestrator_bot_id) VALUES (1, 'stack', 1)")
+    db.executemany(
+        'INSERT INTO StackSlots (stack_id, slot_number, bot_id) VALUES (1, ?, ?)',
+        [(slot, slot + 1) for slot in range(1, 5)]
+    )
+    start = 1_700_000_000
+    db.executemany(
+        'INSERT INTO CheckpointMetrics (bot_id, metric, checkpoint_number, value, ts) VALUES (?, ?, ?, ?, ?)',
+        (
+            (bot, 'loss', n, 2.0 / math.sqrt(n) + rng.random() * 0.1, start + (bot * checkpoints + n) * 60)
+            for bot in range(1, bots + 1)
+            for n in range(1, checkpoints + 1)
+        )
+    )
+    db.commit()
+
+
+def check(client, db):
+    values = sorted(row[0] for row in db.execute("SELECT value FROM CheckpointMetrics WHERE bot_id = 1"))
+    stats = client.get('/api/v1/metrics/query?metric=loss&bot_id=1&percentile=50,90').get_json()['groups'][0]['stats']
+    expected = {
+        'count': len(values), 'min': values[0], 'max': values[-1], 'avg': statistics.fmean(values),
+        'p50': statistics.quantiles(values, n=100, method='inclusive')[49],
+        'p90': statistics.quantiles(values, n=100, method='inclusive')[89],
+    }
+    for name, value in expected.items():
+        assert math.isclose(stats[name], value, rel_tol=1e-9), (name, stats[name], value)
+
+
+def main(bots=100, checkpoints=1000):
+    with temp_app() as app:
+        client = app.test_client()
+        with app.app_context():
+            db = get_db()
+            seed(db, bots, checkpoints)
+            check(client, db)
+        print(f"{bots * checkpoints} metric values ({bots} bots x {checkpoints} checkpoints)")
+        print(f"{'query':>32} {'groups':>7} {'ms':>8}")
+        for label, args in QUERIES:
+            url = f'/api/v1/metrics/query?{args}'
+            response = client.get(url)
+            assert response.status_code == 200, response.get_json()
+            groups = len(response.get_json()['groups'])
+            print(f"{label:>32} {groups:>7} {timed(lambda: client.get(url)):>8.1f}")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,91 @@
+"""GET /api/v1/search latency over many session messages, and its cost on ingest.
+
+Seeds messages drawn from a Zipf-like vocabulary, indexes them the way the
+write path does, then times searches for rare, common and prefix terms, with
+and without a bot filter, and reports what indexing adds to a 10k-message
+batch ingest.
+
+    python benchmarks/bench_search.py [messages] [bots]
+"""
+import json
+import random
+import sys
+import time
+
+from common import temp_app, timed
+from database import get_db
+import search_index
+
+VOCABULARY = [f'word{i}' for i in range(20000)]
+QUERIES = [
+    ('rare term', 'q=word19999&syntax=fts'),
+    ('common term', 'q=word1&syntax=fts'),
+    ('two terms', 'q=word3 word40'),
+    ('prefix', 'q=word123'),
+    ('prefix of 11k terms', 'q=word1'),
+    ('common term, one bot', 'q=word1&syntax=fts&bot_id=3'),
+    ('common term, page 5', 'q=word1&syntax=fts&after=80'),
+    ('messages only', 'q=word500&kind=messages'),
+    ('phrase', 'q="word2 word7"&syntax=fts'),
+]
+
+
+def seed(db, messages, bots):
+    rng = random.Random(1)
+    weights = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+    db.executemany(
+        'INSERT INTO Bots (name, description, orchestrator_bot) VALUES (?, ?, 0)',
+        [(f'bot-{i}', ' '.join(rng.choices(VOCABULARY, weights, k=20))) for i in range(bots)]
+    )
+    db.executemany(
+        "INSERT INTO Sessions (bot_id, started_at, messages) VALUES (?, '2024-01-01', '[]')",
+        [(bot,) for bot in range(1, bots + 1)]
+    )
+    for start in range(0, messages, 10000):
+        rows = [
+            (1 + i % bots, i + 1, ' '.join(rng.choices(VOCABULARY, weights, k=rng.randint(5, 60))))
+            for i in range(start, min(start + 10000, messages))
+        ]
+        db.executemany(
+            'INSERT INTO SessionMessages (session_id, seq, message) VALUES (?, ?, ?)',
+            [(session, seq, json.dumps({'role': 'user', 'content': text})) for session, seq, text in rows]
+        )
+        search_index.index_messages(db, rows)
+    db.commit()
+
+
+def ingest(client, bots):
+    body = [{'bot_id': 1 + i % bots, 'message': {'role': 'user', 'content': f'hello word{i}'}} for i in range(10000)]
+    start = time.perf_counter()
+    response = client.post('/api/v1/sessions/messages', json=body)
+    assert response.status_code == 201, response.get_json()
+    return (time.perf_counter() - start) * 1000
+
+
+def main(messages=200000, bots=50):
+    with temp_app() as app:
+        client = app.test_client()
+        start = time.perf_counter()
+        with app.app_context():
+            seed(get_db(), messages, bots)
+        print(f"seeded and indexed {messages} messages in {time.perf_counter() - start:.1f} s")
+
+        print(f"{'query':>22} {'hits':>5} {'ms':>8}")
+        for label, args in QUERIES:
+            url = f'/api/v1/search?{args}'
+            response = client.get(url)
+            assert response.status_code == 200, response.get_json()
+            print(f"{label:>22} {len(response.get_json()):>5} {timed(lambda: client.get(url)):>8.1f}")
+
+        indexed = min(ingest(client, bots) for _ in range(3))
+        with app.app_context():
+            db = get_db()
+            db.execute('DROP TABLE SearchMessages')
+            db.execute('CREATE TABLE SearchMessages (rowid INTEGER PRIMARY KEY, content TEXT)')
+            db.commit()
+        plain = min(ingest(client, bots) for _ in range(3))
+        print(f"10k-message batch ingest: {indexed:.1f} ms indexed, {plain:.1f} ms without the FTS index")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
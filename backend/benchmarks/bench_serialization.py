@@ -0,0 +1,95 @@
+"""List serialization: marshmallow + jsonify against compiled row serializers.
+
+Seeds bots and checkpoints, then serializes the same rows to a JSON response
+body three ways: a Schema and dataclass per row (the original list code), one
+many=True dump, and serializers.row_serializer streamed through
+page_response. Each way runs in a fresh process, which reports rows/sec and
+how far its peak RSS rose above the baseline. Responses are compact
+(DEBUG off) so that jsonify does not pretty-print.
+
+    python benchmarks/bench_serialization.py [rows]
+"""
+import multiprocessing
+import resource
+import sys
+import time
+
+from common import temp_app
+
+CHECKPOINT_FIELDS = ['id', 'bot_id', 'checkpoint_number', 'version', 'created_at', 'name', 'description', 'model']
+PATHS = ('Schema per row + dataclass', 'Schema(many=True)', 'compiled + streamed')
+
+
+def seed(db, rows):
+    db.executemany(
+        'INSERT INTO Bots (name, description, default_system_prompt, orchestrator_bot) VALUES (?, ?, ?, ?)',
+        [(f'bot-{i}', f'bot number {i}', 'You are a helpful agent.', i % 2) for i in range(rows)]
+    )
+    db.executemany(
+        'INSERT INTO Checkpoints (bot_id, checkpoint_number, version, name, description) VALUES (1, ?, ?, ?, ?)',
+        [(i + 1, '1.0', f'checkpoint {i}', 'after the nightly run') for i in range(rows)]
+    )
+    db.commit()
+
+
+def serialize(table, path, rows):
+    """Size of the response body of `rows` serialized the `path` way; a streamed body is consumed chunk by chunk"""
+    from models import Bot, Checkpoint
+    from pagination import page_response
+    from schemas import BotSchema, CheckpointSchema
+    from serializers import row_serializer
+    from flask import jsonify
+
+    schema_cls, model, fields = {
+        'Bots': (BotSchema, Bot, list(BotSchema._declared_fields)),
+        'Checkpoints': (CheckpointSchema, Checkpoint, CHECKPOINT_FIELDS),
+    }[table]
+    if path == PATHS[0]:
+        return len(jsonify([schema_cls().dump(model.from_row(row)) for row in rows]).get_data())
+    if path == PATHS[1]:
+        return len(jsonify(schema_cls(only=fields, many=True).dump([dict(row) for row in rows])).get_data())
+    return sum(len(chunk) for chunk in page_response(row_serializer(schema_cls, fields).iter(rows), None).response)
+
+
+def measure(database, table, path):
+    """Run in a fresh process: (rows/sec, peak RSS growth in MB, response bytes)"""
+    from app import create_app
+    from database import get_read_db
+
+    app = create_app({'DATABASE': database, 'DEBUG': False})
+    with app.test_request_context():
+        db = get_read_db()
+
+        def run():
+            return serialize(table, path, db.execute(f'SELECT * FROM {table} ORDER BY id').fetchall())
+
+        serialize(table, path, db.execute(f'SELECT * FROM {table} LIMIT 100').fetchall())
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        size = run()
+        peak = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) / 1024
+        best = float('inf')
+        for _ in range(3):
+            start = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - start)
+        count = db.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    return count / best, peak, size
+
+
+def main(rows=100000):
+    with temp_app() as app:
+        from database import get_db
+        with app.app_context():
+            seed(get_db(), rows)
+        context = multiprocessing.get_context('spawn')
+        print(f"{rows} rows per response, fetch included")
+        print(f"{'':>36} {'rows/sec':>10} {'peak RSS MB':>12} {'bytes':>10}")
+        for table in ('Bots', 'Checkpoints'):
+            for path in PATHS:
+                with context.Pool(1) as pool:
+                    rate, peak, size = pool.apply(measure, (app.config['DATABASE'], table, path))
+                print(f"{table + ': ' + path:>36} {rate:>10.0f} {peak:>12.1f} {size:>10}", flush=True)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
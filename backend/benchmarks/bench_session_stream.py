@@ -0,0 +1,78 @@
+"""Live tail fan-out: delivery latency with many watchers on one session.
+
+Starts the app on a local threaded server, opens N Server-Sent Event streams
+on the same session, then posts messages and measures how long each takes to
+reach every watcher. All watchers share one poller, so database load does not
+grow with N.
+
+    python benchmarks/bench_session_stream.py [watchers] [messages]
+"""
+import http.client
+import json
+import statistics
+import sys
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+from common import temp_app
+
+
+def watch(port, expected, received, ready):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    conn.request('GET', '/api/v1/bots/1/sessions/current/stream')
+    response = conn.getresponse()
+    ready.release()
+    count = 0
+    while count < expected:
+        line = response.fp.readline()
+        if not line:
+            break
+        if line.startswith(b'data: {'):
+            sent = json.loads(line[6:])['sent']
+            received.append(time.perf_counter() - sent)
+            count += 1
+    conn.close()
+
+
+def main(watchers=200, messages=20):
+    with temp_app() as app:
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        client = app.test_client()
+        client.post('/api/v1/bots', json={'name': 'bot', 'orchestrator_bot': False})
+        client.post('/api/v1/bots/1/sessions')
+
+        received = []
+        ready = threading.Semaphore(0)
+        threads = [
+            threading.Thread(target=watch, args=(server.server_port, messages, received, ready))
+            for _ in range(watchers)
+        ]
+        for thread in threads:
+            thread.start()
+        for _ in range(watchers):
+            ready.acquire()
+        time.sleep(0.5)
+
+        start = time.perf_counter()
+        for _ in range(messages):
+            client.post('/api/v1/bots/1/sessions/current', json={'message': {'sent': time.perf_counter()}})
+            time.sleep(0.05)
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+
+    latencies = sorted(received)
+    print(f"{watchers} watchers x {messages} messages: {len(latencies)} deliveries in {elapsed:.1f}s")
+    if latencies:
+        p99 = latencies[int(len(latencies) * 0.99) - 1]
+        print(f"latency p50 {statistics.median(latencies) * 1000:.1f} ms, p99 {p99 * 1000:.1f} ms")
+    if len(latencies) != watchers * messages:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
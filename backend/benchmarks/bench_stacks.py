@@ -0,0 +1,49 @@
+"""Latency of GET /api/v1/stacks as the number of stacks grows.
+
+The endpoint issues a constant number of queries per page, so the time to
+serve a page should stay flat regardless of how many stacks exist.
+
+    python benchmarks/bench_stacks.py
+"""
+from common import temp_app, timed
+from database import get_db
+
+STACK_COUNTS = [100, 1000, 5000, 20000]
+SLOTS_PER_STACK = 4
+
+
+def seed(db, total, existing):
+    bots = db.execute('SELECT COUNT(*) FROM Bots').fetchone()[0]
+    if bots == 0:
+        db.executemany(
+            'INSERT INTO Bots (name, orchestrator_bot) VALUES (?, ?)',
+            [(f'bot-{i}', int(i == 0)) for i in range(SLOTS_PER_STACK + 1)]
+        )
+    for stack_id in range(existing + 1, total + 1):
+        db.execute(
+            'INSERT INTO Stacks (id, name, orchestrator_bot_id) VALUES (?, ?, 1)',
+            (stack_id, f'stack-{stack_id}')
+        )
+        db.executemany(
+            'INSERT INTO StackSlots (stack_id, slot_number, bot_id) VALUES (?, ?, ?)',
+            [(stack_id, slot, slot + 1) for slot in range(1, SLOTS_PER_STACK + 1)]
+        )
+    db.commit()
+
+
+def main():
+    with temp_app() as app:
+        client = app.test_client()
+        existing = 0
+        print(f"{'stacks':>8} {'first page (ms)':>16} {'last page (ms)':>15}")
+        for total in STACK_COUNTS:
+            with app.app_context():
+                seed(get_db(), total, existing)
+            existing = total
+            first = timed(lambda: client.get('/api/v1/stacks?limit=100'))
+            last = timed(lambda: client.get(f'/api/v1/stacks?limit=100&after={total - 100}'))
+            print(f"{total:>8} {first:>16.2f} {last:>15.2f}")
+
+
+if __name__ == '__main__':
+    main()
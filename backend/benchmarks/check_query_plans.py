@@ -0,0 +1,145 @@
+"""Query-plan check for the API routes.
+
+Seeds a temporary database, calls every route through the Flask test client
+while tracing the SQL each request executes, then runs EXPLAIN QUERY PLAN on
+every traced statement. Exits non-zero if any statement falls back to a full
+table scan. No test runner or CI job calls it; run it by hand after changing
+queries or indexes:
+
+    python benchmarks/check_query_plans.py
+"""
+import re
+import sqlite3
+import sys
+
+from common import temp_app
+import database
+
+# Requests to replay: (method, url, json body)
+ROUTES = [
+    ('GET', '/api/v1/bots', None),
+    ('GET', '/api/v1/bots?limit=2&after=1', None),
+    ('GET', '/api/v1/bots/1', None),
+    ('GET', '/api/v1/stacks', None),
+    ('GET', '/api/v1/stacks/1', None),
+    ('GET', '/api/v1/stacks/1/slots', None),
+    ('GET', '/api/v1/stacks/1/slots/1', None),
+    ('POST', '/api/v1/stacks/1/slots', {'stack_id': 1, 'slot_number': 3, 'bot_id': 2}),
+    ('GET', '/api/v1/bots/1/checkpoints', None),
+    ('GET', '/api/v1/bots/1/checkpoints/0', None),
+    ('GET', '/api/v1/bots/1/checkpoints/2', None),
+    ('GET', '/api/v1/bots/1/checkpoints/2?payloads=json', None),
+    ('GET', '/api/v1/bots/1/checkpoints?fields=session_history&payloads=json', None),
+    ('GET', '/api/v1/bots/1/checkpoints/2/session_history', None),
+    ('GET', '/api/v1/bots/1/checkpoints/0/context', None),
+    ('GET', '/api/v1/bots/1/checkpoints/1/diff/0', None),
+    ('POST', '/api/v1/bots/1/checkpoints', {'bot_id': 1, 'version': '1.0'}),
+    ('PATCH', '/api/v1/bots/1/checkpoints/1', {'name': 'renamed'}),
+    ('POST', '/api/v1/bots/1/sessions', None),
+    ('POST', '/api/v1/bots/1/sessions/current', {'message': {'role': 'user', 'content': 'hi'}}),
+    ('GET', '/api/v1/bots/1/sessions/current', None),
+    ('POST', '/api/v1/bots/2/sessions', None),
+    ('POST', '/api/v1/sessions/messages', [{'bot_id': 1, 'message': 'a'}, {'bot_id': 2, 'message': 'b'}]),
+    ('POST', '/api/v1/bots/1/sessions/current/end', None),
+    ('GET', '/api/v1/images/missing.png', None),
+    ('POST', '/api/v1/images/thumbnails', {'names': ['missing.png', 'other.png'], 'w': 64}),
+    ('GET', '/api/v1/python-ide/jobs/missing', None),
+    ('GET', '/api/v1/python-ide/jobs/missing/stream', None),
+    ('POST', '/api/v1/python-ide/jobs/missing/cancel', None),
+    ('GET', '/api/v1/bots/1/checkpoints/2/metrics', None),
+    ('POST', '/api/v1/bots/1/checkpoints/0/metrics', {'metrics': {'loss': 0.5}}),
+    ('POST', '/api/v1/metrics', [{'bot_id': 2, 'checkpoint_number': 1, 'metric': 'loss', 'value': 1.0}]),
+    ('GET', '/api/v1/metrics/query?metric=loss&bot_id=1&percentile=50,99&points=10&bucket=60', None),
+    ('GET', '/api/v1/metrics/query?metric=loss&stack_id=1&group_by=none&percentile=50', None),
+    ('GET', '/api/v1/search?q=bot', None),
+    ('GET', '/api/v1/search?q=stack&bot_id=2&after=5', None),
+    ('POST', '/api/v1/bots/3/checkpoints', {'bot_id': 3, 'version': '1.0', 'memories': '[{"title": "a"}]', 'memory_vectors': [[1.0] * 768]}),
+    ('PUT', '/api/v1/bots/3/checkpoints/0/memories/vectors', {'vectors': [[0.5] * 768]}),
+    ('POST', '/api/v1/memories/search', {'q_vector': [1.0] * 768, 'limit': 5}),
+    ('POST', '/api/v1/memories/search', {'q_vector': [1.0] * 768, 'bot_id': [3]}),
+]
+
+# FTS5 lookups show as SCAN ... VIRTUAL TABLE INDEX n:<constraints> (just n:
+# when unconstrained), and merging the ranked per-kind subqueries of a search
+# as SCAN (subquery-N); neither reads a whole table
+SCAN = re.compile(r'^SCAN (?!CONSTANT ROW|\(subquery-)(\S+)(?!\S| VIRTUAL TABLE INDEX \d+:\S)')
+# FTS5 reading its own few-row config tables when a connection first uses an index
+SHADOW = re.compile(r"'main'\.'\w+_config'")
+
+
+def seed(db):
+    db.executemany(
+        'INSERT INTO Bots (name, orchestrator_bot) VALUES (?, ?)',
+        [(f'bot-{i}', int(i == 0)) for i in range(200)]
+    )
+    db.executemany(
+        'INSERT INTO Checkpoints (bot_id, checkpoint_number, version, session_history) VALUES (?, ?, ?, ?)',
+        [(bot_id, n, '1.0', '[]') for bot_id in range(1, 51) for n in range(1, 21)]
+    )
+    db.executemany(
+        'INSERT INTO Sessions (bot_id, started_at, ended_at, messages) VALUES (?, ?, ?, ?)',
+        [(bot_id, f'2024-01-{day:02d}', f'2024-01-{day:02d}', '[]') for bot_id in range(1, 51) for day in range(1, 11)]
+    )
+    db.executemany(
+        'INSERT INTO Stacks (name, orchestrator_bot_id) VALUES (?, 1)',
+        [(f'stack-{i}',) for i in range(100)]
+    )
+    db.executemany(
+        'INSERT INTO StackSlots (stack_id, slot_number, bot_id) VALUES (?, ?, ?)',
+        [(stack_id, slot, slot + 1) for stack_id in range(1, 101) for slot in (1, 2)]
+    )
+    db.executemany(
+        'INSERT INTO CheckpointMetrics (bot_id, metric, checkpoint_number, value, ts) VALUES (?, ?, ?, ?, ?)',
+        [(bot_id, metric, n, n / 20, n * 60) for bot_id in range(1, 51) for metric in ('loss', 'acc') for n in range(1, 21)]
+    )
+    db.execute('ANALYZE')
+    db.commit()
+
+
+def main():
+    traced = []
+    connect = database.ConnectionPool._connect
+
+    def traced_connect(pool):
+        conn = connect(pool)
+        conn.set_trace_callback(traced.append)
+        return conn
+
+    failures = []
+    with temp_app() as app:
+        with app.app_context():
+            seed(database.get_db())
+
+        database.ConnectionPool._connect = traced_connect
+        database.close_pools(app.config['DATABASE'])
+        client = app.test_client()
+        explain = sqlite3.connect(app.config['DATABASE'])
+        try:
+            for method, url, body in ROUTES:
+                traced.clear()
+                response = client.open(url, method=method, json=body)
+                statements = list(traced)
+                for sql in statements:
+                    if not re.match(r'\s*(SELECT|INSERT|UPDATE|DELETE)', sql, re.I):
+                        continue
+                    if SHADOW.search(sql):
+                        continue
+                    for _, _, _, detail in explain.execute(f'EXPLAIN QUERY PLAN {sql}').fetchall():
+                        match = SCAN.match(detail)
+                        if match:
+                            failures.append((method, url, match.group(1), ' '.join(sql.split())))
+                print(f"{response.status_code} {method:5} {url} ({len(statements)} statements)")
+        finally:
+            explain.close()
+            database.ConnectionPool._connect = connect
+
+    if failures:
+        print("\nFull table scans:")
+        for method, url, table, sql in failures:
+            print(f"  {method} {url}: SCAN {table}\n    {sql}")
+        sys.exit(1)
+    print("\nNo full table scans.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""Shared helpers for the benchmark scripts.
+
+Each benchmark builds a throwaway database by running the migrations in a
+temporary directory, so it never touches the real ~/.modular_intelligence
+database.
+"""
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+@contextmanager
+def temp_app(**config):
+    """Yield a Flask app bound to a freshly initialised temporary database"""
+    from app import create_app
+    from database import init_db, close_pools
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'DATABASE': os.path.join(tmp, 'bench.db'), **config})
+        init_db(app)
+        try:
+            yield app
+        finally:
+            close_pools(app.config['DATABASE'])
+
+
+def timed(fn, repeat=5):
+    """Return the best wall-clock time of `repeat` calls to fn, in milliseconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
@@ -0,0 +1,241 @@
+"""Mixed read/write load test against a running server, reporting p50/p99.
+
+Starts the backend on a throwaway database (uvicorn with asgi.py by default,
+or the Flask development server for comparison), seeds it, then runs
+concurrent keep-alive clients issuing a mix of list, detail, session and
+checkpoint reads and message/checkpoint writes. A few live-tail watchers stay
+connected for the whole run, the way the UI would keep them open, and a few
+clients request a large image and then stop reading it, like downloads on a
+dead link; neither may slow the rest of the traffic down.
+
+    python benchmarks/load_test.py [--server uvicorn|flask] [--workers 2]
+        [--concurrency 32] [--duration 10] [--write-ratio 0.2] [--watchers 20]
+        [--stalled 80] [--stalled-mb 64]
+
+Pass --url to test a server that is already running instead; it has no
+image to stall on, so stalled downloads are skipped.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+READS = [
+    ('list bots', 'GET', '/api/v1/bots?limit=50'),
+    ('list checkpoints', 'GET', '/api/v1/bots/{bot}/checkpoints?limit=50'),
+    ('checkpoint detail', 'GET', '/api/v1/bots/{bot}/checkpoints/0'),
+    ('session history', 'GET', '/api/v1/bots/{bot}/checkpoints/0/session_history'),
+    ('current session', 'GET', '/api/v1/bots/{bot}/sessions/current'),
+]
+WRITES = [
+    ('post message', 'POST', '/api/v1/bots/{bot}/sessions/current'),
+    ('post checkpoint', 'POST', '/api/v1/bots/{bot}/checkpoints'),
+]
+
+
+def request(conn, method, path, body=None):
+    headers = {'Content-Type': 'application/json'} if body is not None else {}
+    conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+    response = conn.getresponse()
+    response.read()
+    return response.status
+
+
+def write_body(name, bot):
+    if name == 'post message':
+        return {'message': {'role': 'user', 'content': 'load test ' * 20}}
+    return {
+        'bot_id': bot,
+        'version': '1.0',
+        'system_prompt': 'You are a load test.',
+        'session_history': json.dumps([{'role': 'user', 'content': 'hello ' * 50}] * 20),
+    }
+
+
+def seed(host, port, bots):
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    for bot in range(1, bots + 1):
+        request(conn, 'POST', '/api/v1/bots', {'name': f'bot {bot}', 'orchestrator_bot': False})
+        request(conn, 'POST', f'/api/v1/bots/{bot}/sessions')
+        for _ in range(5):
+            request(conn, 'POST', f'/api/v1/bots/{bot}/checkpoints', write_body('post checkpoint', bot))
+    conn.close()
+
+
+def client(host, port, bots, write_ratio, deadline, results, errors):
+    rng = random.Random()
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    while time.perf_counter() < deadline:
+        bot = rng.randint(1, bots)
+        is_write = rng.random() < write_ratio
+        name, method, path = rng.choice(WRITES if is_write else READS)
+        body = write_body(name, bot) if is_write else None
+        start = time.perf_counter()
+        try:
+            status = request(conn, method, path.format(bot=bot), body)
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            status = None
+        elapsed = time.perf_counter() - start
+        if status is None or status >= 500:
+            errors.append(name)
+        results.append((name, elapsed))
+    conn.close()
+
+
+def watcher(host, port, bot, stop):
+    sock = socket.create_connection((host, port))
+    sock.sendall(f'GET /api/v1/bots/{bot}/sessions/current/stream HTTP/1.1\r\nHost: {host}\r\n\r\n'.encode())
+    sock.settimeout(0.5)
+    while not stop.is_set():
+        try:
+            if not sock.recv(65536):
+                break
+        except socket.timeout:
+            pass
+    sock.close()
+
+
+def seed_image(database, size_mb):
+    """Store a large image straight in the database; the API has no upload endpoint"""
+    conn = sqlite3.connect(database, timeout=30)
+    with conn:
+        conn.execute(
+            'INSERT INTO images (name, image_path, image_blob) VALUES (?, ?, ?)',
+            ('stalled.png', 'stalled.png', b'\x89PNG\r\n\x1a\n' + os.urandom(size_mb * 1024 * 1024 - 8))
+        )
+    conn.close()
+
+
+def stalled_download(host, port, stop):
+    """Request the large image and never read the body"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    # A small receive window makes the server's sends stall after a few pieces
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    sock.connect((host, port))
+    sock.sendall(f'GET /api/v1/images/stalled.png HTTP/1.1\r\nHost: {host}\r\n\r\n'.encode())
+    stop.wait()
+    sock.close()
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def start_server(kind, workers, port, database):
+    env = dict(os.environ, DATABASE=database)
+    if kind == 'uvicorn':
+        command = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', str(port),
+                   '--workers', str(workers), '--log-level', 'warning']
+    else:
+        command = [sys.executable, '-m', 'flask', '--app', 'app:create_app', 'run', '--port', str(port)]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f'{kind} did not start on port {port}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='test an already running server instead of starting one')
+    parser.add_argument('--server', choices=['uvicorn', 'flask'], default='uvicorn')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--watchers', type=int, default=20)
+    parser.add_argument('--stalled', type=int, default=80,
+                        help='downloads that stop reading; the default exceeds ASGI_THREADS across 2 workers')
+    parser.add_argument('--stalled-mb', type=int, default=64)
+    parser.add_argument('--bots', type=int, default=10)
+    args = parser.parse_args()
+
+    process = None
+    tmp = tempfile.TemporaryDirectory()
+    try:
+        if args.url:
+            host, port = urlsplit(args.url).hostname, urlsplit(args.url).port or 80
+            args.stalled = 0
+        else:
+            host, port = '127.0.0.1', args.port
+            database = os.path.join(tmp.name, 'load.db')
+            process = start_server(args.server, args.workers, port, database)
+            if args.stalled:
+                seed_image(database, args.stalled_mb)
+        seed(host, port, args.bots)
+
+        stop = threading.Event()
+        watchers = [
+            threading.Thread(target=watcher, args=(host, port, 1 + i % args.bots, stop), daemon=True)
+            for i in range(args.watchers)
+        ] + [
+            threading.Thread(target=stalled_download, args=(host, port, stop), daemon=True)
+            for _ in range(args.stalled)
+        ]
+        for thread in watchers:
+            thread.start()
+        # Let the stalled downloads fill their socket buffers first
+        time.sleep(1 if args.stalled else 0)
+
+        results, errors = [], []
+        deadline = time.perf_counter() + args.duration
+        clients = [
+            threading.Thread(target=client, args=(host, port, args.bots, args.write_ratio, deadline, results, errors))
+            for _ in range(args.concurrency)
+        ]
+        started = time.perf_counter()
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        stop.set()
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        tmp.cleanup()
+
+    if args.url:
+        label = args.url
+    elif args.server == 'uvicorn':
+        label = f'uvicorn ({args.workers} workers)'
+    else:
+        label = 'flask development server'
+    print(f"{label}: {args.concurrency} clients, {args.watchers} live watchers, "
+          f"{args.stalled} stalled {args.stalled_mb} MB downloads, {args.write_ratio:.0%} writes, {args.duration:.0f}s")
+    print(f"{'operation':>18} {'requests':>9} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    by_name = {}
+    for name, latency in results:
+        by_name.setdefault(name, []).append(latency)
+    for name, latencies in sorted(by_name.items()) + [('all', [l for _, l in results])]:
+        latencies.sort()
+        print(f"{name:>18} {len(latencies):>9} {statistics.median(latencies) * 1000:>9.1f} "
+              f"{percentile(latencies, 0.99) * 1000:>9.1f}")
+    print(f"\n{len(results) / elapsed:.0f} requests/s, {len(errors)} errors")
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
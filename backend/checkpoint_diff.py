@@ -0,0 +1,219 @@
+"""Structural diffs between two checkpoints for .../checkpoints/<a>/diff/<b>.
+
+Payloads are compared starting from the cheapest evidence:
+
+- a field stored identically in both checkpoints (the same inline value, or
+  the same chunk hashes in the content store) is unchanged and never loaded;
+- chunks that two payloads share at the start are not loaded, only the ones
+  from the first difference on;
+- a JSON array that the newer payload extends, like a session history that
+  grew, is recognised by comparing text, and only the appended items are
+  parsed.
+
+Other changes to the JSON payloads are diffed item by item after parsing
+both sides. The system prompt, and payloads that are not arrays, get a
+unified line diff. Payloads never change once a checkpoint exists, so the
+payload part of each diff is cached per pair of checkpoints.
+"""
+import difflib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import content_store
+import storage_codec
+
+LIST_FIELDS = content_store.JSON_FIELDS
+CONTEXT_LINES = 3
+
+
+def _stored(db, checkpoint_ids):
+    """{(checkpoint id, field): ('chunks', hashes) or ('inline', stored value)} of both checkpoints"""
+    rows = db.execute(
+        f"SELECT id, {', '.join(content_store.PAYLOAD_FIELDS)} FROM Checkpoints WHERE id IN (?, ?)",
+        checkpoint_ids
+    ).fetchall()
+    manifests = content_store.load_manifests(db, checkpoint_ids, content_store.PAYLOAD_FIELDS)
+    stored = {}
+    for row in rows:
+        for field in content_store.PAYLOAD_FIELDS:
+            hashes = manifests.get((row['id'], field))
+            stored[(row['id'], field)] = ('chunks', hashes) if hashes is not None else ('inline', row[field])
+    return stored
+
+
+def _inline_bytes(value):
+    if value is None:
+        return b''
+    if isinstance(value, bytes):
+        value = storage_codec.decode_text(value)
+    return value.encode('utf8')
+
+
+def _load(db, old, new, skip_shared):
+    """UTF-8 bytes of two stored payloads and whether any were left out.
+
+    With skip_shared, the chunks both payloads start with are left out, all
+    but the last.
+    """
+    if old[0] == new[0] == 'chunks':
+        drop = 0
+        if skip_shared:
+            for a, b in zip(old[1], new[1]):
+                if a != b:
+                    break
+                drop += 1
+            # Keep one shared chunk so each side still ends with its full closing bracket
+            drop = max(drop - 1, 0)
+        chunks = content_store.load_chunks(db, old[1][drop:] + new[1][drop:])
+        return (
+            b''.join(chunks[h] for h in old[1][drop:]),
+            b''.join(chunks[h] for h in new[1][drop:]),
+            drop > 0,
+        )
+    old_data, new_data = (
+        b''.join(content_store.load_chunks(db, side[1])[h] for h in side[1]) if side[0] == 'chunks'
+        else _inline_bytes(side[1])
+        for side in (old, new)
+    )
+    return old_data, new_data, False
+
+
+def appended_items(old, new):
+    """Items that the JSON array `new` appends to `old`, parsing only those; None unless new extends old as text.
+
+    Both are UTF-8 bytes of an array, or of a JSON string holding one (how
+    payloads posted as strings are stored); they may lack the same leading
+    bytes.
+    """
+    end = b']"' if old.endswith(b']"') else b']'
+    if not new.endswith(end):
+        return None
+    head = old[:-len(end)]
+    if not new.startswith(head):
+        return None
+    rest = new[len(head):]
+    try:
+        if end == b']"':
+            # Escapes never straddle the cut: the head is the encoding of a prefix
+            rest = json.loads(b'"' + rest).encode('utf8')
+        rest = rest.lstrip()
+        if head.rstrip() in (b'[', b'"['):
+            return json.loads(b'[' + rest)
+        if rest.startswith(b','):
+            return json.loads(b'[' + rest[1:])
+    except ValueError:
+        pass
+    return None
+
+
+def _document(data):
+    """A payload's JSON value (unwrapping the string layer), or its text when it is not JSON"""
+    if not data:
+        return None
+    return content_store.parse_json(data.decode('utf8'))
+
+
+def _text_lines(value):
+    if value is None:
+        return []
+    if not isinstance(value, str):
+        value = json.dumps(value, indent=2, ensure_ascii=False)
+    return value.splitlines()
+
+
+def _text_diff(old, new):
+    lines = difflib.unified_diff(_text_lines(old), _text_lines(new), lineterm='', n=CONTEXT_LINES)
+    # Drop the ---/+++ file header
+    return {'diff': list(lines)[2:]}
+
+
+def _list_diff(old, new):
+    """Items removed from and added to a list, matched as whole JSON values"""
+    # Only the part between the common start and end needs matching
+    start = 0
+    while start < min(len(old), len(new)) and old[start] == new[start]:
+        start += 1
+    end = 0
+    while end < min(len(old), len(new)) - start and old[-1 - end] == new[-1 - end]:
+        end += 1
+    old, new = old[start:len(old) - end], new[start:len(new) - end]
+
+    added, removed = [], []
+    matcher = difflib.SequenceMatcher(
+        None, [json.dumps(item, sort_keys=True) for item in old], [json.dumps(item, sort_keys=True) for item in new],
+        autojunk=False
+    )
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag in ('replace', 'delete'):
+            removed.extend(old[i1:i2])
+        if tag in ('replace', 'insert'):
+            added.extend(new[j1:j2])
+    return {'appended': not removed and end == 0, 'added': added, 'removed': removed}
+
+
+def _field_diff(db, field, old, new):
+    if old == new:
+        return None
+    old_data, new_data, skipped = _load(db, old, new, skip_shared=field in LIST_FIELDS)
+    if field in LIST_FIELDS and old_data and new_data:
+        items = appended_items(old_data, new_data)
+        if items is not None:
+            return {'appended': True, 'added': items, 'removed': []} if items else None
+    if skipped:
+        old_data, new_data, _ = _load(db, old, new, skip_shared=False)
+    if old_data == new_data:
+        return None
+    if field not in LIST_FIELDS:
+        return _text_diff(old_data.decode('utf8'), new_data.decode('utf8'))
+    old_value, new_value = _document(old_data), _document(new_data)
+    if isinstance(old_value, (list, type(None))) and isinstance(new_value, (list, type(None))):
+        return _list_diff(old_value or [], new_value or [])
+    return _text_diff(old_value, new_value)
+
+
+def payload_diff(db, old_id, new_id):
+    """{field: None if unchanged, else the field's diff} of the payload fields of two checkpoints"""
+    stored = _stored(db, (old_id, new_id))
+    return {
+        field: _field_diff(db, field, stored[(old_id, field)], stored[(new_id, field)])
+        for field in content_store.PAYLOAD_FIELDS
+    }
+
+
+class DiffCache:
+    """Payload diffs of recently compared checkpoint pairs, least recently used dropped first"""
+
+    def __init__(self, size):
+        self.size = size
+        self._lock = threading.Lock()
+        self._diffs = OrderedDict()
+
+    def get(self, db, old_id, new_id):
+        key = (old_id, new_id)
+        with self._lock:
+            diff = self._diffs.get(key)
+            if diff is not None:
+                self._diffs.move_to_end(key)
+                return diff
+        diff = payload_diff(db, old_id, new_id)
+        with self._lock:
+            self._diffs[key] = diff
+            while len(self._diffs) > self.size:
+                self._diffs.popitem(last=False)
+        return diff
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(config):
+    """Return this process's checkpoint diff cache for the configured database"""
+    key = (os.getpid(), str(config['DATABASE']))
+    cache = _caches.get(key)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.setdefault(key, DiffCache(config['CHECKPOINT_DIFF_CACHE_SIZE']))
+    return cache
@@ -0,0 +1,59 @@
+"""Move existing inline checkpoint payloads into the deduplicated content store.
+
+Checkpoints written before the content store existed (or written directly by
+the modular-intelligence library) keep their payloads inline. This script
+moves payloads above CONTENT_INLINE_MAX into chunks, deletes unreferenced
+chunks and, with --vacuum, returns the freed pages to the filesystem.
+
+    python compact_checkpoints.py [--vacuum]
+"""
+import sys
+
+import content_store
+from app import create_app
+from database import get_db
+
+BATCH_SIZE = 200
+
+app = create_app()
+with app.app_context():
+    db = get_db()
+    inline_max = app.config['CONTENT_INLINE_MAX']
+    chunk_size = app.config['CONTENT_CHUNK_SIZE']
+    codec = app.config['STORAGE_CODEC']
+    compress_min_size = app.config['STORAGE_COMPRESS_MIN_SIZE']
+    fields = content_store.PAYLOAD_FIELDS
+    moved = 0
+    last_id = 0
+    while True:
+        rows = db.execute(
+            f'''
+            SELECT id, {', '.join(fields)} FROM Checkpoints
+            WHERE id > ? AND ({' OR '.join(f'length({f}) > ?' for f in fields)})
+            ORDER BY id LIMIT ?
+            ''',
+            (last_id, *([inline_max] * len(fields)), BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        db.execute('BEGIN IMMEDIATE')
+        for row in rows:
+            inline, stored = content_store.split_payloads(
+                {f: row[f] for f in fields}, inline_max
+            )
+            content_store.put_payloads(db, row['id'], stored, chunk_size, codec, compress_min_size)
+            db.execute(
+                f"UPDATE Checkpoints SET {', '.join(f'{f} = NULL' for f in stored)} WHERE id = ?",
+                (row['id'],)
+            )
+            moved += len(stored)
+        db.commit()
+        last_id = rows[-1]['id']
+
+    removed = content_store.collect_garbage(db)
+    db.commit()
+    print(f"Moved {moved} payload(s) into the content store, removed {removed} unreferenced chunk(s)")
+
+    if '--vacuum' in sys.argv:
+        db.execute('VACUUM')
+        print("Vacuumed database")
@@ -3,19 +3,92 @@ from pathlib import Path
 
 class Config:
     APP_NAME = "modular_intelligence"
-    DATABASE = Path.home() / f".{APP_NAME}" / f"{APP_NAME}.db"
+    # docker-compose points DATABASE at the mounted file
+    DATABASE = Path(os.environ.get("DATABASE", Path.home() / f".{APP_NAME}" / f"{APP_NAME}.db"))
     DEBUG = True
     PORT = 5000
     ENABLE_FOREIGN_KEYS = True
-    SCHEMA_PATH = os.path.join(os.path.dirname(__file__), 'schema.sql')
+    # SQLite connection pooling and tuning
+    DB_READ_POOL_SIZE = 8
+    DB_WRITE_POOL_SIZE = 2
+    DB_POOL_TIMEOUT = 30
+    DB_JOURNAL_MODE = "WAL"
+    DB_SYNCHRONOUS = "NORMAL"
+    DB_BUSY_TIMEOUT_MS = 5000
+    DB_MMAP_SIZE = 256 * 1024 * 1024
+    DB_CACHE_SIZE_KIB = 64 * 1024
+    MIGRATIONS_PATH = os.path.join(os.path.dirname(__file__), 'migrations')
+    # Apply pending schema migrations when the app starts
+    AUTO_MIGRATE = True
     TABLES = {
     'BOTS': 'Bots',
     'CHECKPOINTS': 'Checkpoints',
     'STACKS': 'Stacks',
     'STACKSLOTS': 'StackSlots'
     }
-    QDRANT_COLLECTION_NAME = "assistant_memory"
+    DEFAULT_PAGE_SIZE = 100
+    MAX_PAGE_SIZE = 1000
+    # Results per page of /api/v1/search, and default hits of /api/v1/memories/search
+    SEARCH_PAGE_SIZE = 20
+    SESSION_BATCH_MAX_MESSAGES = 10000
+    METRICS_BATCH_MAX = 10000
+    # Checkpoint payloads larger than this many characters are stored as deduplicated chunks
+    CONTENT_INLINE_MAX = 4096
+    CONTENT_CHUNK_SIZE = 64 * 1024
+    # Checkpoint pairs whose payload diff (.../checkpoints/<a>/diff/<b>) each process keeps
+    CHECKPOINT_DIFF_CACHE_SIZE = 256
+    # Compression for stored payloads: "zlib", "zstd" (needs the zstandard package) or "none"
+    STORAGE_CODEC = "zlib"
+    STORAGE_COMPRESS_MIN_SIZE = 1024
+    # Images are streamed from their BLOB in pieces of this size
+    IMAGE_STREAM_CHUNK_SIZE = 256 * 1024
+    # Bytes read through one BLOB handle, and held in memory, before its connection is returned
+    IMAGE_STREAM_RUN_SIZE = 4 * 1024 * 1024
+    # Resized derivatives (?w=, ?h=, ?format=) are cached here; None puts the cache next to the database
+    IMAGE_CACHE_DIR = None
+    IMAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+    IMAGE_WORKERS = 4
+    # Derivatives still rendering answer 202; clients retry after this many seconds
+    IMAGE_RENDER_RETRY_AFTER = 1
+    # A render pending for longer is reported as failed (503)
+    IMAGE_RENDER_TIMEOUT = 30
+    IMAGE_BULK_MAX = 200
+    # Threads per worker for request handling under asgi.py
+    ASGI_THREADS = 32
+    # Live tail of session messages (GET .../sessions/current/stream)
+    SESSION_STREAM_POLL_INTERVAL = 0.5
+    SESSION_STREAM_HEARTBEAT = 15
+    SESSION_STREAM_BUFFER = 1000
+    # Python IDE scripts run in separate processes, PYTHON_IDE_WORKERS at a time per server worker
+    PYTHON_IDE_WORKERS = 4
+    # Jobs allowed to wait for a free worker before new ones are refused with 429
+    PYTHON_IDE_QUEUE_SIZE = 32
+    # Per-job limits: wall-clock and CPU seconds, address space in bytes
+    PYTHON_IDE_TIMEOUT = 300
+    PYTHON_IDE_CPU_LIMIT = 60
+    PYTHON_IDE_MEMORY_LIMIT = 2 * 1024 * 1024 * 1024
+    # Characters of output kept per job; older output is dropped first
+    PYTHON_IDE_MAX_OUTPUT = 4 * 1024 * 1024
+    # Finished jobs and their output are deleted after this many seconds
+    PYTHON_IDE_JOB_RETENTION = 3600
+    # How often job output streams check for output written by other processes
+    PYTHON_IDE_POLL_INTERVAL = 0.5
+    # Script templates; None uses the scripts/ directory of the modular_intelligence package
+    PYTHON_IDE_SCRIPTS_DIR = None
+    # Seconds between checks for script templates edited in place
+    PYTHON_IDE_SCRIPTS_RESCAN = 2
+    # Checkpoint memory embeddings (/api/v1/memories/search)
     VECTOR_SIZE = 768
+    # Rank by brute force up to this many vectors, with an approximate IVF index above
+    MEMORY_INDEX_EXACT_MAX = 20000
+    # IVF lists scanned per query; more is slower and finds more of the true nearest
+    MEMORY_INDEX_NPROBE = 16
+    # Embeds memories sent without vectors, and ?q= text: "module:function" or a callable
+    # taking a list of strings and returning one VECTOR_SIZE vector per string
+    MEMORY_EMBEDDER = None
+    # Also upsert memory vectors to this Qdrant collection (needs qdrant-client); None keeps them local
+    QDRANT_URL = None
+    QDRANT_COLLECTION_NAME = "assistant_memory"
 
     # Add any additional configuration settings here
     SQLITE_URI = f'sqlite:///{DATABASE}'
@@ -0,0 +1,185 @@
+"""Content-addressed, deduplicated storage for checkpoint payloads.
+
+Large checkpoint payloads are cut into fixed-size chunks and each chunk is
+stored once in ContentChunks under its SHA-256. A checkpoint keeps only a
+manifest (the ordered chunk hashes) per field in CheckpointPayloads, and the
+inline column on Checkpoints is left NULL.
+
+Fixed-size chunks are aligned to the start of the payload, so a session
+history that grew by a few messages shares every chunk except the last with
+the previous checkpoint. Payloads below the inline threshold stay in their
+Checkpoints column as before.
+
+Both chunks and inline values go through storage_codec, so they may be stored
+compressed. Chunks are hashed before compression, which keeps deduplication
+independent of the configured codec.
+"""
+import hashlib
+import json
+
+import storage_codec
+
+PAYLOAD_FIELDS = ('system_prompt', 'datasets', 'memories', 'session_history')
+# Payloads holding JSON text; Checkpoints.payloads_json marks rows where all of them pass is_json_payload
+JSON_FIELDS = ('datasets', 'memories', 'session_history')
+
+
+def split_payloads(payloads, inline_max, codec='none', compress_min_size=0):
+    """Split field -> text into (values for the Checkpoints row, payloads to store as chunks)"""
+    inline = {}
+    stored = {}
+    for field, value in payloads.items():
+        if field not in PAYLOAD_FIELDS or value is None:
+            inline[field] = value
+        elif len(value) > inline_max:
+            inline[field] = None
+            stored[field] = value
+        else:
+            inline[field] = storage_codec.encode_text(value, codec, compress_min_size)
+    return inline, stored
+
+
+def chunk(data, chunk_size):
+    return [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)] or [b'']
+
+
+def put_payloads(db, checkpoint_id, payloads, chunk_size, codec='none', compress_min_size=0):
+    """Store field -> text for a checkpoint; must run inside the caller's transaction"""
+    for field, value in payloads.items():
+        data = value.encode('utf8')
+        chunks = chunk(data, chunk_size)
+        hashes = [hashlib.sha256(c).hexdigest() for c in chunks]
+        known = {row[0] for row in db.execute(
+            f"SELECT hash FROM ContentChunks WHERE hash IN ({', '.join('?' * len(hashes))})",
+            hashes
+        )}
+        # Only compress chunks that are new; shared prefixes are already stored
+        db.executemany(
+            'INSERT OR IGNORE INTO ContentChunks (hash, size, data) VALUES (?, ?, ?)',
+            [
+                (h, len(c), storage_codec.compress(c, codec, compress_min_size))
+                for h, c in zip(hashes, chunks) if h not in known
+            ]
+        )
+        db.execute(
+            '''
+            INSERT OR REPLACE INTO CheckpointPayloads (checkpoint_id, field, size, chunks)
+            VALUES (?, ?, ?, ?)
+            ''',
+            (checkpoint_id, field, len(data), json.dumps(hashes))
+        )
+
+
+def load_manifests(db, checkpoint_ids, fields):
+    """Return {(checkpoint_id, field): [chunk hashes]} for the given checkpoints"""
+    fields = [f for f in fields if f in PAYLOAD_FIELDS]
+    if not checkpoint_ids or not fields:
+        return {}
+    rows = db.execute(
+        f'''
+        SELECT checkpoint_id, field, chunks FROM CheckpointPayloads
+        WHERE checkpoint_id IN ({', '.join('?' * len(checkpoint_ids))})
+          AND field IN ({', '.join('?' * len(fields))})
+        ''',
+        (*checkpoint_ids, *fields)
+    ).fetchall()
+    return {(row['checkpoint_id'], row['field']): json.loads(row['chunks']) for row in rows}
+
+
+def load_chunks(db, hashes):
+    """Return {hash: bytes} for the given chunk hashes, decompressed"""
+    hashes = list(set(hashes))
+    found = {}
+    # Stay well below SQLite's bound-parameter limit
+    for i in range(0, len(hashes), 500):
+        batch = hashes[i:i + 500]
+        for row in db.execute(
+            f"SELECT hash, data FROM ContentChunks WHERE hash IN ({', '.join('?' * len(batch))})",
+            batch
+        ):
+            found[row[0]] = storage_codec.decompress(row[1])
+    return found
+
+
+def _utf8(value):
+    if isinstance(value, bytes):
+        return storage_codec.decompress(value)
+    return value.encode('utf8')
+
+
+def hydrate(db, rows, fields, raw=()):
+    """Turn Checkpoints rows into dicts with chunk-stored payload fields reassembled.
+
+    Rows must include `id`; only payload fields listed in `fields` are loaded.
+    Payload fields also listed in `raw` are returned as UTF-8 bytes instead of text.
+    """
+    items = [dict(row) for row in rows]
+    for item in items:
+        for field in fields:
+            if field in PAYLOAD_FIELDS and item.get(field) is not None:
+                if field in raw:
+                    item[field] = _utf8(item[field])
+                elif isinstance(item[field], bytes):
+                    item[field] = storage_codec.decode_text(item[field])
+    missing = [
+        item['id'] for item in items
+        if any(f in item and item[f] is None for f in fields if f in PAYLOAD_FIELDS)
+    ]
+    manifests = load_manifests(db, missing, fields)
+    if not manifests:
+        return items
+    chunks = load_chunks(db, [h for hashes in manifests.values() for h in hashes])
+    for item in items:
+        for field in fields:
+            hashes = manifests.get((item['id'], field))
+            if hashes is not None:
+                data = b''.join(chunks[h] for h in hashes)
+                item[field] = data if field in raw else data.decode('utf8')
+    return items
+
+
+def json_payload(text):
+    """The stored form of a JSON payload posted as text: the text encoded as a JSON string"""
+    return json.dumps(text) if text else None
+
+
+def is_json_payload(stored):
+    """Whether a stored payload is NULL or a JSON string whose text is itself valid JSON"""
+    if stored is None:
+        return True
+    try:
+        text = json.loads(stored)
+        if not isinstance(text, str):
+            return False
+        json.loads(text)
+    except ValueError:
+        return False
+    return True
+
+
+def unwrap_json(stored):
+    """The JSON text held by a payload that passes is_json_payload, as UTF-8 bytes; only the string layer is decoded"""
+    return json.loads(stored).encode('utf8')
+
+
+def parse_json(value):
+    """The JSON value of a payload; payloads posted as JSON text are stored encoded twice, and text that is not JSON is returned as is"""
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        return value
+    if isinstance(parsed, str):
+        return parse_json(parsed)
+    return parsed
+
+
+def collect_garbage(db):
+    """Delete chunks no longer referenced by any manifest; returns the number removed"""
+    cursor = db.execute(
+        '''
+        DELETE FROM ContentChunks WHERE hash NOT IN (
+            SELECT value FROM CheckpointPayloads, json_each(CheckpointPayloads.chunks)
+        )
+        '''
+    )
+    return cursor.rowcount
@@ -1,34 +1,144 @@
+import os
+import queue
 import sqlite3
+import threading
 from flask import g, current_app
 from pathlib import Path
 from config import Config
 
-def get_db(DB_PATH=Config.DATABASE):
+class ConnectionPool:
+    """A bounded pool of SQLite connections that share the same PRAGMA setup"""
+
+    def __init__(self, path, size, readonly=False, timeout=30.0, pragmas=()):
+        self.path = str(path)
+        self.readonly = readonly
+        self.timeout = timeout
+        self.pragmas = pragmas
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        if self.readonly:
+            conn = sqlite3.connect(
+                Path(self.path).resolve().as_uri() + '?mode=ro',
+                uri=True,
+                detect_types=sqlite3.PARSE_DECLTYPES,
+                check_same_thread=False
+            )
+        else:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                self.path,
+                detect_types=sqlite3.PARSE_DECLTYPES,
+                check_same_thread=False
+            )
+        conn.row_factory = sqlite3.Row
+        for pragma in self.pragmas:
+            conn.execute(f"PRAGMA {pragma};")
+        return conn
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise sqlite3.OperationalError('Timed out waiting for a database connection')
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn):
+        # Never hand out a connection with a half-finished transaction
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+        self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _pragmas(config, readonly):
+    pragmas = [
+        f"busy_timeout = {int(config['DB_BUSY_TIMEOUT_MS'])}",
+        f"synchronous = {config['DB_SYNCHRONOUS']}",
+        f"cache_size = {-int(config['DB_CACHE_SIZE_KIB'])}",
+        f"mmap_size = {int(config['DB_MMAP_SIZE'])}",
+    ]
+    if config['ENABLE_FOREIGN_KEYS']:
+        pragmas.append("foreign_keys = ON")
+    if readonly:
+        pragmas.append("query_only = ON")
+    else:
+        # journal_mode is persistent in the file, so setting it from the writer is enough
+        pragmas.insert(0, f"journal_mode = {config['DB_JOURNAL_MODE']}")
+    return pragmas
+
+def get_pool(readonly=False):
+    """Return this process's pool for the configured database, creating it on first use"""
+    config = current_app.config
+    # Pools are per process: connections must not be shared across a fork
+    key = (os.getpid(), str(config['DATABASE']), readonly)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(
+                    config['DATABASE'],
+                    config['DB_READ_POOL_SIZE'] if readonly else config['DB_WRITE_POOL_SIZE'],
+                    readonly=readonly,
+                    timeout=config['DB_POOL_TIMEOUT'],
+                    pragmas=_pragmas(config, readonly)
+                )
+                _pools[key] = pool
+    return pool
+
+def close_pools(path=None):
+    with _pools_lock:
+        for key in [k for k in _pools if path is None or k[1] == str(path)]:
+            _pools.pop(key).close()
+
+def get_db():
+    """Connection for the current request that may write"""
     if 'db' not in g:
-        g.db = sqlite3.connect(
-            DB_PATH,
-            detect_types=sqlite3.PARSE_DECLTYPES
-        )
-        g.db.row_factory = sqlite3.Row
-        # Enable foreign key constraint support
-        g.db.execute("PRAGMA foreign_keys = ON;")
+        g.db = get_pool(readonly=False).acquire()
     return g.db
 
+def get_read_db():
+    """Read-only connection for the current request; in WAL mode readers never block the writer"""
+    if 'read_db' not in g:
+        g.read_db = get_pool(readonly=True).acquire()
+    return g.read_db
+
 def close_db(e=None):
     db = g.pop('db', None)
-
     if db is not None:
-        db.close()
+        get_pool(readonly=False).release(db)
 
-def init_db(app):
+    read_db = g.pop('read_db', None)
+    if read_db is not None:
+        get_pool(readonly=True).release(read_db)
+
+def init_app(app):
     app.teardown_appcontext(close_db)
-    print("Initializing database...", Config.DATABASE)
-    db_path = Path(Config.DATABASE)
-    # Always reinitialize the database for this setup
-    if db_path.exists():
-        db_path.unlink()
+
+def init_db(app):
+    """Bring the database up to the latest schema version without touching existing data"""
+    from migrations import migrate
+
+    print("Initializing database...", app.config['DATABASE'])
     with app.app_context():
-        db = get_db()
-        with current_app.open_resource(Config.SCHEMA_PATH) as f:
-            db.executescript(f.read().decode('utf8'))
-        db.commit()
+        applied = migrate(get_db(), app.config['MIGRATIONS_PATH'])
+    for migration in applied:
+        print(f"Applied migration {migration.version:04d}_{migration.name}")
+    return applied
@@ -0,0 +1,34 @@
+from flask import request, make_response
+
+
+def etag_for(*parts):
+    """Build a strong ETag value from the parts that identify a representation"""
+    return '-'.join(str(part) for part in parts)
+
+
+def not_modified(etag, last_modified=None):
+    """Return a 304 response if the request's validators still match, else None.
+
+    Handlers call this after a cheap metadata lookup and before reading any payload.
+    """
+    if request.if_none_match:
+        matched = request.if_none_match.contains(etag)
+    elif request.if_modified_since and last_modified is not None:
+        matched = last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+    else:
+        matched = False
+    if not matched:
+        return None
+    return set_cache_headers(make_response('', 304), etag, last_modified)
+
+
+def set_cache_headers(response, etag, last_modified=None, immutable=False):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    if immutable:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        # Cache, but revalidate every time; a revalidation costs a 304
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
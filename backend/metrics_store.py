@@ -0,0 +1,246 @@
+"""Per-checkpoint metric values and the aggregates computed over them.
+
+Metrics live one value per row in CheckpointMetrics (bot_id, metric,
+checkpoint_number, value, ts), so every aggregate is a single indexed SQL
+query instead of parsing checkpoint payloads:
+
+- summaries (count, min, max, avg, stddev) are one GROUP BY, with stddev the
+  population standard deviation taken in a second pass over the deviations
+  from each group's mean, which keeps its precision when values are large
+  relative to their spread;
+- percentiles read two neighbouring rows at the right OFFSET of the value
+  index and interpolate between them, like numpy's default method, without
+  sorting or fetching the series;
+- a downsampled series groups checkpoints into at most `points` buckets per
+  group and returns each bucket's min/avg/max, which keeps peaks visible;
+- time buckets group on ts // bucket.
+
+Results are grouped per bot or, with group_by="none", across all selected bots.
+"""
+import math
+import time
+
+SUMMARY_STATS = ('count', 'min', 'max', 'avg', 'stddev')
+
+
+def record(db, rows):
+    """Insert or replace (bot_id, checkpoint_number, metric, value, ts) rows; ts None means now.
+
+    Runs inside the caller's transaction.
+    """
+    now = time.time()
+    db.executemany(
+        '''
+        INSERT INTO CheckpointMetrics (bot_id, metric, checkpoint_number, value, ts)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (bot_id, metric, checkpoint_number) DO UPDATE SET value = excluded.value, ts = excluded.ts
+        ''',
+        [
+            (bot_id, metric, checkpoint_number, value, now if ts is None else ts)
+            for bot_id, checkpoint_number, metric, value, ts in rows
+        ]
+    )
+
+
+def missing_checkpoints(db, pairs):
+    """The distinct (bot_id, checkpoint_number) pairs that have no checkpoint, in the order given"""
+    pairs = list(dict.fromkeys(pairs))
+    found = set()
+    for i in range(0, len(pairs), 500):
+        batch = pairs[i:i + 500]
+        found.update(
+            (row['bot_id'], row['checkpoint_number']) for row in db.execute(
+                f'''
+                WITH wanted (bot_id, checkpoint_number) AS (
+                    VALUES {', '.join('(?, ?)' for _ in batch)}
+                )
+                SELECT c.bot_id, c.checkpoint_number
+                FROM wanted w
+                JOIN Checkpoints c ON c.bot_id = w.bot_id AND c.checkpoint_number = w.checkpoint_number
+                ''',
+                [value for pair in batch for value in pair]
+            )
+        )
+    return [pair for pair in pairs if pair not in found]
+
+
+def checkpoint_metrics(db, bot_id, checkpoint_number):
+    return {
+        row['metric']: row['value'] for row in db.execute(
+            '''
+            SELECT metric, value FROM CheckpointMetrics
+            WHERE bot_id = ? AND checkpoint_number = ?
+            ''',
+            (bot_id, checkpoint_number)
+        )
+    }
+
+
+def stack_bot_ids(db, stack_id):
+    """The stack's orchestrator and slot bots, or None if the stack does not exist"""
+    stack = db.execute('SELECT orchestrator_bot_id FROM Stacks WHERE id = ?', (stack_id,)).fetchone()
+    if stack is None:
+        return None
+    bot_ids = {
+        row[0] for row in db.execute(
+            'SELECT bot_id FROM StackSlots WHERE stack_id = ? AND bot_id IS NOT NULL', (stack_id,)
+        )
+    }
+    if stack['orchestrator_bot_id'] is not None:
+        bot_ids.add(stack['orchestrator_bot_id'])
+    return sorted(bot_ids)
+
+
+class MetricQuery:
+    """WHERE clause and grouping shared by the aggregate queries"""
+
+    def __init__(self, metric, bot_ids=None, group_by='bot', checkpoint_range=(None, None), ts_range=(None, None)):
+        self.group_by = group_by
+        clauses = ['metric = ?']
+        params = [metric]
+        if bot_ids is not None:
+            clauses.append(f"bot_id IN ({', '.join('?' * len(bot_ids))})")
+            params.extend(bot_ids)
+        for column, (low, high) in (('checkpoint_number', checkpoint_range), ('ts', ts_range)):
+            if low is not None:
+                clauses.append(f'{column} >= ?')
+                params.append(low)
+            if high is not None:
+                clauses.append(f'{column} <= ?')
+                params.append(high)
+        self.where = ' AND '.join(clauses)
+        self.params = params
+        # NULL groups every selected bot together
+        self.group = 'bot_id' if group_by == 'bot' else 'NULL'
+
+    def summaries(self, db):
+        """{group: summary}, with the checkpoint range each group spans.
+
+        stddev is the population standard deviation (divided by count, not count - 1).
+        """
+        # AVG(value * value) - AVG(value)^2 cancels catastrophically when the mean is
+        # large against the spread, so average the squared deviations from the group mean
+        rows = db.execute(
+            f'''
+            WITH m AS (
+                SELECT {self.group} AS grp, checkpoint_number, value, ts
+                FROM CheckpointMetrics WHERE {self.where}
+            ),
+            means AS (
+                SELECT grp, AVG(value) AS mean FROM m GROUP BY grp
+            )
+            SELECT m.grp AS grp, COUNT(*) AS count, MIN(m.value) AS min, MAX(m.value) AS max,
+                   means.mean AS avg, AVG((m.value - means.mean) * (m.value - means.mean)) AS variance,
+                   MIN(m.checkpoint_number) AS first_checkpoint, MAX(m.checkpoint_number) AS last_checkpoint,
+                   MIN(m.ts) AS first_ts, MAX(m.ts) AS last_ts
+            FROM m JOIN means ON means.grp IS m.grp
+            GROUP BY m.grp ORDER BY m.grp
+            ''',
+            self.params
+        ).fetchall()
+        summaries = {}
+        for row in rows:
+            summary = dict(row)
+            del summary['grp']
+            summary['stddev'] = math.sqrt(summary.pop('variance'))
+            summaries[row['grp']] = summary
+        return summaries
+
+    def percentile(self, db, group, count, p):
+        """Linearly interpolated p-th percentile (0-100) of a group with `count` values"""
+        position = (count - 1) * p / 100
+        offset = math.floor(position)
+        where, params = self._group_where(group)
+        values = [
+            row[0] for row in db.execute(
+                f'SELECT value FROM CheckpointMetrics WHERE {where} ORDER BY value LIMIT 2 OFFSET ?',
+                params + [offset]
+            )
+        ]
+        if len(values) < 2:
+            return values[0]
+        return values[0] + (values[1] - values[0]) * (position - offset)
+
+    def _group_where(self, group):
+        if self.group_by != 'bot':
+            return self.where, list(self.params)
+        return f'{self.where} AND bot_id = ?', self.params + [group]
+
+    def series(self, db, summaries, points):
+        """{group: [bucket]} with at most `points` checkpoint buckets per group"""
+        if not summaries:
+            return {}
+        bounds = list(summaries.items())
+        rows = db.execute(
+            f'''
+            WITH bounds (grp, first_checkpoint, span) AS (
+                VALUES {', '.join('(?, ?, ?)' for _ in bounds)}
+            )
+            SELECT m.grp AS grp,
+                   (m.checkpoint_number - b.first_checkpoint) * ? / b.span AS bucket,
+                   MIN(m.checkpoint_number) AS first_checkpoint, MAX(m.checkpoint_number) AS last_checkpoint,
+                   COUNT(*) AS count, MIN(m.value) AS min, AVG(m.value) AS avg, MAX(m.value) AS max,
+                   MAX(m.ts) AS ts
+            FROM (
+                SELECT {self.group} AS grp, checkpoint_number, value, ts
+                FROM CheckpointMetrics WHERE {self.where}
+            ) m
+            JOIN bounds b ON b.grp IS m.grp
+            GROUP BY m.grp, bucket
+            ORDER BY m.grp, bucket
+            ''',
+            [
+                value
+                for group, summary in bounds
+                for value in (group, summary['first_checkpoint'],
+                              summary['last_checkpoint'] - summary['first_checkpoint'] + 1)
+            ] + [points] + self.params
+        ).fetchall()
+        return self._grouped(rows, 'bucket')
+
+    def time_buckets(self, db, bucket_seconds):
+        """{group: [bucket]} with one bucket per `bucket_seconds` that has data"""
+        rows = db.execute(
+            f'''
+            SELECT {self.group} AS grp, CAST(ts / ? AS INTEGER) * ? AS start,
+                   COUNT(*) AS count, MIN(value) AS min, AVG(value) AS avg, MAX(value) AS max
+            FROM CheckpointMetrics WHERE {self.where}
+            GROUP BY grp, start
+            ORDER BY grp, start
+            ''',
+            [bucket_seconds, bucket_seconds] + self.params
+        ).fetchall()
+        return self._grouped(rows)
+
+    @staticmethod
+    def _grouped(rows, drop=None):
+        grouped = {}
+        for row in rows:
+            item = dict(row)
+            group = item.pop('grp')
+            if drop is not None:
+                item.pop(drop)
+            grouped.setdefault(group, []).append(item)
+        return grouped
+
+
+def aggregate(db, query, stats=SUMMARY_STATS, percentiles=(), points=None, bucket=None):
+    """Aggregate one metric; returns a list of {bot_id, stats, [series], [buckets]} groups"""
+    summaries = query.summaries(db)
+    series = query.series(db, summaries, points) if points else {}
+    buckets = query.time_buckets(db, bucket) if bucket else {}
+    groups = []
+    for group, summary in summaries.items():
+        result = {'stats': {stat: summary[stat] for stat in stats}}
+        if query.group_by == 'bot':
+            result['bot_id'] = group
+        for p in percentiles:
+            result['stats'][f'p{p:g}'] = query.percentile(db, group, summary['count'], p)
+        result['checkpoints'] = [summary['first_checkpoint'], summary['last_checkpoint']]
+        result['ts'] = [summary['first_ts'], summary['last_ts']]
+        if points:
+            result['series'] = series.get(group, [])
+        if bucket:
+            result['buckets'] = buckets.get(group, [])
+        groups.append(result)
+    return groups
@@ -1,12 +1,5 @@
--- Drop existing tables if they exist
-DROP TABLE IF EXISTS StackSlots;
-DROP TABLE IF EXISTS Stacks;
-DROP TABLE IF EXISTS Checkpoints;
-DROP TABLE IF EXISTS Bots;
-DROP TABLE IF EXISTS Sessions;
-
--- Enable foreign key constraint support
-PRAGMA foreign_keys = ON;
+-- Baseline schema. Every statement is IF NOT EXISTS so it is a no-op on
+-- databases that were created before migrations were tracked.
 
 -- Create Bots table with orchestrator_bot flag
 CREATE TABLE IF NOT EXISTS Bots (
@@ -0,0 +1,41 @@
+"""Move session messages into the append-only SessionMessages log.
+
+Legacy Sessions.messages JSON blobs are split into one row per message and
+the blob is reset to an empty array, leaving the log as the source of truth.
+"""
+import json
+
+
+def upgrade(db):
+    db.execute(
+        '''
+        CREATE TABLE IF NOT EXISTS SessionMessages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id INTEGER NOT NULL,
+            seq INTEGER NOT NULL,
+            message TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (session_id) REFERENCES Sessions(id) ON DELETE CASCADE
+        )
+        '''
+    )
+    db.execute(
+        '''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_session_messages_session_seq
+            ON SessionMessages (session_id, seq)
+        '''
+    )
+    sessions = db.execute(
+        "SELECT id, messages FROM Sessions WHERE messages IS NOT NULL AND messages NOT IN ('', '[]')"
+    ).fetchall()
+    for session in sessions:
+        messages = json.loads(session['messages'])
+        offset = db.execute(
+            'SELECT COALESCE(MAX(seq), 0) FROM SessionMessages WHERE session_id = ?',
+            (session['id'],)
+        ).fetchone()[0]
+        db.executemany(
+            'INSERT INTO SessionMessages (session_id, seq, message) VALUES (?, ?, ?)',
+            [(session['id'], offset + i, json.dumps(m)) for i, m in enumerate(messages, start=1)]
+        )
+        db.execute("UPDATE Sessions SET messages = '[]' WHERE id = ?", (session['id'],))
@@ -0,0 +1,53 @@
+"""Unique checkpoint numbers.
+
+Checkpoints are looked up by (bot_id, checkpoint_number). Before the unique
+index on that pair is built, any duplicate pairs left by earlier racing
+writers are renumbered: the oldest row keeps its number and the others move
+past the bot's current maximum. This migration is blocking: the renumbering
+must not overlap with new checkpoints being numbered.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def renumber_duplicate_checkpoints(db):
+    # One sort of the table instead of a correlated lookup per row
+    duplicates = db.execute(
+        '''
+        SELECT id, bot_id FROM (
+            SELECT id, bot_id, ROW_NUMBER() OVER (PARTITION BY bot_id, checkpoint_number ORDER BY id) AS n
+            FROM Checkpoints
+        )
+        WHERE n > 1
+        ORDER BY id
+        '''
+    ).fetchall()
+    if not duplicates:
+        return
+    bot_ids = sorted({row['bot_id'] for row in duplicates})
+    last = dict(db.execute(
+        f'''
+        SELECT bot_id, MAX(checkpoint_number) FROM Checkpoints
+        WHERE bot_id IN ({', '.join('?' * len(bot_ids))})
+        GROUP BY bot_id
+        ''',
+        bot_ids
+    ).fetchall())
+    for row in duplicates:
+        last[row['bot_id']] += 1
+        db.execute(
+            'UPDATE Checkpoints SET checkpoint_number = ? WHERE id = ?',
+            (last[row['bot_id']], row['id'])
+        )
+    logger.warning("Renumbered %d duplicate checkpoint(s)", len(duplicates))
+
+
+def upgrade(db):
+    renumber_duplicate_checkpoints(db)
+    db.execute(
+        '''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_checkpoints_bot_number
+            ON Checkpoints (bot_id, checkpoint_number)
+        '''
+    )
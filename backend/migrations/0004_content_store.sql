@@ -0,0 +1,16 @@
+-- Content-addressed chunk store for checkpoint payloads (see content_store.py)
+CREATE TABLE IF NOT EXISTS ContentChunks (
+    hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+
+-- Per-checkpoint manifests: the ordered chunk hashes for each stored field
+CREATE TABLE IF NOT EXISTS CheckpointPayloads (
+    checkpoint_id INTEGER NOT NULL,
+    field TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    chunks TEXT NOT NULL,
+    PRIMARY KEY (checkpoint_id, field),
+    FOREIGN KEY (checkpoint_id) REFERENCES Checkpoints(id) ON DELETE CASCADE
+);
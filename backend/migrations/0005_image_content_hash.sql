@@ -0,0 +1,2 @@
+-- SHA-256 of image_blob, filled in lazily the first time a derivative is requested
+ALTER TABLE images ADD COLUMN content_hash TEXT;
@@ -0,0 +1,25 @@
+-- Python IDE jobs (see python_runner.py); output is kept per job up to PYTHON_IDE_MAX_OUTPUT
+CREATE TABLE IF NOT EXISTS PythonJobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    error TEXT,
+    traceback TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    submitted_at TIMESTAMP NOT NULL,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_python_jobs_finished_at
+    ON PythonJobs (finished_at)
+    WHERE finished_at IS NOT NULL;
+
+-- Output in arrival order; the oldest rows are deleted once a job's output passes the limit
+CREATE TABLE IF NOT EXISTS PythonJobOutput (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    stream TEXT NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq),
+    FOREIGN KEY (job_id) REFERENCES PythonJobs(id) ON DELETE CASCADE
+);
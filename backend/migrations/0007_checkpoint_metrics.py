@@ -0,0 +1,72 @@
+"""Narrow per-checkpoint metrics table (see metrics_store.py).
+
+One row per (bot, checkpoint, metric) with a REAL value and a Unix
+timestamp. The table is clustered on (bot_id, metric, checkpoint_number) so a
+bot's series is one contiguous range; the secondary indexes carry values in
+sorted order for percentiles and timestamps for time buckets. Databases that
+still have the old free-form Checkpoints.metrics JSON column get its numeric
+entries copied over.
+"""
+import json
+
+
+def upgrade(db):
+    db.execute(
+        '''
+        CREATE TABLE IF NOT EXISTS CheckpointMetrics (
+            bot_id INTEGER NOT NULL,
+            metric TEXT NOT NULL,
+            checkpoint_number INTEGER NOT NULL,
+            value REAL NOT NULL,
+            ts REAL NOT NULL,
+            PRIMARY KEY (bot_id, metric, checkpoint_number),
+            FOREIGN KEY (bot_id) REFERENCES Bots(id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+        '''
+    )
+    db.execute(
+        '''
+        CREATE INDEX IF NOT EXISTS idx_checkpoint_metrics_bot_value
+            ON CheckpointMetrics (bot_id, metric, value)
+        '''
+    )
+    db.execute(
+        '''
+        CREATE INDEX IF NOT EXISTS idx_checkpoint_metrics_metric_value
+            ON CheckpointMetrics (metric, value)
+        '''
+    )
+    db.execute(
+        '''
+        CREATE INDEX IF NOT EXISTS idx_checkpoint_metrics_metric_ts
+            ON CheckpointMetrics (metric, ts, value)
+        '''
+    )
+
+    columns = {row[1] for row in db.execute('PRAGMA table_info(Checkpoints)')}
+    if 'metrics' not in columns:
+        return
+    rows = db.execute(
+        '''
+        SELECT bot_id, checkpoint_number, metrics, CAST(strftime('%s', created_at) AS REAL) AS ts
+        FROM Checkpoints WHERE metrics IS NOT NULL
+        '''
+    ).fetchall()
+    for row in rows:
+        try:
+            metrics = json.loads(row['metrics'])
+        except ValueError:
+            continue
+        if not isinstance(metrics, dict):
+            continue
+        db.executemany(
+            '''
+            INSERT OR IGNORE INTO CheckpointMetrics (bot_id, metric, checkpoint_number, value, ts)
+            VALUES (?, ?, ?, ?, ?)
+            ''',
+            [
+                (row['bot_id'], name, row['checkpoint_number'], float(value), row['ts'] or 0)
+                for name, value in metrics.items()
+                if isinstance(value, (int, float)) and not isinstance(value, bool)
+            ]
+        )
@@ -0,0 +1,63 @@
+-- Per-table change counters. Triggers bump a table's version on every
+-- insert, update and delete, so caches of data derived from it (see
+-- analytics.py) can tell with one indexed read whether they are stale, from
+-- any process.
+CREATE TABLE IF NOT EXISTS TableVersions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+INSERT OR IGNORE INTO TableVersions (name) VALUES
+    ('Sessions'), ('SessionMessages'), ('Checkpoints'), ('CheckpointPayloads');
+
+CREATE TRIGGER IF NOT EXISTS trg_sessions_version_insert AFTER INSERT ON Sessions
+BEGIN
+    UPDATE TableVersions SET version = version + 1 WHERE name = 'Sessions';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_sessions_version_update AFTER UPDATE ON Sessions
+BEGIN
+    UPDATE TableVersions SET version = version + 1 WHERE name = 'Sessions';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_sessions_version_delete AFTER DELETE ON Sessions
+BEGIN
+    UPDATE TableVersions SET version = version + 1 WHERE name = 'Sessions';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_session_messages_version_insert AFTER INSERT ON SessionMessages
+BEGIN
+    UPDATE TableVersions SET version = version + 1 WHERE name = 'SessionMessages';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_session_messages_version_update AFTER UPDATE ON SessionMessages
+BEGIN
+    UPDATE TableVersions SET version = version + 1 WHERE name = 'SessionMessages';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_session_messages_version_delete AFTER DELETE ON SessionMessages
+BEGIN
+    UPDATE TableVersions SET version = version + 1 WHERE name = 'SessionMessages';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_checkpoints_version_insert AFTER INSERT ON Checkpoints
+BEGIN
+    UPDATE TableVersions SET version = version + 1 WHERE name = 'Checkpoints';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_checkpoints_version_update AFTER UPDATE ON Checkpoints
+BEGIN
+    UPDATE TableVersions SET version = version + 1 WHERE name = 'Checkpoints';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_checkpoints_version_delete AFTER DELETE ON Checkpoints
+BEGIN
+    UPDATE TableVersions SET version = version + 1 WHERE name = 'Checkpoints';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_checkpoint_payloads_version_insert AFTER INSERT ON CheckpointPayloads
+BEGIN
+    UPDATE TableVersions SET version = version + 1 WHERE name = 'CheckpointPayloads';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_checkpoint_payloads_version_update AFTER UPDATE ON CheckpointPayloads
+BEGIN
+    UPDATE TableVersions SET version = version + 1 WHERE name = 'CheckpointPayloads';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_checkpoint_payloads_version_delete AFTER DELETE ON CheckpointPayloads
+BEGIN
+    UPDATE TableVersions SET version = version + 1 WHERE name = 'CheckpointPayloads';
+END;
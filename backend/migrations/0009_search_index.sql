@@ -0,0 +1,70 @@
+-- Full-text search tables (see search_index.py). Each rowid is the id of the
+-- source row. Bots and stacks are plain text and are kept in sync here by
+-- triggers; checkpoints and messages are indexed by the write paths, and
+-- existing ones by migration 0010. Deletes are handled by triggers for all
+-- four, so cascades clean up too.
+CREATE VIRTUAL TABLE IF NOT EXISTS SearchBots USING fts5(
+    name, description, default_system_prompt, system_prompt,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS SearchStacks USING fts5(
+    name, description,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS SearchCheckpoints USING fts5(
+    name, description, system_prompt, datasets, memories, session_history,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS SearchMessages USING fts5(
+    content,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+
+INSERT INTO SearchBots (rowid, name, description, default_system_prompt, system_prompt)
+SELECT id, name, description, default_system_prompt, system_prompt FROM Bots;
+
+INSERT INTO SearchStacks (rowid, name, description)
+SELECT id, name, description FROM Stacks;
+
+CREATE TRIGGER IF NOT EXISTS trg_search_bots_insert AFTER INSERT ON Bots
+BEGIN
+    INSERT INTO SearchBots (rowid, name, description, default_system_prompt, system_prompt)
+    VALUES (new.id, new.name, new.description, new.default_system_prompt, new.system_prompt);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_search_bots_update
+AFTER UPDATE OF name, description, default_system_prompt, system_prompt ON Bots
+BEGIN
+    UPDATE SearchBots SET name = new.name, description = new.description,
+        default_system_prompt = new.default_system_prompt, system_prompt = new.system_prompt
+    WHERE rowid = new.id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_search_bots_delete AFTER DELETE ON Bots
+BEGIN
+    DELETE FROM SearchBots WHERE rowid = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_search_stacks_insert AFTER INSERT ON Stacks
+BEGIN
+    INSERT INTO SearchStacks (rowid, name, description) VALUES (new.id, new.name, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_search_stacks_update AFTER UPDATE OF name, description ON Stacks
+BEGIN
+    UPDATE SearchStacks SET name = new.name, description = new.description WHERE rowid = new.id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_search_stacks_delete AFTER DELETE ON Stacks
+BEGIN
+    DELETE FROM SearchStacks WHERE rowid = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_search_checkpoints_delete AFTER DELETE ON Checkpoints
+BEGIN
+    DELETE FROM SearchCheckpoints WHERE rowid = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_search_messages_delete AFTER DELETE ON SessionMessages
+BEGIN
+    DELETE FROM SearchMessages WHERE rowid = old.id;
+END;
@@ -0,0 +1,41 @@
+"""Index the checkpoints and session messages that existed before full-text search.
+
+Runs online: on a large database this reads every payload and message once,
+committing after each batch.
+Rows written since migration 0009 are already indexed by the write paths;
+re-indexing them is harmless.
+"""
+import json
+
+import content_store
+import search_index
+import storage_codec
+
+ONLINE = True
+
+BATCH_SIZE = 1000
+
+
+def _batches(db, sql):
+    last_id = 0
+    while True:
+        rows = db.execute(sql, (last_id, BATCH_SIZE)).fetchall()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1]['id']
+
+
+def upgrade(db):
+    columns = ', '.join(search_index.CHECKPOINT_COLUMNS)
+    for rows in _batches(db, f'SELECT id, {columns} FROM Checkpoints WHERE id > ? ORDER BY id LIMIT ?'):
+        for checkpoint in content_store.hydrate(db, rows, content_store.PAYLOAD_FIELDS):
+            search_index.index_checkpoint(db, checkpoint['id'], checkpoint)
+        db.commit()
+
+    for rows in _batches(db, 'SELECT id, session_id, seq, message FROM SessionMessages WHERE id > ? ORDER BY id LIMIT ?'):
+        search_index.index_messages(db, [
+            (row['session_id'], row['seq'], search_index.message_text(json.loads(storage_codec.decode_text(row['message']))))
+            for row in rows
+        ])
+        db.commit()
@@ -0,0 +1,22 @@
+-- One embedding per checkpoint memory (see vector_index.py): the memory's
+-- position in the checkpoint's memories list and its L2-normalized vector as
+-- little-endian float32 bytes. bot_id is copied from the checkpoint so
+-- searches can filter by bot without a join.
+CREATE TABLE IF NOT EXISTS MemoryVectors (
+    id INTEGER PRIMARY KEY,
+    checkpoint_id INTEGER NOT NULL,
+    bot_id INTEGER NOT NULL,
+    memory_index INTEGER NOT NULL,
+    vector BLOB NOT NULL,
+    UNIQUE (checkpoint_id, memory_index),
+    FOREIGN KEY (checkpoint_id) REFERENCES Checkpoints(id) ON DELETE CASCADE
+);
+
+-- In-memory indexes load new rows by id; a delete, including cascades from
+-- Checkpoints, makes them reload
+INSERT OR IGNORE INTO TableVersions (name) VALUES ('MemoryVectors');
+
+CREATE TRIGGER IF NOT EXISTS trg_memory_vectors_version_delete AFTER DELETE ON MemoryVectors
+BEGIN
+    UPDATE TableVersions SET version = version + 1 WHERE name = 'MemoryVectors';
+END;
@@ -0,0 +1,6 @@
+-- 1 when a checkpoint's datasets, memories and session_history are each NULL
+-- or stored the way the API stores JSON posted as text: a JSON string whose
+-- text is valid JSON (content_store.is_json_payload). ?payloads=json then
+-- embeds that text after decoding only the string layer, without parsing it.
+-- Rows written by other tools keep 0 until migration 0013 checks them.
+ALTER TABLE Checkpoints ADD COLUMN payloads_json INTEGER NOT NULL DEFAULT 0;
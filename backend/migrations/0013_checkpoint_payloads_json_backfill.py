@@ -0,0 +1,32 @@
+"""Check the JSON payloads of checkpoints written before payloads_json existed.
+
+Runs online: on a large database this reads every JSON payload once,
+committing after each batch.
+Checkpoints whose payloads all pass content_store.is_json_payload are
+marked, and from then on ?payloads=json embeds them without parsing them.
+"""
+import content_store
+
+ONLINE = True
+
+BATCH_SIZE = 1000
+
+
+def upgrade(db):
+    columns = ', '.join(content_store.JSON_FIELDS)
+    last_id = 0
+    while True:
+        rows = db.execute(
+            f'SELECT id, {columns} FROM Checkpoints WHERE id > ? AND payloads_json = 0 ORDER BY id LIMIT ?',
+            (last_id, BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            return
+        valid = [
+            (checkpoint['id'],)
+            for checkpoint in content_store.hydrate(db, rows, content_store.JSON_FIELDS, raw=content_store.JSON_FIELDS)
+            if all(content_store.is_json_payload(checkpoint[field]) for field in content_store.JSON_FIELDS)
+        ]
+        db.executemany('UPDATE Checkpoints SET payloads_json = 1 WHERE id = ?', valid)
+        db.commit()
+        last_id = rows[-1]['id']
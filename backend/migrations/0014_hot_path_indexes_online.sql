@@ -0,0 +1,18 @@
+-- migrate: online
+-- Secondary indexes for the hot lookup paths. They only speed lookups up, so
+-- they are built online and never hold back blocking migrations. Checkpoints
+-- are listed per bot, active sessions looked up by bot_id with ended_at IS
+-- NULL ordered by started_at, stack slots by (stack_id, slot_number), and
+-- images by name.
+CREATE INDEX IF NOT EXISTS idx_checkpoints_bot_id
+    ON Checkpoints (bot_id);
+
+CREATE INDEX IF NOT EXISTS idx_sessions_active
+    ON Sessions (bot_id, started_at)
+    WHERE ended_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_stackslots_stack_slot
+    ON StackSlots (stack_id, slot_number, bot_id);
+
+CREATE INDEX IF NOT EXISTS idx_images_name
+    ON images (name);
@@ -0,0 +1,216 @@
+"""Versioned, non-destructive schema migrations.
+
+Migrations live in this directory as ``NNNN_name.sql`` or ``NNNN_name.py``
+(a module with an ``upgrade(db)`` function). Each one runs exactly once, in
+version order, inside its own ``BEGIN IMMEDIATE`` transaction, and is
+recorded in the ``schema_version`` table.
+
+A migration can be marked *online* (``-- migrate: online`` as the first line
+of a .sql file, or ``ONLINE = True`` in a .py module). Online migrations,
+index builds and backfills on large tables, are applied from a background
+thread after startup so the app can serve requests meanwhile. Every blocking
+migration is applied before the app serves, including those numbered after a
+pending online one, so online migrations must never create anything a later
+migration relies on.
+
+An online migration is not one transaction: each statement of a .sql file
+commits on its own, and a .py module commits between batches, so writers only
+ever wait for one step. Steps must therefore be idempotent; a crash, or a
+second worker starting at the same time, may repeat them. The version is
+recorded once the last step has committed.
+"""
+import importlib.util
+import logging
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+
+MIGRATIONS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    path: str
+    online: bool
+
+    def run(self, db):
+        if self.path.endswith('.sql'):
+            with open(self.path, encoding='utf8') as f:
+                for statement in split_statements(f.read()):
+                    db.execute(statement)
+                    if self.online:
+                        db.commit()
+        else:
+            module = _load_module(self.path)
+            module.upgrade(db)
+
+
+def _load_module(path):
+    spec = importlib.util.spec_from_file_location(
+        f'migrations._{os.path.splitext(os.path.basename(path))[0]}', path
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def split_statements(script):
+    """Split a SQL script into complete statements (trigger bodies stay intact)"""
+    statements = []
+    buffer = ''
+    for line in script.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            if buffer.strip():
+                statements.append(buffer.strip())
+            buffer = ''
+    if buffer.strip() and not all(
+        l.strip().startswith('--') or not l.strip() for l in buffer.splitlines()
+    ):
+        raise ValueError(f'Incomplete SQL statement in migration: {buffer.strip()[:80]}')
+    return statements
+
+
+def discover(directory=MIGRATIONS_DIR):
+    """All migrations in `directory`, sorted by version"""
+    migrations = []
+    for filename in os.listdir(directory):
+        stem, ext = os.path.splitext(filename)
+        if ext not in ('.sql', '.py') or not stem[:4].isdigit():
+            continue
+        path = os.path.join(directory, filename)
+        if ext == '.sql':
+            with open(path, encoding='utf8') as f:
+                online = f.readline().strip() == '-- migrate: online'
+        else:
+            online = bool(getattr(_load_module(path), 'ONLINE', False))
+        migrations.append(Migration(int(stem[:4]), stem[5:], path, online))
+    migrations.sort(key=lambda m: m.version)
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError('Duplicate migration version numbers')
+    return migrations
+
+
+def ensure_version_table(db):
+    db.execute(
+        '''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        '''
+    )
+    db.commit()
+
+
+def applied_versions(db):
+    ensure_version_table(db)
+    return {row[0] for row in db.execute('SELECT version FROM schema_version')}
+
+
+def _record(db, migration):
+    """Record an online migration whose steps have all committed; False if another process already did"""
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        if db.execute(
+            'SELECT 1 FROM schema_version WHERE version = ?', (migration.version,)
+        ).fetchone():
+            db.rollback()
+            return False
+        db.execute(
+            'INSERT INTO schema_version (version, name) VALUES (?, ?)',
+            (migration.version, migration.name)
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return True
+
+
+def apply(db, migration):
+    """Apply one migration; atomically unless it is online. Returns False if another process got there first."""
+    if migration.online:
+        if db.execute('SELECT 1 FROM schema_version WHERE version = ?', (migration.version,)).fetchone():
+            return False
+        try:
+            migration.run(db)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        if not _record(db, migration):
+            return False
+        logger.info("Applied online migration %04d_%s", migration.version, migration.name)
+        return True
+
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        # Re-check under the write lock: several workers may start at once
+        if db.execute(
+            'SELECT 1 FROM schema_version WHERE version = ?', (migration.version,)
+        ).fetchone():
+            db.rollback()
+            return False
+        migration.run(db)
+        db.execute(
+            'INSERT INTO schema_version (version, name) VALUES (?, ?)',
+            (migration.version, migration.name)
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    logger.info("Applied migration %04d_%s", migration.version, migration.name)
+    return True
+
+
+def pending(db, directory=MIGRATIONS_DIR):
+    done = applied_versions(db)
+    return [m for m in discover(directory) if m.version not in done]
+
+
+def migrate(db, directory=MIGRATIONS_DIR, include_online=True):
+    """Apply pending migrations in order and return the ones applied.
+
+    With include_online=False online migrations are skipped, not waited for:
+    the blocking ones after them still run.
+    """
+    applied = []
+    for migration in pending(db, directory):
+        if migration.online and not include_online:
+            continue
+        if apply(db, migration):
+            applied.append(migration)
+    return applied
+
+
+def migrate_app(app):
+    """Apply every blocking migration now and hand the online ones to a background thread"""
+    from database import get_db
+
+    with app.app_context():
+        db = get_db()
+        migrate(db, app.config['MIGRATIONS_PATH'], include_online=False)
+        remaining = pending(db, app.config['MIGRATIONS_PATH'])
+
+    if not remaining:
+        return None
+
+    def run_online():
+        with app.app_context():
+            try:
+                migrate(get_db(), app.config['MIGRATIONS_PATH'])
+            except Exception:
+                logger.exception("Online migration failed")
+
+    thread = threading.Thread(target=run_online, name='online-migrations', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,80 @@
+from urllib.parse import urlencode
+from flask import Response, jsonify, request, current_app
+from marshmallow import ValidationError, fields
+
+import serializers
+
+
+def requested_fields(schema_cls, default=None):
+    """Resolve the ?fields= projection against the fields a schema exposes"""
+    available = [name for name, field in schema_cls._declared_fields.items() if not field.load_only]
+    raw = request.args.get('fields')
+    if not raw:
+        return list(default or available)
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in available]
+    if unknown:
+        raise ValidationError({'fields': [f"Unknown field: {f}" for f in unknown]})
+    # The cursor is the row id, so it is always part of the projection
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    return fields
+
+
+def query_args(schema):
+    """The query string as a dict for `schema`; List fields may repeat or be comma separated"""
+    args = {}
+    for name, field in schema.fields.items():
+        if isinstance(field, fields.List):
+            values = [v.strip() for raw in request.args.getlist(name) for v in raw.split(',') if v.strip()]
+            if values:
+                args[name] = values
+        elif name in request.args:
+            args[name] = request.args[name]
+    return args
+
+
+def fetch_page(db, table, columns, where='1 = 1', params=(), key='id'):
+    """Keyset-paginate `table` by `key` using the ?limit= and ?after= query arguments.
+
+    Returns the rows of the page and the cursor for the next page (None on the last page).
+    """
+    limit = request.args.get('limit', current_app.config['DEFAULT_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, current_app.config['MAX_PAGE_SIZE']))
+    after = request.args.get('after', 0, type=int)
+
+    # The cursor is read from the first column, whatever order ?fields= asked for
+    columns = [key, *(c for c in columns if c != key)]
+    rows = db.execute(
+        f'''
+        SELECT {', '.join(columns)} FROM {table}
+        WHERE ({where}) AND {key} > ?
+        ORDER BY {key} LIMIT ?
+        ''',
+        (*params, after, limit + 1)
+    ).fetchall()
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1][0]
+    return rows, None
+
+
+def page_response(items, next_cursor, raw=False):
+    """JSON array response carrying the next cursor in X-Next-Cursor and a Link header.
+
+    A list is sent with jsonify; any other iterable, such as a row
+    serializer's output, is encoded and streamed in chunks as it is consumed.
+    With raw, items may hold serializers.RawJSON values.
+    """
+    if isinstance(items, list) and not raw:
+        response = jsonify(items)
+    else:
+        provider = current_app.json
+        response = Response(
+            serializers.stream_array(items, serializers.json_encoder(provider), raw=raw), mimetype=provider.mimetype
+        )
+    if next_cursor is not None:
+        args = request.args.to_dict()
+        args['after'] = next_cursor
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+        response.headers['Link'] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+    return response
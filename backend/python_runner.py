@@ -0,0 +1,644 @@
+"""Isolated execution of Python IDE scripts in pre-warmed worker processes.
+
+Every job runs in its own process, so a script can neither see another job's
+state nor redirect the server's stdout. Processes come from a multiprocessing
+forkserver that has already imported modular_intelligence and colorama (plain
+spawn where fork is unavailable), and each dispatcher keeps one started and
+idle ahead of the next job, so neither the imports nor process start-up sit
+on a job's critical path.
+
+Inside the job process, file descriptors 1 and 2 are pipes whose contents are
+forwarded to the server as they are written, which also captures output from
+C extensions and subprocesses. CPU time and address space are capped with
+setrlimit where the platform has it; the dispatcher enforces the wall-clock
+limit by killing the process. Jobs wait in a bounded queue; submit() raises
+queue.Full when it is full so callers can push back.
+
+Job status and output live in PythonJobs and PythonJobOutput, so any server
+process can report on, stream or cancel a job running in another one. The
+dispatcher batches output into rows every FLUSH_INTERVAL (sooner once
+FLUSH_MAX_CHARS are pending) and deletes the oldest rows once a job has more
+than PYTHON_IDE_MAX_OUTPUT characters, which bounds both the table and a slow
+reader's backlog. Only those flushes and status changes take a write
+connection; cancel flags and expired jobs are looked up through the read pool,
+so the runner competes with API writers for the write lock as little as
+possible. Readers poll the table the
+way session_stream does; in the process running the job, a flush also wakes
+them directly.
+"""
+import asyncio
+import codecs
+import importlib
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+import traceback
+import uuid
+from collections import deque
+from datetime import datetime
+
+from werkzeug.http import http_date
+
+from session_stream import KEEPALIVE, RETRY, format_event
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+PRELOAD = ['colorama', 'modular_intelligence']
+READ_SIZE = 64 * 1024
+FINISHED = {'finished', 'failed', 'timeout', 'cpu_limit', 'cancelled'}
+# How often a running job's output is written out, and how much may pile up in between
+FLUSH_INTERVAL = 1.0
+FLUSH_MAX_CHARS = 256 * 1024
+# How often the database is asked whether another process cancelled a running job
+CANCEL_CHECK_INTERVAL = 1.0
+# Longest wait for job output before a local cancel is noticed; no database work
+WAKE_INTERVAL = 0.25
+# Expired jobs are looked for at most this often
+PRUNE_INTERVAL = 60
+OUTPUT_PAGE = 500
+
+
+def _context():
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context('forkserver')
+        ctx.set_forkserver_preload(PRELOAD + [__name__])
+        return ctx
+    return multiprocessing.get_context('spawn')
+
+
+def _apply_limits(cpu_seconds, memory_bytes):
+    if resource is None:
+        return
+    if cpu_seconds:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+    if memory_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+
+
+def _forward(fd, stream, conn, lock):
+    """Relay everything written to a pipe to the server until the write end closes"""
+    while True:
+        data = os.read(fd, READ_SIZE)
+        if not data:
+            break
+        with lock:
+            conn.send((stream, data))
+
+
+def _job_globals():
+    # Same names the IDE has always provided to scripts
+    import colorama
+    job_globals = {
+        '__name__': '__main__',
+        '__builtins__': __builtins__,
+        'importlib': importlib,
+        'sys': sys,
+        'colorama': colorama,
+        'Fore': colorama.Fore,
+        'Back': colorama.Back,
+        'Style': colorama.Style,
+    }
+    try:
+        job_globals['mi'] = importlib.import_module('modular_intelligence')
+    except ImportError:
+        sys.stderr.write("Warning: modular-intelligence package not found. Please install it first.\n")
+    return job_globals
+
+
+def _worker_main(conn, cpu_seconds, memory_bytes):
+    """Entry point of a job process: wait for one script, run it, report and exit"""
+    try:
+        job = conn.recv()
+    except EOFError:
+        # The server shut down before handing this process a job
+        return
+    lock = threading.Lock()
+    forwarders = []
+    for fd, stream in ((1, 'stdout'), (2, 'stderr')):
+        read_end, write_end = os.pipe()
+        os.dup2(write_end, fd)
+        os.close(write_end)
+        thread = threading.Thread(target=_forward, args=(read_end, stream, conn, lock), daemon=True)
+        thread.start()
+        forwarders.append(thread)
+    sys.stdout = open(1, 'w', encoding='utf8', errors='replace', buffering=1, closefd=False)
+    sys.stderr = open(2, 'w', encoding='utf8', errors='replace', buffering=1, closefd=False)
+
+    result = ('exit', None, None)
+    try:
+        job_globals = _job_globals()
+        _apply_limits(cpu_seconds, memory_bytes)
+        exec(compile(job, '<script>', 'exec'), job_globals)
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            result = ('exit', str(e.code), None)
+    except BaseException as e:
+        # Drop this function's frame so the traceback starts in the script
+        tb = ''.join(traceback.format_exception(type(e), e, e.__traceback__.tb_next))
+        result = ('exit', str(e) or type(e).__name__, tb)
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        # Closing fds 1 and 2 ends the forwarders once the pipes are drained
+        os.close(1)
+        os.close(2)
+        for thread in forwarders:
+            thread.join()
+        with lock:
+            conn.send(result)
+
+
+class Job:
+    """A job queued or running in this process"""
+
+    def __init__(self, job_id, code):
+        self.id = job_id
+        self.code = code
+        self.status = 'queued'
+        self.cancel_requested = False
+        self._done = threading.Event()
+        self._listeners = set()
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener):
+        with self._lock:
+            self._listeners.add(listener)
+
+    def remove_listener(self, listener):
+        with self._lock:
+            self._listeners.discard(listener)
+
+    def notify(self):
+        """Called after new output or a status change has been committed"""
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener()
+
+    def finish(self, status):
+        self.status = status
+        self._done.set()
+        self.notify()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+
+class OutputLog:
+    """A running job's output: decoded, batched into rows and trimmed to max_chars"""
+
+    def __init__(self, max_chars):
+        self.max_chars = max_chars
+        self._decoders = {
+            stream: codecs.getincrementaldecoder('utf8')(errors='replace')
+            for stream in ('stdout', 'stderr')
+        }
+        self._pending = []
+        self.pending_chars = 0
+        self._retained = deque()
+        self._retained_chars = 0
+        self._seq = 0
+
+    def append(self, stream, data):
+        # The incremental decoder holds back a UTF-8 sequence split across reads
+        text = self._decoders[stream].decode(data)
+        if not text:
+            return
+        if self._pending and self._pending[-1][0] == stream:
+            self._pending[-1][1].append(text)
+        else:
+            self._pending.append((stream, [text]))
+        self.pending_chars += len(text)
+
+    def take(self):
+        """Return (new rows as (seq, stream, text), highest seq to delete or None)"""
+        rows = []
+        for stream, parts in self._pending:
+            text = ''.join(parts)
+            self._seq += 1
+            rows.append((self._seq, stream, text))
+            self._retained.append((self._seq, len(text)))
+            self._retained_chars += len(text)
+        self._pending = []
+        self.pending_chars = 0
+        trim_to = None
+        # The newest row is kept however large it is
+        while self._retained_chars > self.max_chars and len(self._retained) > 1:
+            trim_to, size = self._retained.popleft()
+            self._retained_chars -= size
+        return rows, trim_to
+
+
+class PythonRunner:
+    def __init__(self, pool, read_pool, workers, queue_size, timeout, cpu_seconds, memory_bytes, max_output,
+                 retention):
+        self.pool = pool
+        self.read_pool = read_pool
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_bytes
+        self.max_output = max_output
+        self.retention = retention
+        self._ctx = _context()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._jobs = {}
+        self._jobs_lock = threading.Lock()
+        self._next_prune = 0
+        self._dispatchers = [
+            threading.Thread(target=self._dispatch, name=f'python-runner-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._dispatchers:
+            thread.start()
+
+    def submit(self, code):
+        """Record and queue a script; raises queue.Full when too many jobs are waiting"""
+        self._prune()
+        job = Job(uuid.uuid4().hex, code)
+        self._execute(
+            'INSERT INTO PythonJobs (id, status, submitted_at) VALUES (?, ?, ?)',
+            (job.id, 'queued', datetime.utcnow())
+        )
+        with self._jobs_lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._jobs_lock:
+                del self._jobs[job.id]
+            self._execute('DELETE FROM PythonJobs WHERE id = ?', (job.id,))
+            raise
+        return job
+
+    def local_job(self, job_id):
+        """The Job if it is queued or running in this process, else None"""
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Stop a job of this process without waiting for its next cancel check"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.cancel_requested = True
+
+    def _execute(self, sql, params=()):
+        conn = self.pool.acquire()
+        try:
+            rowcount = conn.execute(sql, params).rowcount
+            conn.commit()
+            return rowcount
+        finally:
+            self.pool.release(conn)
+
+    def _prune(self):
+        """Delete finished jobs and their output once they are older than the retention period"""
+        now = time.monotonic()
+        if now < self._next_prune:
+            return
+        self._next_prune = now + PRUNE_INTERVAL
+        cutoff = datetime.utcfromtimestamp(time.time() - self.retention)
+        conn = self.read_pool.acquire()
+        try:
+            expired = [
+                row[0] for row in conn.execute(
+                    'SELECT id FROM PythonJobs WHERE finished_at IS NOT NULL AND finished_at < ?',
+                    (cutoff,)
+                )
+            ]
+        finally:
+            self.read_pool.release(conn)
+        if not expired:
+            return
+        conn = self.pool.acquire()
+        try:
+            for job_id in expired:
+                conn.execute('DELETE FROM PythonJobOutput WHERE job_id = ?', (job_id,))
+                conn.execute('DELETE FROM PythonJobs WHERE id = ?', (job_id,))
+            conn.commit()
+        finally:
+            self.pool.release(conn)
+
+    def _spawn(self):
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(child_conn, self.cpu_seconds, self.memory_bytes),
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        return process, parent_conn
+
+    def _dispatch(self):
+        process, conn = self._spawn()
+        while True:
+            job = self._queue.get()
+            try:
+                # Skip a job cancelled while it was queued, here or from another process
+                started = not job.cancel_requested and self._execute(
+                    "UPDATE PythonJobs SET status = 'running', started_at = ? WHERE id = ? AND status = 'queued'",
+                    (datetime.utcnow(), job.id)
+                )
+            except Exception:
+                started = False
+            if not started:
+                self._finish(job, 'cancelled')
+                continue
+            if not process.is_alive():
+                process, conn = self._spawn()
+            log = OutputLog(self.max_output)
+            try:
+                status, error, tb = self._run(job, process, conn, log)
+            except Exception as e:
+                status, error, tb = 'failed', f'Runner error: {e}', None
+            finally:
+                conn.close()
+                if process.is_alive():
+                    process.kill()
+                process.join()
+            self._finish(job, status, error, tb, log)
+            # Start the next job's process now, while this dispatcher is idle
+            process, conn = self._spawn()
+
+    def _run(self, job, process, conn, log):
+        """Feed a job to its process and collect output; returns (status, error, traceback)"""
+        job.status = 'running'
+        job.notify()
+        now = time.monotonic()
+        deadline = now + self.timeout
+        next_flush = now + FLUSH_INTERVAL
+        next_cancel_check = now + CANCEL_CHECK_INTERVAL
+        conn.send(job.code)
+        while True:
+            now = time.monotonic()
+            if now >= next_cancel_check:
+                job.cancel_requested = job.cancel_requested or self._cancel_requested(job.id)
+                next_cancel_check = now + CANCEL_CHECK_INTERVAL
+            if job.cancel_requested:
+                process.kill()
+                return 'cancelled', None, None
+            if now >= deadline:
+                process.kill()
+                return 'timeout', f'Script exceeded the {self.timeout}s time limit', None
+            if now >= next_flush or log.pending_chars >= FLUSH_MAX_CHARS:
+                self._flush(job, log)
+                next_flush = now + FLUSH_INTERVAL
+            # Wake up at least every WAKE_INTERVAL so a local cancel is noticed promptly
+            if not conn.poll(max(0, min(deadline, next_flush, now + WAKE_INTERVAL) - now)):
+                continue
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                process.join(1)
+                return self._exit_reason(process.exitcode) + (None,)
+            if message[0] == 'exit':
+                _, error, tb = message
+                return ('failed' if error is not None else 'finished'), error, tb
+            log.append(message[0], message[1])
+
+    def _cancel_requested(self, job_id):
+        conn = self.read_pool.acquire()
+        try:
+            row = conn.execute('SELECT cancel_requested FROM PythonJobs WHERE id = ?', (job_id,)).fetchone()
+        finally:
+            self.read_pool.release(conn)
+        return bool(row and row[0])
+
+    def _flush(self, job, log):
+        rows, trim_to = log.take()
+        if not rows:
+            return
+        conn = self.pool.acquire()
+        try:
+            conn.executemany(
+                'INSERT INTO PythonJobOutput (job_id, seq, stream, text) VALUES (?, ?, ?, ?)',
+                [(job.id, seq, stream, text) for seq, stream, text in rows]
+            )
+            if trim_to is not None:
+                conn.execute('DELETE FROM PythonJobOutput WHERE job_id = ? AND seq <= ?', (job.id, trim_to))
+            conn.commit()
+        finally:
+            self.pool.release(conn)
+        job.notify()
+
+    def _finish(self, job, status, error=None, tb=None, log=None):
+        try:
+            if log is not None:
+                self._flush(job, log)
+            self._execute(
+                '''
+                UPDATE PythonJobs SET status = ?, error = ?, traceback = ?, finished_at = ?
+                WHERE id = ? AND finished_at IS NULL
+                ''',
+                (status, error, tb, datetime.utcnow(), job.id)
+            )
+        finally:
+            with self._jobs_lock:
+                self._jobs.pop(job.id, None)
+            job.finish(status)
+
+    def _exit_reason(self, exitcode):
+        """(status, error) for a process that died without reporting back"""
+        if exitcode == -getattr(signal, 'SIGXCPU', 0):
+            return 'cpu_limit', f'Script exceeded the {self.cpu_seconds}s CPU time limit'
+        if exitcode is not None and exitcode < 0:
+            return 'failed', f'Script was killed by signal {-exitcode}'
+        return 'failed', f'Script process exited unexpectedly (exit code {exitcode})'
+
+
+_runners = {}
+_runners_lock = threading.Lock()
+
+
+def get_runner(config, pool, read_pool):
+    """Return this process's runner for the configured database, starting it on first use"""
+    key = (os.getpid(), str(config['DATABASE']))
+    runner = _runners.get(key)
+    if runner is None:
+        with _runners_lock:
+            runner = _runners.get(key)
+            if runner is None:
+                runner = PythonRunner(
+                    pool,
+                    read_pool,
+                    config['PYTHON_IDE_WORKERS'],
+                    config['PYTHON_IDE_QUEUE_SIZE'],
+                    config['PYTHON_IDE_TIMEOUT'],
+                    config['PYTHON_IDE_CPU_LIMIT'],
+                    config['PYTHON_IDE_MEMORY_LIMIT'],
+                    config['PYTHON_IDE_MAX_OUTPUT'],
+                    config['PYTHON_IDE_JOB_RETENTION'],
+                )
+                _runners[key] = runner
+    return runner
+
+
+def get_job(db, job_id):
+    return db.execute(
+        '''
+        SELECT id, status, error, traceback, submitted_at, started_at, finished_at
+        FROM PythonJobs WHERE id = ?
+        ''',
+        (job_id,)
+    ).fetchone()
+
+
+def job_json(job):
+    return {key: job[key] for key in job.keys()}
+
+
+def cancel_job(db, job_id):
+    """Cancel a queued job outright or flag a running one; False if it has already finished"""
+    cancelled = db.execute(
+        "UPDATE PythonJobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+        (datetime.utcnow(), job_id)
+    ).rowcount or db.execute(
+        "UPDATE PythonJobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'",
+        (job_id,)
+    ).rowcount
+    db.commit()
+    return bool(cancelled)
+
+
+def read_output(db, job_id):
+    """Everything still stored for a job: (stdout, stderr, whether older output was trimmed)"""
+    output = {'stdout': [], 'stderr': []}
+    first_seq = None
+    for row in db.execute(
+        'SELECT seq, stream, text FROM PythonJobOutput WHERE job_id = ? ORDER BY seq', (job_id,)
+    ):
+        if first_seq is None:
+            first_seq = row['seq']
+        output[row['stream']].append(row['text'])
+    return ''.join(output['stdout']), ''.join(output['stderr']), first_seq not in (None, 1)
+
+
+def fetch_output(pool, job_id, after, limit=OUTPUT_PAGE):
+    """(job row or None, one page of output rows with seq > after)"""
+    conn = pool.acquire()
+    try:
+        # Status first: output is flushed before a job is marked finished, so once
+        # the status is final the rows read next are complete
+        job = get_job(conn, job_id)
+        rows = conn.execute(
+            '''
+            SELECT seq, stream, text FROM PythonJobOutput
+            WHERE job_id = ? AND seq > ?
+            ORDER BY seq LIMIT ?
+            ''',
+            (job_id, after, limit)
+        ).fetchall()
+    finally:
+        # Do not hold a connection while the page is being sent
+        pool.release(conn)
+    return job, rows
+
+
+class OutputStream:
+    """SSE response body with a job's output after an offset, then an end event.
+
+    "stdout" and "stderr" events carry text as a JSON string, since output may
+    contain carriage returns that SSE would take for line breaks. Event ids are
+    output sequence numbers for Last-Event-ID. A "truncated" event reports rows
+    trimmed before the client read them, and "end" carries the final status.
+    """
+
+    def __init__(self, runner, pool, job_id, after, poll_interval, heartbeat):
+        self.runner = runner
+        self.pool = pool
+        self.job_id = job_id
+        self.last_seq = after
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+        self._job = None
+        self._listener = None
+
+    def _events(self, job, rows):
+        """Encode one fetched page; returns (chunks, whether the stream is over)"""
+        chunks = []
+        if rows and rows[0]['seq'] > self.last_seq + 1:
+            skipped = rows[0]['seq'] - self.last_seq - 1
+            chunks.append(format_event(json.dumps({'skipped': skipped}), event='truncated'))
+        for row in rows:
+            self.last_seq = row['seq']
+            chunks.append(format_event(json.dumps(row['text']), event=row['stream'], event_id=row['seq']))
+        if job is None:
+            # Pruned after its retention period
+            return chunks, True
+        if job['status'] in FINISHED and len(rows) < OUTPUT_PAGE:
+            # Dates as jsonify renders them for GET /jobs/<id>
+            chunks.append(format_event(json.dumps(job_json(job), default=http_date), event='end'))
+            return chunks, True
+        return chunks, False
+
+    def _subscribe(self, listener):
+        # Only the process running the job can wake us; elsewhere we poll
+        self._job = self.runner.local_job(self.job_id)
+        if self._job is not None:
+            self._listener = listener
+            self._job.add_listener(listener)
+
+    def __iter__(self):
+        woken = threading.Event()
+        self._subscribe(woken.set)
+        try:
+            yield RETRY
+            last_sent = time.monotonic()
+            while True:
+                woken.clear()
+                chunks, over = self._events(*fetch_output(self.pool, self.job_id, self.last_seq))
+                yield from chunks
+                if over:
+                    return
+                if chunks:
+                    last_sent = time.monotonic()
+                    continue
+                if time.monotonic() - last_sent >= self.heartbeat:
+                    yield KEEPALIVE
+                    last_sent = time.monotonic()
+                woken.wait(self.poll_interval)
+        finally:
+            self.close()
+
+    def __aiter__(self):
+        return self._aiter()
+
+    async def _aiter(self):
+        loop = asyncio.get_running_loop()
+        woken = asyncio.Event()
+        self._subscribe(lambda: loop.call_soon_threadsafe(woken.set))
+        try:
+            yield RETRY
+            last_sent = time.monotonic()
+            while True:
+                woken.clear()
+                page = await loop.run_in_executor(None, fetch_output, self.pool, self.job_id, self.last_seq)
+                chunks, over = self._events(*page)
+                for chunk in chunks:
+                    yield chunk
+                if over:
+                    return
+                if chunks:
+                    last_sent = time.monotonic()
+                    continue
+                if time.monotonic() - last_sent >= self.heartbeat:
+                    yield KEEPALIVE
+                    last_sent = time.monotonic()
+                try:
+                    await asyncio.wait_for(woken.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.close()
+
+    def close(self):
+        if self._job is not None:
+            self._job.remove_listener(self._listener)
+            self._job = None
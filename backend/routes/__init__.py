@@ -4,9 +4,14 @@ bots_bp = Blueprint('bots', __name__)
 checkpoints_bp = Blueprint('checkpoints', __name__)
 stacks_bp = Blueprint('stacks', __name__)
 metrics_bp = Blueprint('metrics', __name__)
+metrics_query_bp = Blueprint('metrics_query', __name__)
 sessions_bp = Blueprint('sessions', __name__)
+session_batches_bp = Blueprint('session_batches', __name__)
 images_bp = Blueprint('images', __name__)
 python_ide_bp = Blueprint('python_ide', __name__)
+analytics_bp = Blueprint('analytics', __name__)
+search_bp = Blueprint('search', __name__)
+memories_bp = Blueprint('memories', __name__)
 
 from . import bots
 from . import checkpoints
@@ -15,3 +20,6 @@ from . import metrics
 from . import sessions
 from . import images
 from . import python_ide
+from . import analytics
+from . import search
+from . import memories
@@ -0,0 +1,51 @@
+from flask import jsonify, request, current_app
+from . import analytics_bp
+from database import get_read_db
+from http_cache import etag_for, not_modified, set_cache_headers
+import analytics
+
+def _bot_filter():
+    """Bot ids from ?bot_id= (repeated or comma separated), None for all bots"""
+    values = [v for raw in request.args.getlist('bot_id') for v in raw.split(',') if v.strip()]
+    if not values:
+        return None
+    return sorted({int(v) for v in values})
+
+def _respond(sections):
+    try:
+        bot_ids = _bot_filter()
+    except ValueError:
+        return jsonify({'message': 'bot_id must be a list of integers'}), 400
+
+    db = get_read_db()
+    tables = [table for section in sections for table in analytics.SECTIONS[section][1]]
+    versions = analytics.table_versions(db, tables)
+    etag = etag_for(
+        'analytics', *sections, *(versions.get(table) for table in tables),
+        *(['bots', *bot_ids] if bot_ids else [])
+    )
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    cache = analytics.get_cache(current_app.config)
+    results = {}
+    for section in sections:
+        result = cache.get(db, section, versions)
+        if bot_ids is not None:
+            result = {**result, 'bots': [bot for bot in result['bots'] if bot['bot_id'] in bot_ids]}
+        results[section] = result
+    body = results if len(sections) > 1 else results[sections[0]]
+    return set_cache_headers(jsonify(body), etag), 200
+
+@analytics_bp.route('', methods=['GET'])
+def get_analytics():
+    """Every analytics section, keyed by name"""
+    return _respond(list(analytics.SECTIONS))
+
+@analytics_bp.route('/<section>', methods=['GET'])
+def get_analytics_section(section):
+    """One section: overall statistics and one entry per bot"""
+    if section not in analytics.SECTIONS:
+        return jsonify({'message': 'Unknown analytics section'}), 404
+    return _respond([section])
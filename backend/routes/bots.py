@@ -1,19 +1,23 @@
 from flask import jsonify, request, current_app
 from . import bots_bp
-from database import get_db
+from database import get_db, get_read_db
 from config import Config
 from models import Bot
 from schemas import BotSchema
 from marshmallow import ValidationError
+from pagination import requested_fields, fetch_page, page_response
+from serializers import row_serializer
 
 @bots_bp.route('', methods=['GET', 'POST'])
 def manage_bots():
-    db = get_db()
+    db = get_read_db() if request.method == 'GET' else get_db()
     if request.method == 'GET':
-        bots = db.execute('SELECT * FROM Bots').fetchall()
-        print(bots)
-        bot_list = [BotSchema().dump(Bot.from_row(bot)) for bot in bots]
-        return jsonify(bot_list), 200
+        try:
+            fields = requested_fields(BotSchema)
+        except ValidationError as err:
+            return jsonify(err.messages), 400
+        bots, next_cursor = fetch_page(db, 'Bots', fields)
+        return page_response(row_serializer(BotSchema, fields).iter(bots), next_cursor), 200
     elif request.method == 'POST':
         data = request.get_json()
         try:
@@ -38,11 +42,9 @@ def manage_bots():
 
 @bots_bp.route('/<int:bot_id>', methods=['GET', 'PUT', 'DELETE'])
 def bot_detail(bot_id):
-    print("received")
-    db = get_db()
+    db = get_read_db() if request.method == 'GET' else get_db()
     if request.method == 'GET':
         bot_row = db.execute('SELECT * FROM Bots WHERE id = ?', (bot_id,)).fetchone()
-        print(bot_row)
         if not bot_row:
             return jsonify({'error': 'Bot not found'}), 404
         bot = Bot.from_row(bot_row)
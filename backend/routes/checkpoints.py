@@ -2,12 +2,157 @@
 
 from flask import jsonify, request, current_app, g
 from . import checkpoints_bp
-from database import get_db
-from models import Checkpoint
-from schemas import CheckpointSchema
+from database import get_db, get_read_db
+from schemas import CheckpointSchema, MemoryVectorsSchema
 from marshmallow import ValidationError
+from pagination import requested_fields, fetch_page, page_response
+from serializers import RawJSON, json_response, row_serializer
+import checkpoint_diff
+import content_store
+import search_index
+import vector_index
+from http_cache import etag_for, not_modified, set_cache_headers
+import hashlib
 import json
 
+CHECKPOINT_LIST_FIELDS = [
+    'id', 'bot_id', 'checkpoint_number', 'version', 'created_at',
+    'system_prompt', 'model', 'name', 'description'
+]
+
+# Scalar columns compared by .../diff/<other>; payloads are diffed by checkpoint_diff
+CHECKPOINT_DIFF_FIELDS = ['name', 'description', 'version', 'model']
+
+# ?payloads=: JSON payloads as the stored text in a string (the default), or as JSON values
+PAYLOAD_MODES = ('text', 'json')
+
+def _insert_checkpoint(db, bot_id, values, memory_vectors=None):
+    """Allocate the bot's next checkpoint number and insert the row atomically.
+
+    BEGIN IMMEDIATE takes the write lock before MAX() is read, so concurrent
+    writers queue and each sees the number the previous one took. The unique
+    (bot_id, checkpoint_number) index is only a guard: a collision raises
+    IntegrityError. Large payloads go to the content store, and the
+    checkpoint into the search and memory vector indexes, in the same
+    transaction.
+    """
+    config = current_app.config
+    inline, stored = content_store.split_payloads(
+        values, config['CONTENT_INLINE_MAX'], config['STORAGE_CODEC'], config['STORAGE_COMPRESS_MIN_SIZE']
+    )
+    columns = list(inline)
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        row = db.execute(
+            f'''
+            INSERT INTO Checkpoints (bot_id, checkpoint_number, {', '.join(columns)})
+            SELECT ?, COALESCE(MAX(checkpoint_number), 0) + 1, {', '.join('?' * len(columns))}
+            FROM Checkpoints WHERE bot_id = ?
+            RETURNING id, checkpoint_number
+            ''',
+            (bot_id, *inline.values(), bot_id)
+        ).fetchone()
+        content_store.put_payloads(
+            db, row['id'], stored, config['CONTENT_CHUNK_SIZE'],
+            config['STORAGE_CODEC'], config['STORAGE_COMPRESS_MIN_SIZE']
+        )
+        search_index.index_checkpoint(db, row['id'], values)
+        if memory_vectors is not None:
+            vector_index.put_vectors(db, row['id'], bot_id, memory_vectors)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return row['id'], row['checkpoint_number']
+
+def _memory_vectors(memories, vectors):
+    """Normalized embeddings of the entries of a memories payload, as given or from MEMORY_EMBEDDER.
+
+    Returns None when there are none; raises ValidationError when given
+    vectors do not fit the memories.
+    """
+    entries = vector_index.memory_list(memories)
+    if vectors is None:
+        vectors = vector_index.embed_memories(current_app.config, entries) if entries else None
+        if vectors is None:
+            return None
+    if len(vectors) != len(entries):
+        raise ValidationError({'memory_vectors': [f'Expected one vector per memory ({len(entries)})']})
+    try:
+        return vector_index.normalize(vectors, current_app.config['VECTOR_SIZE'])
+    except ValueError as e:
+        raise ValidationError({'memory_vectors': [str(e)]})
+
+def _mirror_memory_vectors(checkpoint_id, bot_id, vectors, replace=False):
+    # Qdrant is only a copy; the local index has already committed
+    try:
+        vector_index.mirror(current_app.config, checkpoint_id, bot_id, vectors, replace)
+    except Exception as e:
+        current_app.logger.warning(f"Mirroring memory vectors of checkpoint {checkpoint_id} to Qdrant failed: {e}")
+
+def _find_checkpoint(db, bot_id, checkpoint_id, columns):
+    """Look up a checkpoint by number; checkpoint_id 0 means the bot's latest one"""
+    if checkpoint_id == 0:
+        return db.execute(
+            f'SELECT {columns} FROM Checkpoints WHERE bot_id = ? ORDER BY checkpoint_number DESC LIMIT 1',
+            (bot_id,)
+        ).fetchone()
+    return db.execute(
+        f'SELECT {columns} FROM Checkpoints WHERE checkpoint_number = ? AND bot_id = ?',
+        (checkpoint_id, bot_id)
+    ).fetchone()
+
+def _checkpoint_etag(cp_row):
+    # Payloads never change after creation; only name and description can be edited
+    editable = hashlib.sha1(repr((cp_row['name'], cp_row['description'])).encode('utf8')).hexdigest()[:12]
+    return etag_for('checkpoint', cp_row['id'], editable)
+
+def _payload_mode():
+    mode = request.args.get('payloads', 'text')
+    if mode not in PAYLOAD_MODES:
+        raise ValidationError({'payloads': [f"Must be one of: {', '.join(PAYLOAD_MODES)}"]})
+    return mode
+
+def _embed_json_payloads(checkpoint):
+    """Turn a checkpoint's JSON payloads, hydrated as bytes, into values of the response.
+
+    Payloads stored as a string of checked JSON text go into the response as
+    that text, unwrapped but not parsed; those of unchecked rows are parsed,
+    and text that is not JSON stays a string.
+    """
+    for field in content_store.JSON_FIELDS:
+        if checkpoint.get(field) is not None:
+            data = checkpoint[field]
+            if checkpoint['payloads_json']:
+                checkpoint[field] = RawJSON(content_store.unwrap_json(data))
+            else:
+                checkpoint[field] = content_store.parse_json(data.decode('utf8'))
+    return checkpoint
+
+def _session_history_response(db, bot_id, checkpoint_id):
+    """Conditional GET of a checkpoint's session history, shared by /session_history and /context"""
+    cp_row = _find_checkpoint(db, bot_id, checkpoint_id, 'id, created_at')
+    if not cp_row:
+        return jsonify({'message': 'Checkpoint not found'}), 404
+
+    etag = etag_for('session_history', cp_row['id'])
+    cached = not_modified(etag, cp_row['created_at'])
+    if cached:
+        return cached
+
+    row = db.execute(
+        'SELECT id, session_history, payloads_json FROM Checkpoints WHERE id = ?', (cp_row['id'],)
+    ).fetchone()
+    session_history = content_store.hydrate(db, [row], ['session_history'], raw=['session_history'])[0]['session_history']
+    if not session_history:
+        response = jsonify([])
+    elif row['payloads_json']:
+        # Stored as valid JSON (a string holding the posted text): send it without a parse/encode round trip
+        response = json_response(RawJSON(session_history))
+    else:
+        response = jsonify(json.loads(session_history))
+    return set_cache_headers(response, etag, cp_row['created_at']), 200
+
 # URL Value Preprocessor to extract bot_id from URL and store it in g
 @checkpoints_bp.url_value_preprocessor
 def preprocess_url_values(endpoint, values):
@@ -15,51 +160,56 @@ def preprocess_url_values(endpoint, values):
 
 @checkpoints_bp.route('', methods=['GET', 'POST'])
 def manage_checkpoints():
-    db = get_db()
+    db = get_read_db() if request.method == 'GET' else get_db()
     bot_id = g.bot_id
     if not bot_id:
         return jsonify({'message': 'Bot ID is required'}), 400
 
     if request.method == 'GET':
-        # Fetch checkpoints for the specified bot_id
-        checkpoints = db.execute(
-            'SELECT * FROM Checkpoints WHERE bot_id = ?', (bot_id,)
-        ).fetchall()
-        # Deserialize and serialize data
-        checkpoint_list = [CheckpointSchema().dump(Checkpoint.from_row(cp)) for cp in checkpoints]
-        return jsonify(checkpoint_list), 200
+        # Heavy JSON payloads are only listed when asked for via ?fields=
+        try:
+            fields = requested_fields(CheckpointSchema, default=CHECKPOINT_LIST_FIELDS)
+            mode = _payload_mode()
+        except ValidationError as err:
+            return jsonify({'message': err.messages}), 400
+        embed = mode == 'json' and any(f in content_store.JSON_FIELDS for f in fields)
+        checkpoints, next_cursor = fetch_page(
+            db, 'Checkpoints', [*fields, 'payloads_json'] if embed else fields, where='bot_id = ?', params=(bot_id,)
+        )
+        if embed:
+            checkpoint_list = row_serializer(CheckpointSchema, fields).iter(
+                _embed_json_payloads(checkpoint)
+                for checkpoint in content_store.hydrate(db, checkpoints, fields, raw=content_store.JSON_FIELDS)
+            )
+            return page_response(checkpoint_list, next_cursor, raw=True), 200
+        checkpoint_list = row_serializer(CheckpointSchema, fields).iter(
+            content_store.hydrate(db, checkpoints, fields)
+        )
+        return page_response(checkpoint_list, next_cursor), 200
 
     elif request.method == 'POST':
         data = request.get_json()
         try:
             cp_data = CheckpointSchema().load(data)
-            
-            # Get the next checkpoint number for this bot
-            next_checkpoint = db.execute(
-                'SELECT COALESCE(MAX(checkpoint_number), 0) + 1 FROM Checkpoints WHERE bot_id = ?',
-                (bot_id,)
-            ).fetchone()[0]
+            memory_vectors = _memory_vectors(cp_data.get('memories'), cp_data.get('memory_vectors'))
             
             # Serialize JSON fields before inserting into the database
-            db.execute(
-                '''
-                INSERT INTO Checkpoints (bot_id, checkpoint_number, name, description, version, system_prompt, datasets, memories, session_history)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''',
-                (
-                    bot_id,
-                    next_checkpoint,
-                    cp_data.get('name', 'New Checkpoint'),
-                    cp_data.get('description', ''),
-                    cp_data.get('version', '1.0'),
-                    cp_data.get('system_prompt'),
-                    json.dumps(cp_data.get('datasets')) if cp_data.get('datasets') else None,
-                    json.dumps(cp_data.get('memories')) if cp_data.get('memories') else None,
-                    json.dumps(cp_data.get('session_history')) if cp_data.get('session_history') else None
-                )
+            payloads = {field: content_store.json_payload(cp_data.get(field)) for field in content_store.JSON_FIELDS}
+            cp_id, next_checkpoint = _insert_checkpoint(
+                db,
+                bot_id,
+                {
+                    'name': cp_data.get('name', 'New Checkpoint'),
+                    'description': cp_data.get('description', ''),
+                    'version': cp_data.get('version', '1.0'),
+                    'system_prompt': cp_data.get('system_prompt'),
+                    **payloads,
+                    'payloads_json': int(all(content_store.is_json_payload(value) for value in payloads.values()))
+                },
+                memory_vectors
             )
-            db.commit()
-            cp_id = db.execute('SELECT last_insert_rowid()').fetchone()[0]
+            if memory_vectors is not None:
+                _mirror_memory_vectors(cp_id, bot_id, memory_vectors)
             return jsonify({'message': 'Checkpoint created', 'id': cp_id, 'checkpoint_number': next_checkpoint}), 201
         except ValidationError as err:
             return jsonify({'message': err.messages}), 400
@@ -69,31 +219,42 @@ def manage_checkpoints():
 
 @checkpoints_bp.route('/<int:checkpoint_id>', methods=['GET', 'PATCH'])
 def checkpoint_detail(checkpoint_id):
-    db = get_db()
+    db = get_read_db() if request.method == 'GET' else get_db()
     bot_id = g.bot_id
     if not bot_id:
         return jsonify({'message': 'Bot ID is required'}), 400
 
     # Handle checkpoint_id = 0 as the latest checkpoint
-    if checkpoint_id == 0:
-        cp_row = db.execute(
-            'SELECT * FROM Checkpoints WHERE bot_id = ? ORDER BY checkpoint_number DESC LIMIT 1',
-            (bot_id,)
-        ).fetchone()
-    else:
-        cp_row = db.execute(
-            'SELECT * FROM Checkpoints WHERE checkpoint_number = ? AND bot_id = ?',
-            (checkpoint_id, bot_id)
-        ).fetchone()
+    cp_row = _find_checkpoint(db, bot_id, checkpoint_id, 'id, name, description')
 
     if not cp_row:
         return jsonify({'message': 'Checkpoint not found'}), 404
 
     if request.method == 'GET':
-        # Deserialize and serialize data
-        checkpoint = Checkpoint.from_row(cp_row)
+        try:
+            mode = _payload_mode()
+        except ValidationError as err:
+            return jsonify({'message': err.messages}), 400
+        # Answer revalidations from the metadata alone, before touching the payload
+        etag = _checkpoint_etag(cp_row)
+        if mode != 'text':
+            etag = etag_for(etag, mode)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+
+        full_row = db.execute('SELECT * FROM Checkpoints WHERE id = ?', (cp_row['id'],)).fetchone()
+        # Reassemble chunk-stored payloads, then serialize
+        if mode == 'json':
+            checkpoint = content_store.hydrate(
+                db, [full_row], content_store.PAYLOAD_FIELDS, raw=content_store.JSON_FIELDS
+            )[0]
+            fields = [name for name, field in CheckpointSchema._declared_fields.items() if not field.load_only]
+            result = next(row_serializer(CheckpointSchema, fields).iter([_embed_json_payloads(checkpoint)]))
+            return set_cache_headers(json_response(result), etag), 200
+        checkpoint = content_store.hydrate(db, [full_row], content_store.PAYLOAD_FIELDS)[0]
         result = CheckpointSchema().dump(checkpoint)
-        return jsonify(result), 200
+        return set_cache_headers(jsonify(result), etag), 200
 
     elif request.method == 'PATCH':
         data = request.get_json()
@@ -108,13 +269,15 @@ def checkpoint_detail(checkpoint_id):
             
             if update_fields:
                 update_values.extend([checkpoint_id, bot_id])
-                db.execute(
+                cursor = db.execute(
                     f'''
                     UPDATE Checkpoints SET {', '.join(update_fields)}
                     WHERE checkpoint_number = ? AND bot_id = ?
                     ''',
                     update_values
                 )
+                if cursor.rowcount:
+                    search_index.update_checkpoint(db, cp_row['id'], {'name': data['name']})
                 db.commit()
                 return jsonify({'message': 'Checkpoint updated'}), 200
             return jsonify({'message': 'No fields to update'}), 400
@@ -137,8 +300,19 @@ def handle_options(checkpoint_id):
     bot_id = g.bot_id
     try:
         print(f"Checkpoint {checkpoint_id} type{type(checkpoint_id)} deleted for bot {bot_id}")
+        db.execute(
+            '''
+            DELETE FROM CheckpointMetrics
+            WHERE (bot_id, checkpoint_number) = (SELECT bot_id, checkpoint_number FROM Checkpoints WHERE id = ?)
+            ''',
+            (checkpoint_id,)
+        )
         db.execute('DELETE FROM Checkpoints WHERE id = ?', (checkpoint_id,))
         db.commit()
+        try:
+            vector_index.unmirror(current_app.config, checkpoint_id)
+        except Exception as e:
+            current_app.logger.warning(f"Removing memory vectors of checkpoint {checkpoint_id} from Qdrant failed: {e}")
         
         #print(f" fetchies: {db.fetchall()}")
         return jsonify({'message': 'Checkpoint deleted'}), 200
@@ -148,44 +322,58 @@ def handle_options(checkpoint_id):
 
 @checkpoints_bp.route('/<int:checkpoint_id>/session_history', methods=['GET'])
 def get_checkpoint_session_history(checkpoint_id):
-    db = get_db()
-    bot_id = g.bot_id
-    
-    if checkpoint_id == 0:
-        cp_row = db.execute(
-            'SELECT session_history FROM Checkpoints WHERE bot_id = ? ORDER BY checkpoint_number DESC LIMIT 1',
-            (bot_id,)
-        ).fetchone()
-    else:
-        cp_row = db.execute(
-            'SELECT session_history FROM Checkpoints WHERE checkpoint_number = ? AND bot_id = ?',
-            (checkpoint_id, bot_id)
-        ).fetchone()
-    
-    if not cp_row:
-        return jsonify({'message': 'Checkpoint not found'}), 404
-    
-    history = json.loads(cp_row['session_history']) if cp_row['session_history'] else []
-    return jsonify(history), 200
+    return _session_history_response(get_read_db(), g.bot_id, checkpoint_id)
 
 @checkpoints_bp.route('/<int:checkpoint_id>/context', methods=['GET'])
 def get_checkpoint_context(checkpoint_id):
+    return _session_history_response(get_read_db(), g.bot_id, checkpoint_id)
+
+@checkpoints_bp.route('/<int:checkpoint_id>/diff/<int:other_id>', methods=['GET'])
+def diff_checkpoints(checkpoint_id, other_id):
+    """What changed from one checkpoint to another: edited fields, prompt lines, and payload items added or removed"""
+    db = get_read_db()
+    columns = 'id, checkpoint_number, created_at, ' + ', '.join(CHECKPOINT_DIFF_FIELDS)
+    old = _find_checkpoint(db, g.bot_id, checkpoint_id, columns)
+    new = _find_checkpoint(db, g.bot_id, other_id, columns)
+    if not old or not new:
+        return jsonify({'message': 'Checkpoint not found'}), 404
+
+    # Payloads never change, so only the editable fields of either side can make this stale
+    etag = etag_for('checkpoint_diff', _checkpoint_etag(old), _checkpoint_etag(new))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    result = {
+        'from': {'id': old['id'], 'checkpoint_number': old['checkpoint_number'], 'created_at': old['created_at'].isoformat()},
+        'to': {'id': new['id'], 'checkpoint_number': new['checkpoint_number'], 'created_at': new['created_at'].isoformat()},
+        'fields': {
+            field: {'from': old[field], 'to': new[field]}
+            for field in CHECKPOINT_DIFF_FIELDS if old[field] != new[field]
+        },
+        **checkpoint_diff.get_cache(current_app.config).get(db, old['id'], new['id']),
+    }
+    return set_cache_headers(jsonify(result), etag), 200
+
+@checkpoints_bp.route('/<int:checkpoint_id>/memories/vectors', methods=['PUT'])
+def put_memory_vectors(checkpoint_id):
+    """Replace the embeddings of a checkpoint's memories: one vector per entry, in order"""
     db = get_db()
-    bot_id = g.bot_id
-    
-    if checkpoint_id == 0:
-        cp_row = db.execute(
-            'SELECT session_history FROM Checkpoints WHERE bot_id = ? ORDER BY checkpoint_number DESC LIMIT 1',
-            (bot_id,)
-        ).fetchone()
-    else:
-        cp_row = db.execute(
-            'SELECT session_history FROM Checkpoints WHERE checkpoint_number = ? AND bot_id = ?',
-            (checkpoint_id, bot_id)
-        ).fetchone()
-    
+    try:
+        data = MemoryVectorsSchema().load(request.get_json())
+    except ValidationError as err:
+        return jsonify({'message': err.messages}), 400
+
+    cp_row = _find_checkpoint(db, g.bot_id, checkpoint_id, 'id, bot_id, memories')
     if not cp_row:
         return jsonify({'message': 'Checkpoint not found'}), 404
-    
-    context = json.loads(cp_row['session_history']) if cp_row['session_history'] else []
-    return jsonify(context), 200
+    memories = content_store.hydrate(db, [cp_row], ['memories'])[0]['memories']
+    try:
+        vectors = _memory_vectors(memories, data['vectors'])
+    except ValidationError as err:
+        return jsonify({'message': err.messages}), 400
+
+    vector_index.put_vectors(db, cp_row['id'], cp_row['bot_id'], vectors)
+    db.commit()
+    _mirror_memory_vectors(cp_row['id'], cp_row['bot_id'], vectors, replace=True)
+    return jsonify({'message': 'Memory vectors updated', 'count': len(vectors)}), 200
@@ -1,29 +1,215 @@
-from flask import send_file
-from . import images_bp
-from werkzeug.exceptions import NotFound
+import base64
+import time
+from concurrent.futures import TimeoutError as RenderTimeout
 
-from database import get_db
-from schemas import ImageSchema
-from models import Image
-from flask import send_file, make_response
-from io import BytesIO
+from flask import Response, current_app, jsonify, request, send_file, url_for
+from marshmallow import ValidationError
 from werkzeug.exceptions import NotFound
+from werkzeug.http import dump_options_header
+
+from . import images_bp
+from blob_stream import read_head, sniff_mime_type, stream_blob
+from database import get_pool, get_read_db
+from http_cache import etag_for, not_modified, set_cache_headers
+from schemas import ImageSchema, ImageResizeSchema, ImageThumbnailsSchema
+import thumbnails
 
 image_schema = ImageSchema()
+resize_schema = ImageResizeSchema()
+thumbnails_schema = ImageThumbnailsSchema()
+
+
+def _resize_params(data):
+    if not data:
+        return None
+    return thumbnails.ResizeParams(data.get("w", 0), data.get("h", 0), data.get("format"))
+
+
+def _derivatives(images, params):
+    """Return {image id: open derivative file, exception, or None while it is being rendered}.
+
+    Misses are submitted to the worker pool and never waited on, so the request
+    thread is free at once and a batch renders in parallel; the client asks
+    again after Retry-After.
+    """
+    renderer = thumbnails.get_renderer(
+        current_app.config, get_pool(readonly=True), get_pool(readonly=False)
+    )
+    timeout = current_app.config["IMAGE_RENDER_TIMEOUT"]
+    results = {}
+    for image in images:
+        if image["content_hash"] is not None:
+            key = thumbnails.cache_key(image["content_hash"], params)
+            handle = renderer.cache.open(key, params.format)
+            if handle is not None:
+                results[image["id"]] = handle
+                continue
+        future = renderer.submit(image["id"], image["content_hash"], params)
+        if not future.done():
+            # A render that never finishes must not keep the client polling forever
+            too_long = time.monotonic() - future.submitted > timeout
+            results[image["id"]] = RenderTimeout() if too_long else None
+            continue
+        try:
+            key = future.result()
+        except Exception as err:
+            results[image["id"]] = err
+            continue
+        # None if a tiny cache already evicted it; the next poll renders it again
+        results[image["id"]] = renderer.cache.open(key, params.format)
+    return results
+
+
+def _rendering(response):
+    """Mark a response as answering before its derivatives are ready"""
+    response.status_code = 202
+    response.headers["Retry-After"] = str(current_app.config["IMAGE_RENDER_RETRY_AFTER"])
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+def _render_error(err):
+    if isinstance(err, RenderTimeout):
+        return "Timed out resizing the image", 503
+    return "Could not decode the image", 422
+
+
+def _byte_range(size, etag):
+    """Resolve the Range header to (start, stop); None serves the whole image, False is unsatisfiable"""
+    if not request.range or request.range.units != 'bytes':
+        return None
+    # If-Range: only honour the range while the client's copy is still current
+    if_range = request.if_range
+    if (if_range.etag or if_range.date) and if_range.etag != etag:
+        return None
+    byte_range = request.range.range_for_length(size)
+    if byte_range is None:
+        # Multiple ranges are not supported; send the whole image instead
+        return None if len(request.range.ranges) > 1 else False
+    return byte_range
+
 
 @images_bp.route("/<string:image_name>", methods=["GET"])
 def get_image(image_name):
-    db = get_db()
+    try:
+        params = _resize_params(resize_schema.load(request.args))
+    except ValidationError as err:
+        return jsonify(err.messages), 400
+    if params is not None and thumbnails.Image is None:
+        return jsonify({"error": "Resizing images needs the Pillow package"}), 501
+
+    db = get_read_db()
+    # length() reads the record header only, so this lookup never loads the blob
     image = db.execute(
-        "SELECT image_blob FROM images WHERE name = ?", (image_name,)
+        "SELECT id, length(image_blob) AS size, content_hash FROM images WHERE name = ?",
+        (image_name,)
     ).fetchone()
-    if image is None:
+    if image is None or image["size"] is None:
         raise NotFound()
 
-    # Convert the BLOB data into a BytesIO object
-    image_blob = BytesIO(image["image_blob"])
-    
-    # Send the image blob as a file-like object
-    response = make_response(send_file(image_blob, mimetype="image/jpeg"))
-    response.headers["Content-Disposition"] = "inline; filename=image.jpeg"
-    return response
\ No newline at end of file
+    # Image rows are never rewritten, so id and size identify the content
+    etag = etag_for("image", image["id"], image["size"])
+    # ?v= carries the original's ETag, which also pins every derivative of it
+    immutable = request.args.get("v") == etag
+    if params is not None:
+        etag = etag_for(etag, params.key())
+    cached = not_modified(etag)
+    if cached:
+        return set_cache_headers(cached, etag, immutable=immutable)
+
+    if params is not None:
+        derivative = _derivatives([image], params)[image["id"]]
+        if derivative is None:
+            return _rendering(jsonify({"status": "rendering"}))
+        if isinstance(derivative, Exception):
+            message, status = _render_error(derivative)
+            return jsonify({"error": message}), status
+        response = send_file(derivative, mimetype=params.mimetype, etag=False, conditional=False)
+        response.headers["X-Content-Type-Options"] = "nosniff"
+        return set_cache_headers(response, etag, immutable=immutable)
+
+    size = image["size"]
+    byte_range = _byte_range(size, etag)
+    if byte_range is False:
+        response = jsonify({"error": "Requested range not satisfiable"})
+        response.headers["Content-Range"] = f"bytes */{size}"
+        return response, 416
+    start, stop = byte_range or (0, size)
+
+    mime_type = sniff_mime_type(read_head(db, "images", "image_blob", image["id"]), image_name)
+    response = Response(
+        stream_blob(
+            get_pool(readonly=True), "images", "image_blob", image["id"],
+            start, stop, current_app.config["IMAGE_STREAM_CHUNK_SIZE"],
+            current_app.config["IMAGE_STREAM_RUN_SIZE"]
+        ),
+        status=206 if byte_range else 200,
+        mimetype=mime_type,
+        direct_passthrough=True
+    )
+    response.content_length = stop - start
+    response.accept_ranges = "bytes"
+    if byte_range:
+        response.headers["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+    response.headers["Content-Disposition"] = dump_options_header("inline", {"filename": image_name})
+    response.headers["X-Content-Type-Options"] = "nosniff"
+    if mime_type == "image/svg+xml":
+        # SVG can carry script; never run it when the image is opened directly
+        response.headers["Content-Security-Policy"] = "default-src 'none'; style-src 'unsafe-inline'; sandbox"
+    # Clients that put the ETag in ?v= get a URL whose content can never change
+    return set_cache_headers(response, etag, immutable=immutable)
+
+
+@images_bp.route("/thumbnails", methods=["POST"])
+def get_thumbnails():
+    """Resize many images in one request and return them inline as data URIs"""
+    try:
+        data = thumbnails_schema.load(request.get_json() or {})
+    except ValidationError as err:
+        return jsonify(err.messages), 400
+    if thumbnails.Image is None:
+        return jsonify({"error": "Resizing images needs the Pillow package"}), 501
+    names = list(dict.fromkeys(data.pop("names")))
+    if len(names) > current_app.config["IMAGE_BULK_MAX"]:
+        return jsonify({"names": [f"At most {current_app.config['IMAGE_BULK_MAX']} images per request."]}), 400
+    params = _resize_params(data) or thumbnails.ResizeParams()
+
+    rows = get_read_db().execute(
+        f"""
+        SELECT id, name, length(image_blob) AS size, content_hash FROM images
+        WHERE name IN ({', '.join('?' * len(names))}) AND image_blob IS NOT NULL
+        ORDER BY id
+        """,
+        names
+    ).fetchall()
+    images = {}
+    for row in rows:
+        images.setdefault(row["name"], row)
+
+    derivatives = _derivatives(images.values(), params)
+    result = {}
+    errors = {name: "Image not found" for name in names if name not in images}
+    pending = []
+    for name, image in images.items():
+        derivative = derivatives[image["id"]]
+        if derivative is None:
+            pending.append(name)
+            continue
+        if isinstance(derivative, Exception):
+            errors[name] = _render_error(derivative)[0]
+            continue
+        with derivative:
+            encoded = base64.b64encode(derivative.read()).decode("ascii")
+        version = etag_for("image", image["id"], image["size"])
+        result[name] = {
+            "etag": etag_for(version, params.key()),
+            "content_type": params.mimetype,
+            "url": url_for(
+                "images.get_image", image_name=name, v=version,
+                **{k: v for k, v in (("w", params.width), ("h", params.height)) if v},
+                format=params.format
+            ),
+            "data": f"data:{params.mimetype};base64,{encoded}",
+        }
+    response = jsonify({"images": result, "errors": errors, "pending": pending})
+    return _rendering(response) if pending else (response, 200)
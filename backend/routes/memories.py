@@ -0,0 +1,45 @@
+from flask import jsonify, request, current_app
+from . import memories_bp
+from database import get_read_db
+from schemas import MemorySearchQuerySchema
+from marshmallow import ValidationError
+from pagination import query_args
+import vector_index
+
+query_schema = MemorySearchQuerySchema()
+
+@memories_bp.route('/search', methods=['GET', 'POST'])
+def search_memories():
+    """Checkpoint memories ranked by cosine similarity to a query vector.
+
+    The vector is ?q_vector= (comma separated) or, for long vectors, the
+    q_vector of a POSTed JSON body with the same fields. ?q= text is embedded
+    instead when MEMORY_EMBEDDER is configured.
+    """
+    try:
+        if request.method == 'POST':
+            args = query_schema.load(request.get_json() or {})
+        else:
+            args = query_schema.load(query_args(query_schema))
+    except ValidationError as err:
+        return jsonify({'message': err.messages}), 400
+
+    config = current_app.config
+    vector = args.get('q_vector')
+    if vector is None:
+        if 'q' not in args:
+            return jsonify({'message': {'q_vector': ['Missing data for required field.']}}), 400
+        vectors = vector_index.embed(config, [args['q']])
+        if vectors is None:
+            return jsonify({'message': {'q': ['Text queries need MEMORY_EMBEDDER; send q_vector instead.']}}), 400
+        vector = vectors[0]
+    try:
+        query = vector_index.normalize([vector], config['VECTOR_SIZE'])[0]
+    except ValueError as e:
+        return jsonify({'message': {'q_vector': [str(e)]}}), 400
+
+    limit = min(args.get('limit', config['SEARCH_PAGE_SIZE']), config['MAX_PAGE_SIZE'])
+    hits = vector_index.search(
+        get_read_db(), vector_index.get_index(config), query, limit, bot_ids=args.get('bot_id')
+    )
+    return jsonify(hits), 200
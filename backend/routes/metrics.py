@@ -1,30 +1,161 @@
-from flask import jsonify, g
-from . import metrics_bp
-from database import get_db
-import json
+from flask import jsonify, g, request, current_app
+from . import metrics_bp, metrics_query_bp
+from database import get_db, get_read_db
+from http_cache import etag_for, not_modified, set_cache_headers
+from pagination import query_args
+from schemas import CheckpointMetricSchema, MetricsQuerySchema
+from marshmallow import ValidationError
+import hashlib
+import metrics_store
+import sqlite3
+
+metric_schema = CheckpointMetricSchema()
+query_schema = MetricsQuerySchema()
 
 @metrics_bp.url_value_preprocessor
 def preprocess_url_values(endpoint, values):
     g.bot_id = values.pop('bot_id', None)
 
-@metrics_bp.route('/checkpoints/<int:checkpoint_id>/metrics', methods=['GET'])
-def get_checkpoint_metrics(checkpoint_id):
-    db = get_db()
-    bot_id = g.bot_id
-    
+def _checkpoint_number(db, bot_id, checkpoint_id):
+    """Resolve a checkpoint number from the URL (0 is the latest); None if there is no such checkpoint"""
     if checkpoint_id == 0:
-        cp_row = db.execute(
-            'SELECT metrics FROM Checkpoints WHERE bot_id = ? ORDER BY checkpoint_number DESC LIMIT 1',
+        row = db.execute(
+            'SELECT checkpoint_number FROM Checkpoints WHERE bot_id = ? ORDER BY checkpoint_number DESC LIMIT 1',
             (bot_id,)
         ).fetchone()
     else:
-        cp_row = db.execute(
-            'SELECT metrics FROM Checkpoints WHERE checkpoint_number = ? AND bot_id = ?',
+        row = db.execute(
+            'SELECT checkpoint_number FROM Checkpoints WHERE checkpoint_number = ? AND bot_id = ?',
             (checkpoint_id, bot_id)
         ).fetchone()
-    
-    if not cp_row:
+    return row['checkpoint_number'] if row else None
+
+@metrics_bp.route('/checkpoints/<int:checkpoint_id>/metrics', methods=['GET'])
+def get_checkpoint_metrics(checkpoint_id):
+    db = get_read_db()
+    bot_id = g.bot_id
+
+    checkpoint_number = _checkpoint_number(db, bot_id, checkpoint_id)
+    if checkpoint_number is None:
         return jsonify({'message': 'Checkpoint not found'}), 404
-    
-    metrics = json.loads(cp_row['metrics']) if cp_row['metrics'] else {}
-    return jsonify(metrics), 200
+
+    metrics = metrics_store.checkpoint_metrics(db, bot_id, checkpoint_number)
+    # There is no version to key on, so the ETag is a digest of the stored values
+    digest = hashlib.sha1(repr(sorted(metrics.items())).encode('utf8')).hexdigest()
+    etag = etag_for('metrics', bot_id, checkpoint_number, digest)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    return set_cache_headers(jsonify(metrics), etag), 200
+
+@metrics_bp.route('/checkpoints/<int:checkpoint_id>/metrics', methods=['POST'])
+def record_checkpoint_metrics(checkpoint_id):
+    """Record {"metrics": {name: value}, "ts": optional Unix time} for one checkpoint"""
+    db = get_db()
+    bot_id = g.bot_id
+
+    body = request.get_json(silent=True) or {}
+    if not isinstance(body.get('metrics'), dict) or not body['metrics']:
+        return jsonify({'message': 'metrics must be a non-empty object'}), 400
+
+    checkpoint_number = _checkpoint_number(db, bot_id, checkpoint_id)
+    if checkpoint_number is None:
+        return jsonify({'message': 'Checkpoint not found'}), 404
+
+    try:
+        items = metric_schema.load(
+            [
+                {'bot_id': bot_id, 'checkpoint_number': checkpoint_number,
+                 'metric': name, 'value': value, 'ts': body.get('ts')}
+                for name, value in body['metrics'].items()
+            ],
+            many=True
+        )
+    except ValidationError as err:
+        return jsonify({'message': err.messages}), 400
+
+    metrics_store.record(db, [
+        (item['bot_id'], item['checkpoint_number'], item['metric'], item['value'], item.get('ts'))
+        for item in items
+    ])
+    db.commit()
+    return jsonify(metrics_store.checkpoint_metrics(db, bot_id, checkpoint_number)), 201
+
+@metrics_query_bp.route('', methods=['POST'])
+def record_metrics_batch():
+    """Record many metric values, for any bots and checkpoints, in one transaction"""
+    db = get_db()
+
+    items = request.get_json(silent=True)
+    if isinstance(items, dict):
+        items = items.get('metrics')
+    if not isinstance(items, list) or not items:
+        return jsonify({'message': 'Metrics are required'}), 400
+    if len(items) > current_app.config['METRICS_BATCH_MAX']:
+        return jsonify({'message': 'Too many metrics in one batch'}), 413
+
+    try:
+        items = metric_schema.load(items, many=True)
+    except ValidationError as err:
+        return jsonify({'message': err.messages}), 400
+
+    # Like the per-checkpoint POST, values may only be recorded for existing checkpoints
+    missing = metrics_store.missing_checkpoints(
+        db, [(item['bot_id'], item['checkpoint_number']) for item in items]
+    )
+    if missing:
+        return jsonify({
+            'message': 'Checkpoint not found',
+            'checkpoints': [
+                {'bot_id': bot_id, 'checkpoint_number': checkpoint_number}
+                for bot_id, checkpoint_number in missing
+            ]
+        }), 404
+
+    try:
+        metrics_store.record(db, [
+            (item['bot_id'], item['checkpoint_number'], item['metric'], item['value'], item.get('ts'))
+            for item in items
+        ])
+        db.commit()
+    except sqlite3.IntegrityError:
+        db.rollback()
+        return jsonify({'message': 'Unknown bot_id'}), 404
+    return jsonify({'recorded': len(items)}), 201
+
+@metrics_query_bp.route('/query', methods=['GET'])
+def query_metrics():
+    """Aggregate one metric across checkpoints of some bots, a stack, or every bot.
+
+    Returns per group (per bot unless group_by=none): summary stats and
+    percentiles, optionally a series downsampled to `points` checkpoint buckets
+    and time buckets of `bucket` seconds.
+    """
+    try:
+        args = query_schema.load(query_args(query_schema))
+    except ValidationError as err:
+        return jsonify({'message': err.messages}), 400
+
+    db = get_read_db()
+    bot_ids = args.get('bot_id')
+    if 'stack_id' in args:
+        stack_bots = metrics_store.stack_bot_ids(db, args['stack_id'])
+        if stack_bots is None:
+            return jsonify({'message': 'Stack not found'}), 404
+        bot_ids = sorted(set(stack_bots) & set(bot_ids)) if bot_ids else stack_bots
+
+    query = metrics_store.MetricQuery(
+        args['metric'],
+        bot_ids=bot_ids,
+        group_by=args['group_by'],
+        checkpoint_range=(args.get('from_checkpoint'), args.get('to_checkpoint')),
+        ts_range=(args.get('since'), args.get('until'))
+    )
+    groups = metrics_store.aggregate(
+        db, query,
+        stats=args.get('stats') or metrics_store.SUMMARY_STATS,
+        percentiles=args.get('percentile', ()),
+        points=args.get('points'),
+        bucket=args.get('bucket')
+    )
+    return jsonify({'metric': args['metric'], 'group_by': args['group_by'], 'groups': groups}), 200
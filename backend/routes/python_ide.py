@@ -1,10 +1,9 @@
-from flask import Blueprint, request, jsonify
-import sys
-from io import StringIO
-import traceback
-import importlib
-import os
-import importlib.util
+from flask import Blueprint, Response, request, jsonify, current_app, url_for
+import queue
+import python_runner
+import script_catalog
+from http_cache import not_modified, set_cache_headers
+from database import get_db, get_pool, get_read_db
 from . import python_ide_bp
 
 @python_ide_bp.route('/', methods=['GET'])
@@ -13,109 +12,126 @@ def test():
 
 @python_ide_bp.route('/get-scripts', methods=['GET'])
 def get_scripts():
-    try:
-        # Get the modular_intelligence package location
-        mi_spec = importlib.util.find_spec('modular_intelligence')
-        if mi_spec is None:
-            print("Error: modular_intelligence package not found")
-            return jsonify({'error': 'modular_intelligence package not found'}), 404
-        
-        print(f"Found modular_intelligence at: {mi_spec.origin}")
-        
-        # Get the scripts directory path
-        scripts_dir = os.path.join(os.path.dirname(mi_spec.origin), 'scripts')
-        print(f"Looking for scripts in: {scripts_dir}")
-        
-        if not os.path.exists(scripts_dir):
-            print(f"Error: scripts directory not found at {scripts_dir}")
-            return jsonify({'error': 'scripts directory not found'}), 404
-        
-        scripts = {}
-        
-        # List all Python files in the directory
-        all_files = os.listdir(scripts_dir)
-        script_files = [f for f in all_files if f.endswith('.py')]
-        print(f"Found Python files in directory: {script_files}")
-        
-        for script_file in script_files:
-            file_path = os.path.join(scripts_dir, script_file)
-            print(f"Reading file: {file_path}")
-            if os.path.exists(file_path):
-                with open(file_path, 'r') as f:
-                    # Convert filename to display name (replace underscores with spaces)
-                    display_name = os.path.splitext(script_file)[0].replace('_', ' ')
-                    scripts[script_file] = {
-                        'name': display_name,
-                        'code': f.read()
-                    }
-                print(f"Successfully loaded: {script_file}")
-        
-        print(f"Total scripts loaded: {len(scripts)}")
-        return jsonify(scripts)
-    except Exception as e:
-        print(f"Error in get_scripts: {str(e)}")
-        return jsonify({'error': str(e)}), 500
+    """Catalog of script templates: metadata only, bodies come from /scripts/<filename>"""
+    catalog, error = script_catalog.get_catalog(current_app.config)
+    listing = catalog.listing() if catalog is not None else None
+    if listing is None:
+        return jsonify({'error': error or 'scripts directory not found'}), 404
+
+    etag, scripts = listing
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    response = jsonify({filename: script.metadata() for filename, script in sorted(scripts.items())})
+    return set_cache_headers(response, etag)
+
+@python_ide_bp.route('/scripts/<filename>', methods=['GET'])
+def get_script(filename):
+    """Source of one script template"""
+    catalog, error = script_catalog.get_catalog(current_app.config)
+    if catalog is None:
+        return jsonify({'error': error}), 404
+    # Only names in the catalog are served, so the filename cannot leave the directory
+    script = catalog.script(filename)
+    if script is None:
+        return jsonify({'error': 'Script not found'}), 404
+
+    cached = not_modified(script.etag, script.modified)
+    if cached is not None:
+        return cached
+    response = Response(catalog.body(script), mimetype='text/x-python')
+    return set_cache_headers(response, script.etag, script.modified)
+
+def _runner():
+    return python_runner.get_runner(current_app.config, get_pool(readonly=False), get_pool(readonly=True))
 
 @python_ide_bp.route('/run-python', methods=['POST'])
 def run_python():
+    """Run a script and return its output once it finishes"""
     code = request.json.get('code')
     if not code:
         return jsonify({'error': 'No code provided'}), 400
-    
-    # Create string buffers to capture output and errors
-    output_buffer = StringIO()
-    error_buffer = StringIO()
-    
-    # Store original stdout and stderr
-    original_stdout = sys.stdout
-    original_stderr = sys.stderr
-    
+
     try:
-        # Initialize colorama
-        import colorama
-        colorama.init()
-        
-        # Redirect stdout and stderr to our buffers
-        sys.stdout = output_buffer
-        sys.stderr = error_buffer
-        
-        # Add custom imports to globals
-        globals_dict = {
-            '__builtins__': __builtins__,
-            'importlib': importlib,
-            'sys': sys,
-            'colorama': colorama,
-            'Fore': colorama.Fore,
-            'Back': colorama.Back,
-            'Style': colorama.Style
-        }
-        
-        # Try to import modular-intelligence
-        try:
-            mi = importlib.import_module('modular_intelligence')
-            globals_dict['mi'] = mi
-        except ImportError:
-            error_buffer.write("Warning: modular-intelligence package not found. Please install it first.\n")
-        
-        # Execute the code with our custom globals
-        exec(code, globals_dict)
-        
-        # Get the output and errors
-        output = output_buffer.getvalue()
-        errors = error_buffer.getvalue()
-        
-        return jsonify({
-            'output': output,
-            'error': errors if errors else None,
-            'hasAnsiCodes': True
-        })
-    except Exception as e:
+        job = _runner().submit(code)
+    except queue.Full:
+        return jsonify({'error': 'Too many scripts are running; try again shortly'}), 429
+    job.wait()
+
+    db = get_read_db()
+    record = python_runner.get_job(db, job.id)
+    output, errors, truncated = python_runner.read_output(db, job.id)
+    if truncated:
+        output = '[earlier output truncated]\n' + output
+    if record['traceback'] is not None:
+        # The script raised: same shape as when it ran in the server process
         return jsonify({
-            'error': str(e),
-            'traceback': traceback.format_exc()
+            'error': record['error'],
+            'traceback': record['traceback'],
+            'output': output
         }), 500
-    finally:
-        # Reset stdout and stderr
-        sys.stdout = original_stdout
-        sys.stderr = original_stderr
-        colorama.deinit()
+    if record['error'] is not None:
+        errors = f"{errors}{record['error']}\n"
+    return jsonify({
+        'output': output,
+        'error': errors if errors else None,
+        'status': record['status'],
+        'hasAnsiCodes': True
+    })
+
+@python_ide_bp.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue a script and return its job id without waiting for it"""
+    code = (request.get_json(silent=True) or {}).get('code')
+    if not code:
+        return jsonify({'error': 'No code provided'}), 400
+
+    try:
+        job = _runner().submit(code)
+    except queue.Full:
+        return jsonify({'error': 'Too many scripts are running; try again shortly'}), 429
+    return jsonify({
+        'job_id': job.id,
+        'status': 'queued',
+        'stream_url': url_for('python_ide.stream_job', job_id=job.id)
+    }), 202
+
+@python_ide_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    record = python_runner.get_job(get_read_db(), job_id)
+    if record is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(python_runner.job_json(record))
+
+@python_ide_bp.route('/jobs/<job_id>/stream', methods=['GET'])
+def stream_job(job_id):
+    """Stream a job's stdout and stderr as Server-Sent Events until it finishes"""
+    if python_runner.get_job(get_read_db(), job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    after = int(last_event_id) if last_event_id.isdigit() else max(0, request.args.get('after', 0, type=int))
+    stream = python_runner.OutputStream(
+        _runner(),
+        get_pool(readonly=True),
+        job_id,
+        after,
+        current_app.config['PYTHON_IDE_POLL_INTERVAL'],
+        current_app.config['SESSION_STREAM_HEARTBEAT']
+    )
+    response = Response(stream, mimetype='text/event-stream', direct_passthrough=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@python_ide_bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running job; a running one is stopped within about a second"""
+    db = get_db()
+    if python_runner.get_job(db, job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if not python_runner.cancel_job(db, job_id):
+        return jsonify({'error': 'Job has already finished'}), 409
+    # Immediate if the job runs in this process; otherwise its dispatcher sees the flag
+    _runner().cancel(job_id)
+    return jsonify(python_runner.job_json(python_runner.get_job(db, job_id))), 202
@@ -0,0 +1,41 @@
+from flask import jsonify, current_app
+from . import search_bp
+from database import get_read_db
+from schemas import SearchQuerySchema
+from marshmallow import ValidationError
+from pagination import query_args, page_response
+import search_index
+import sqlite3
+
+query_schema = SearchQuerySchema()
+
+@search_bp.route('', methods=['GET'])
+def search():
+    """Ranked full-text search over bots, stacks, checkpoints and session messages.
+
+    ?q= is matched word by word (the last word as a prefix) unless
+    syntax=fts, which passes it to FTS5 as a query expression. Pages follow
+    X-Next-Cursor like the list endpoints.
+    """
+    try:
+        args = query_schema.load(query_args(query_schema))
+    except ValidationError as err:
+        return jsonify({'message': err.messages}), 400
+
+    query = args['q'] if args['syntax'] == 'fts' else search_index.plain_query(args['q'])
+    if query is None:
+        return page_response([], None), 200
+
+    limit = args.get('limit', current_app.config['SEARCH_PAGE_SIZE'])
+    limit = min(limit, current_app.config['MAX_PAGE_SIZE'])
+    offset = args['after']
+    kinds = list(dict.fromkeys(args.get('kind') or search_index.KINDS))
+    try:
+        hits = search_index.search(
+            get_read_db(), query, kinds, bot_ids=args.get('bot_id'), limit=limit + 1, offset=offset
+        )
+    except sqlite3.OperationalError as e:
+        return jsonify({'message': f'Invalid search query: {e}'}), 400
+
+    next_cursor = offset + limit if len(hits) > limit else None
+    return page_response(hits[:limit], next_cursor), 200
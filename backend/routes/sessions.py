@@ -1,12 +1,38 @@
-from flask import jsonify, request, g
-from . import sessions_bp
-from database import get_db
+from flask import Response, jsonify, request, g, current_app
+from . import sessions_bp, session_batches_bp
+from database import get_db, get_pool, get_read_db
 from models import Session
-from schemas import SessionSchema
+from schemas import SessionSchema, SessionMessageSchema
 from marshmallow import ValidationError
 import json
+import search_index
+import session_stream
+import storage_codec
 from datetime import datetime
 
+# ?response= of POST /current: the whole session (the default), or only the appended message
+APPEND_RESPONSES = ('session', 'message')
+
+def _load_messages(db, session_id):
+    """Assemble the session's message list from the SessionMessages log"""
+    rows = db.execute(
+        'SELECT message FROM SessionMessages WHERE session_id = ? ORDER BY seq',
+        (session_id,)
+    ).fetchall()
+    # Each row already holds a JSON document, so join them instead of re-encoding
+    return '[' + ','.join(storage_codec.decode_text(row['message']) for row in rows) + ']'
+
+def _encode_message(message):
+    config = current_app.config
+    return storage_codec.encode_text(
+        json.dumps(message), config['STORAGE_CODEC'], config['STORAGE_COMPRESS_MIN_SIZE']
+    )
+
+def _dump_session(db, session):
+    result = SessionSchema().dump(Session.from_row(session))
+    result['messages'] = _load_messages(db, session['id'])
+    return result
+
 @sessions_bp.route('', methods=['POST'])
 def start_session(bot_id):
     """Start a new session for a bot"""
@@ -35,6 +61,7 @@ def start_session(bot_id):
             (bot_id, datetime.utcnow(), json.dumps([]))
         )
         db.commit()
+        session_stream.notify(current_app.config)
         
         session_id = db.execute('SELECT last_insert_rowid()').fetchone()[0]
         
@@ -52,7 +79,7 @@ def start_session(bot_id):
 @sessions_bp.route('/current', methods=['GET'])
 def get_current_session(bot_id):
     """Get the current session"""
-    db = get_db()
+    db = get_read_db()
     
     if not bot_id:
         return jsonify({'message': 'Bot ID is required'}), 400
@@ -70,16 +97,24 @@ def get_current_session(bot_id):
     if not session:
         return jsonify({'message': 'No active session found'}), 404
         
-    result = SessionSchema().dump(Session.from_row(session))
+    result = _dump_session(db, session)
     return jsonify(result), 200
 
 @sessions_bp.route('/current', methods=['POST'])
 def add_message_to_session(bot_id):
-    """Add a message to the current session"""
+    """Add a message to the current session.
+
+    Returns the whole session, or with ?response=message only the appended
+    message and its seq, which does not grow with the session.
+    """
     db = get_db()
     
     if not bot_id:
         return jsonify({'message': 'Bot ID is required'}), 400
+
+    response_mode = request.args.get('response', 'session')
+    if response_mode not in APPEND_RESPONSES:
+        return jsonify({'message': {'response': [f"Must be one of: {', '.join(APPEND_RESPONSES)}"]}}), 400
         
     data = request.get_json()
     if not data or 'message' not in data:
@@ -99,31 +134,65 @@ def add_message_to_session(bot_id):
         return jsonify({'message': 'No active session found'}), 404
         
     try:
-        # Update the messages
-        current_messages = json.loads(session['messages'])
-        current_messages.append(data['message'])
-        
-        db.execute(
+        # Append a single row to the message log
+        seq = db.execute(
             '''
-            UPDATE Sessions 
-            SET messages = ?
-            WHERE id = ?
+            INSERT INTO SessionMessages (session_id, seq, message, created_at)
+            SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ?
+            FROM SessionMessages WHERE session_id = ?
+            RETURNING seq
             ''',
-            (json.dumps(current_messages), session['id'])
-        )
+            (session['id'], _encode_message(data['message']), datetime.utcnow(), session['id'])
+        ).fetchone()['seq']
+        search_index.index_messages(db, [(session['id'], seq, search_index.message_text(data['message']))])
         db.commit()
+        session_stream.notify(current_app.config)
         
-        # Get the updated session
-        updated_session = db.execute(
-            'SELECT * FROM Sessions WHERE id = ?', (session['id'],)
-        ).fetchone()
-        
-        result = SessionSchema().dump(Session.from_row(updated_session))
+        if response_mode == 'message':
+            return jsonify({'session_id': session['id'], 'seq': seq, 'message': data['message']}), 200
+        result = _dump_session(db, session)
         return jsonify(result), 200
         
     except Exception as e:
         return jsonify({'message': str(e)}), 500
 
+@sessions_bp.route('/current/stream', methods=['GET'])
+def stream_current_session(bot_id):
+    """Stream the current session's messages as Server-Sent Events, then follow new ones"""
+    db = get_read_db()
+
+    session = db.execute(
+        '''
+        SELECT id FROM Sessions
+        WHERE bot_id = ? AND ended_at IS NULL
+        ORDER BY started_at DESC LIMIT 1
+        ''',
+        (bot_id,)
+    ).fetchone()
+
+    if not session:
+        return jsonify({'message': 'No active session found'}), 404
+
+    pool = get_pool(readonly=True)
+    stream = session_stream.EventStream(
+        session_stream.get_broker(current_app.config, pool),
+        pool,
+        session['id'],
+        session_stream.resume_offset(
+            session['id'],
+            request.headers.get('Last-Event-ID'),
+            request.args.get('after', 0, type=int)
+        ),
+        current_app.config['SESSION_STREAM_HEARTBEAT']
+    )
+    # direct_passthrough hands the stream itself to the server, which lets asgi.py
+    # iterate it on the event loop
+    response = Response(stream, mimetype='text/event-stream', direct_passthrough=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx-style proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @sessions_bp.route('/current/end', methods=['POST'])
 def end_current_session(bot_id):
     """End the current session"""
@@ -156,14 +225,132 @@ def end_current_session(bot_id):
             (datetime.utcnow(), session['id'])
         )
         db.commit()
+        session_stream.notify(current_app.config)
         
         # Get the updated session
         updated_session = db.execute(
             'SELECT * FROM Sessions WHERE id = ?', (session['id'],)
         ).fetchone()
         
-        result = SessionSchema().dump(Session.from_row(updated_session))
+        result = _dump_session(db, updated_session)
         return jsonify(result), 200
         
     except Exception as e:
-        return jsonify({'message': str(e)}), 500
\ No newline at end of file
+        return jsonify({'message': str(e)}), 500
+
+def _read_batch_items():
+    """Parse a batch body: a JSON array, {"messages": [...]}, or NDJSON lines"""
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        lines = request.get_data(as_text=True).splitlines()
+        return [json.loads(line) for line in lines if line.strip()]
+    data = request.get_json()
+    if isinstance(data, dict):
+        return data.get('messages')
+    return data
+
+@session_batches_bp.route('/messages', methods=['POST'])
+def add_messages_batch():
+    """Append many messages, for any number of bots and sessions, in one transaction"""
+    db = get_db()
+
+    try:
+        items = _read_batch_items()
+    except ValueError:
+        return jsonify({'message': 'Malformed JSON body'}), 400
+    if not isinstance(items, list) or not items:
+        return jsonify({'message': 'Messages are required'}), 400
+    if len(items) > current_app.config['SESSION_BATCH_MAX_MESSAGES']:
+        return jsonify({'message': 'Too many messages in one batch'}), 413
+
+    try:
+        items = SessionMessageSchema(many=True).load(items)
+    except ValidationError as err:
+        return jsonify({'message': err.messages}), 400
+
+    # Resolve the active session for every bot that did not name a session explicitly
+    bot_ids = sorted({item['bot_id'] for item in items if item.get('session_id') is None})
+    active = {}
+    if bot_ids:
+        rows = db.execute(
+            f'''
+            SELECT id, bot_id FROM Sessions
+            WHERE ended_at IS NULL AND bot_id IN ({', '.join('?' * len(bot_ids))})
+            ORDER BY started_at
+            ''',
+            bot_ids
+        ).fetchall()
+        # Later rows win, leaving the most recently started session per bot
+        active = {row['bot_id']: row['id'] for row in rows}
+    missing = [bot_id for bot_id in bot_ids if bot_id not in active]
+    if missing:
+        return jsonify({'message': 'No active session found', 'bot_ids': missing}), 404
+
+    grouped = {}
+    for item in items:
+        session_id = item['session_id'] if item.get('session_id') is not None else active[item['bot_id']]
+        grouped.setdefault(session_id, {'bot_id': item['bot_id'], 'messages': [], 'texts': []})
+        grouped[session_id]['messages'].append(_encode_message(item['message']))
+        grouped[session_id]['texts'].append(search_index.message_text(item['message']))
+
+    session_ids = list(grouped)
+    placeholders = ', '.join('?' * len(session_ids))
+    try:
+        # Take the write lock before reading offsets so concurrent batches cannot interleave
+        db.execute('BEGIN IMMEDIATE')
+        known = {
+            row['id']: row
+            for row in db.execute(
+                f'SELECT id, bot_id, ended_at FROM Sessions WHERE id IN ({placeholders})', session_ids
+            ).fetchall()
+        }
+        invalid = [sid for sid in session_ids if sid not in known or known[sid]['bot_id'] != grouped[sid]['bot_id']]
+        if invalid:
+            db.rollback()
+            return jsonify({'message': 'Session not found for bot', 'session_ids': invalid}), 404
+        # Like single appends, ended sessions take no more messages
+        ended = [sid for sid in session_ids if known[sid]['ended_at'] is not None]
+        if ended:
+            db.rollback()
+            return jsonify({'message': 'No active session found', 'session_ids': ended}), 404
+
+        offsets = dict(db.execute(
+            f'''
+            SELECT session_id, MAX(seq) FROM SessionMessages
+            WHERE session_id IN ({placeholders})
+            GROUP BY session_id
+            ''',
+            session_ids
+        ).fetchall())
+
+        now = datetime.utcnow()
+        rows = []
+        results = []
+        for session_id, group in grouped.items():
+            first_seq = offsets.get(session_id, 0) + 1
+            rows.extend(
+                (session_id, seq, message, now)
+                for seq, message in enumerate(group['messages'], start=first_seq)
+            )
+            results.append({
+                'session_id': session_id,
+                'bot_id': group['bot_id'],
+                'first_seq': first_seq,
+                'last_seq': first_seq + len(group['messages']) - 1,
+            })
+        db.executemany(
+            'INSERT INTO SessionMessages (session_id, seq, message, created_at) VALUES (?, ?, ?, ?)',
+            rows
+        )
+        search_index.index_messages(db, [
+            (session_id, seq, text)
+            for session_id, group in grouped.items()
+            for seq, text in enumerate(group['texts'], start=offsets.get(session_id, 0) + 1)
+        ])
+        db.commit()
+        session_stream.notify(current_app.config)
+    except Exception as e:
+        db.rollback()
+        current_app.logger.error(f"Error ingesting message batch: {e}")
+        return jsonify({'message': 'Internal server error'}), 500
+
+    return jsonify({'accepted': len(rows), 'sessions': results}), 201
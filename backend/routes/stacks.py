@@ -1,50 +1,51 @@
 from flask import jsonify, request, current_app
 from . import stacks_bp
-from database import get_db
+from database import get_db, get_read_db
 from models import Stack, StackSlot, Bot
 from schemas import StackSchema, StackSlotSchema
 from marshmallow import ValidationError
+from pagination import requested_fields, fetch_page, page_response
+from serializers import row_serializer
 
 @stacks_bp.route('', methods=['GET', 'POST'])
 def manage_stacks():
-    db = get_db()
+    db = get_read_db() if request.method == 'GET' else get_db()
     if request.method == 'GET':
-        stacks = db.execute('SELECT * FROM Stacks').fetchall()
-        stack_list = []
+        try:
+            fields = requested_fields(StackSchema)
+        except ValidationError as err:
+            return jsonify(err.messages), 400
+        columns = [f's.{f}' for f in fields if f != 'agents']
+        if 'agents' in fields:
+            columns.append('o.id AS orchestrator_id')
+        stacks, next_cursor = fetch_page(
+            db,
+            'Stacks s LEFT JOIN Bots o ON o.id = s.orchestrator_bot_id',
+            columns,
+            key='s.id'
+        )
 
-        # Get all stacks
-        for stack in stacks:
-            # Get the orchestrator bot for this stack
-            orchestrator = db.execute(
-                '''
-                SELECT id FROM Bots 
-                WHERE id = (
-                    SELECT orchestrator_bot_id 
-                    FROM Stacks 
-                    WHERE id = ?
-                )
-                ''', 
-                (stack['id'],)
-            ).fetchone()
-            print(f"\n\norchestrator: {orchestrator['id']}\n\n")
-            stack_data = StackSchema().dump(Stack.from_row(stack))
-            # Get all agents (bots) in this stack's slots
+        # Fetch the slot agents for the whole page in one query
+        agents = {stack['id']: [] for stack in stacks}
+        if 'agents' in fields and stacks:
+            for stack in stacks:
+                if stack['orchestrator_id'] is not None:
+                    agents[stack['id']].append(stack['orchestrator_id'])
             slots = db.execute(
-                '''
-                SELECT bot_id FROM StackSlots 
-                WHERE stack_id = ? AND bot_id IS NOT NULL
-                ORDER BY slot_number
-                ''', 
-                (stack['id'],)
+                f'''
+                SELECT stack_id, bot_id FROM StackSlots
+                WHERE stack_id IN ({', '.join('?' * len(agents))}) AND bot_id IS NOT NULL
+                ORDER BY stack_id, slot_number
+                ''',
+                list(agents)
             ).fetchall()
-            agents = []
-            if orchestrator:
-                agents.append(orchestrator['id'])
-            agents.extend([slot['bot_id'] for slot in slots])
-            stack_data['agents'] = agents
-            stack_list.append(stack_data)
-            print(f"\n\nstack_list: {stack_list}\n\n")
-        return jsonify(stack_list), 200
+            for slot in slots:
+                agents[slot['stack_id']].append(slot['bot_id'])
+
+        stack_list = row_serializer(StackSchema, [f for f in fields if f != 'agents']).iter(stacks)
+        if 'agents' in fields:
+            stack_list = (dict(stack_data, agents=agents[stack_data['id']]) for stack_data in stack_list)
+        return page_response(stack_list, next_cursor), 200
     elif request.method == 'POST':
         data = request.get_json()
         try:
@@ -68,7 +69,7 @@ def manage_stacks():
 
 @stacks_bp.route('/<int:stack_id>', methods=['GET', 'PUT', 'DELETE'])
 def stack_detail(stack_id):
-    db = get_db()
+    db = get_read_db() if request.method == 'GET' else get_db()
     if request.method == 'GET':
         stack_row = db.execute('SELECT * FROM Stacks WHERE id = ?', (stack_id,)).fetchone()
         if not stack_row:
@@ -113,11 +114,16 @@ def stack_detail(stack_id):
 
 @stacks_bp.route('/<int:stack_id>/slots', methods=['GET', 'POST'])
 def manage_stack_slots(stack_id):
-    db = get_db()
+    db = get_read_db() if request.method == 'GET' else get_db()
     if request.method == 'GET':
-        slots = db.execute('SELECT * FROM StackSlots WHERE stack_id = ?', (stack_id,)).fetchall()
-        slot_list = [StackSlotSchema().dump(StackSlot.from_row(slot)) for slot in slots]
-        return jsonify(slot_list), 200
+        try:
+            fields = requested_fields(StackSlotSchema)
+        except ValidationError as err:
+            return jsonify(err.messages), 400
+        slots, next_cursor = fetch_page(
+            db, 'StackSlots', fields, where='stack_id = ?', params=(stack_id,)
+        )
+        return page_response(row_serializer(StackSlotSchema, fields).iter(slots), next_cursor), 200
     elif request.method == 'POST':
         data = request.get_json()
         try:
@@ -148,7 +154,7 @@ def manage_stack_slots(stack_id):
 
 @stacks_bp.route('/<int:stack_id>/slots/<int:slot_id>', methods=['GET', 'PUT', 'DELETE'])
 def stack_slot_detail(stack_id, slot_id):
-    db = get_db()
+    db = get_read_db() if request.method == 'GET' else get_db()
     if request.method == 'GET':
         slot_row = db.execute(
             'SELECT * FROM StackSlots WHERE id = ? AND stack_id = ?',
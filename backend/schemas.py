@@ -1,4 +1,4 @@
-from marshmallow import Schema, fields, validate
+from marshmallow import EXCLUDE, Schema, fields, validate
 
 class BotSchema(Schema):
     id = fields.Int(dump_only=True)
@@ -22,6 +22,8 @@ class CheckpointSchema(Schema):
     model = fields.Str(allow_none=True)
     name = fields.Str(dump_only=True)
     description = fields.Str(allow_none=True)
+    # One embedding per entry of memories, in order (see vector_index.py)
+    memory_vectors = fields.List(fields.List(fields.Float()), load_only=True, allow_none=True)
 
 class StackSchema(Schema):
     id = fields.Int(dump_only=True)
@@ -46,6 +48,10 @@ class SessionSchema(Schema):
     ended_at = fields.Str(allow_none=True)
     messages = fields.Str()
 
+class SessionMessageSchema(SessionSchema):
+    session_id = fields.Int(allow_none=True, validate=validate.Range(min=1))
+    message = fields.Raw(required=True)
+
 class ImageSchema(Schema):
     id = fields.Int(dump_only=True)
     name = fields.Str(required=True)
@@ -53,3 +59,63 @@ class ImageSchema(Schema):
     image_blob = fields.Raw(required=True)
     
 
+
+class ImageResizeSchema(Schema):
+    class Meta:
+        # Query strings also carry ?v= and other cache busters
+        unknown = EXCLUDE
+
+    w = fields.Int(validate=validate.Range(min=1, max=4096))
+    h = fields.Int(validate=validate.Range(min=1, max=4096))
+    format = fields.Str(validate=validate.OneOf(["jpeg", "png", "webp"]))
+
+class ImageThumbnailsSchema(ImageResizeSchema):
+    names = fields.List(fields.Str(), required=True, validate=validate.Length(min=1))
+
+class CheckpointMetricSchema(Schema):
+    bot_id = fields.Int(required=True)
+    checkpoint_number = fields.Int(required=True)
+    metric = fields.Str(required=True, validate=validate.Length(min=1, max=200))
+    value = fields.Float(required=True, allow_nan=False)
+    # Unix time in seconds; defaults to when the value is recorded
+    ts = fields.Float(allow_none=True)
+
+class MetricsQuerySchema(Schema):
+    class Meta:
+        unknown = EXCLUDE
+
+    metric = fields.Str(required=True)
+    bot_id = fields.List(fields.Int())
+    stack_id = fields.Int()
+    group_by = fields.Str(load_default="bot", validate=validate.OneOf(["bot", "none"]))
+    stats = fields.List(fields.Str(validate=validate.OneOf(["count", "min", "max", "avg", "stddev"])))
+    percentile = fields.List(fields.Float(validate=validate.Range(min=0, max=100)))
+    points = fields.Int(validate=validate.Range(min=1, max=10000))
+    bucket = fields.Float(validate=validate.Range(min=1))
+    from_checkpoint = fields.Int()
+    to_checkpoint = fields.Int()
+    since = fields.Float()
+    until = fields.Float()
+
+class SearchQuerySchema(Schema):
+    class Meta:
+        unknown = EXCLUDE
+
+    q = fields.Str(required=True, validate=validate.Length(min=1, max=1000))
+    kind = fields.List(fields.Str(validate=validate.OneOf(["bots", "stacks", "checkpoints", "messages"])))
+    bot_id = fields.List(fields.Int())
+    syntax = fields.Str(load_default="plain", validate=validate.OneOf(["plain", "fts"]))
+    limit = fields.Int(validate=validate.Range(min=1))
+    after = fields.Int(load_default=0, validate=validate.Range(min=0))
+
+class MemoryVectorsSchema(Schema):
+    vectors = fields.List(fields.List(fields.Float()), required=True)
+
+class MemorySearchQuerySchema(Schema):
+    class Meta:
+        unknown = EXCLUDE
+
+    q_vector = fields.List(fields.Float())
+    q = fields.Str(validate=validate.Length(min=1, max=10000))
+    bot_id = fields.List(fields.Int())
+    limit = fields.Int(validate=validate.Range(min=1))
@@ -0,0 +1,146 @@
+"""In-memory index of the Python IDE's script templates.
+
+The scripts directory (the modular_intelligence package's scripts/ unless
+PYTHON_IDE_SCRIPTS_DIR is set) is located once per process. Listing it costs
+a single stat of the directory: the index is rebuilt when the directory's
+mtime changes, which covers scripts being added, removed or renamed, and file
+mtimes are rechecked at most every PYTHON_IDE_SCRIPTS_RESCAN seconds to pick
+up scripts edited in place. Bodies are read on demand and kept until their
+file changes.
+"""
+import hashlib
+import importlib.util
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from http_cache import etag_for
+
+
+class Script:
+    def __init__(self, filename, size, mtime_ns):
+        self.filename = filename
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self._body = None
+
+    @property
+    def name(self):
+        # Display name: the filename without .py, underscores as spaces
+        return os.path.splitext(self.filename)[0].replace('_', ' ')
+
+    @property
+    def etag(self):
+        return etag_for('script', f'{self.mtime_ns:x}', f'{self.size:x}')
+
+    @property
+    def modified(self):
+        return datetime.fromtimestamp(self.mtime_ns / 1e9, timezone.utc).replace(tzinfo=None)
+
+    def metadata(self):
+        return {'name': self.name, 'size': self.size, 'modified': self.modified, 'etag': self.etag}
+
+
+class ScriptCatalog:
+    def __init__(self, directory, rescan_interval):
+        self.directory = directory
+        self.rescan_interval = rescan_interval
+        self._lock = threading.Lock()
+        self._scripts = None
+        self._version = None
+        self._dir_mtime = None
+        self._next_rescan = 0
+
+    def listing(self):
+        """(ETag of the whole listing, {filename: Script}); None if the directory is gone"""
+        try:
+            dir_mtime = os.stat(self.directory).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            if dir_mtime != self._dir_mtime or now >= self._next_rescan:
+                self._rebuild()
+                self._dir_mtime = dir_mtime
+                self._next_rescan = now + self.rescan_interval
+            return self._version, self._scripts
+
+    def _rebuild(self):
+        previous = self._scripts or {}
+        scripts = {}
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith('.py'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                script = previous.get(entry.name)
+                # Unchanged scripts keep their cached body
+                if script is None or (script.mtime_ns, script.size) != (stat.st_mtime_ns, stat.st_size):
+                    script = Script(entry.name, stat.st_size, stat.st_mtime_ns)
+                scripts[entry.name] = script
+        digest = hashlib.sha1()
+        for filename in sorted(scripts):
+            digest.update(f'{filename}\0{scripts[filename].etag}\0'.encode('utf8'))
+        self._scripts = scripts
+        self._version = etag_for('scripts', digest.hexdigest())
+
+    def script(self, filename):
+        """The Script for a listed filename, with current size and mtime; None if unknown"""
+        listing = self.listing()
+        if listing is None or filename not in listing[1]:
+            return None
+        try:
+            stat = os.stat(os.path.join(self.directory, filename))
+        except FileNotFoundError:
+            return None
+        script = listing[1][filename]
+        if (script.mtime_ns, script.size) != (stat.st_mtime_ns, stat.st_size):
+            # Edited since the last rescan
+            script = Script(filename, stat.st_size, stat.st_mtime_ns)
+            with self._lock:
+                if self._scripts is not None and filename in self._scripts:
+                    self._scripts[filename] = script
+                    self._next_rescan = 0
+        return script
+
+    def body(self, script):
+        """The script's source; read once per version of the file"""
+        if script._body is None:
+            with open(os.path.join(self.directory, script.filename), 'rb') as f:
+                script._body = f.read()
+        return script._body
+
+
+def scripts_directory(config):
+    """(directory, None) or (None, reason it could not be located)"""
+    if config['PYTHON_IDE_SCRIPTS_DIR']:
+        return str(config['PYTHON_IDE_SCRIPTS_DIR']), None
+    spec = importlib.util.find_spec('modular_intelligence')
+    if spec is None or spec.origin is None:
+        return None, 'modular_intelligence package not found'
+    return os.path.join(os.path.dirname(spec.origin), 'scripts'), None
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(config):
+    """(this process's catalog, None) or (None, error message) if there is no scripts directory"""
+    key = (os.getpid(), str(config['PYTHON_IDE_SCRIPTS_DIR']))
+    entry = _catalogs.get(key)
+    if entry is None:
+        with _catalogs_lock:
+            entry = _catalogs.get(key)
+            if entry is None:
+                directory, error = scripts_directory(config)
+                if directory is None:
+                    # Not cached: the package may be installed while the server runs
+                    return None, error
+                entry = ScriptCatalog(directory, config['PYTHON_IDE_SCRIPTS_RESCAN'])
+                _catalogs[key] = entry
+    return entry, None
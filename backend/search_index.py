@@ -0,0 +1,191 @@
+"""Full-text search over bots, stacks, checkpoints and session messages with SQLite FTS5.
+
+Every searchable table has an FTS5 table whose rowid is the source row's id
+(migration 0009):
+
+- SearchBots and SearchStacks are kept in sync by triggers;
+- SearchCheckpoints and SearchMessages are written by the write paths in
+  the same transaction as their source rows, because payloads and messages
+  may be stored compressed or as chunks, which SQL cannot read. Triggers
+  still remove their rows on delete, including cascades.
+
+JSON payloads and messages are indexed as their string values only (just the
+content of chat messages), so keys and roles never match.
+
+A search runs one ranked query per requested kind and merges them by bm25
+score in SQL. Snippets are HTML-escaped with matches wrapped in <mark>.
+"""
+import html
+import re
+from dataclasses import dataclass
+
+import content_store
+
+# Private-use markers around matches, swapped for <mark> after escaping
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+SNIPPET_TOKENS = 16
+
+CHECKPOINT_COLUMNS = ('name', 'description', 'system_prompt', 'datasets', 'memories', 'session_history')
+
+
+@dataclass(frozen=True)
+class Kind:
+    table: str
+    # Per-column bm25 weights, in column order
+    weights: tuple
+    # Columns of the result, selected with the FTS table aliased as f
+    select: str
+    joins: str
+    # Restricts results to a set of bots; {ids} is replaced by placeholders
+    bot_filter: str
+
+
+KINDS = {
+    'bots': Kind(
+        'SearchBots', (10.0, 4.0, 1.0, 1.0),
+        "f.rowid AS id, f.rowid AS bot_id, b.name AS title, NULL AS checkpoint_number, NULL AS session_id, NULL AS seq",
+        'JOIN Bots b ON b.id = f.rowid',
+        'f.rowid IN ({ids})',
+    ),
+    'stacks': Kind(
+        'SearchStacks', (10.0, 4.0),
+        "f.rowid AS id, s.orchestrator_bot_id AS bot_id, s.name AS title, NULL AS checkpoint_number, NULL AS session_id, NULL AS seq",
+        'JOIN Stacks s ON s.id = f.rowid',
+        '''(s.orchestrator_bot_id IN ({ids})
+            OR EXISTS (SELECT 1 FROM StackSlots ss WHERE ss.stack_id = s.id AND ss.bot_id IN ({ids})))''',
+    ),
+    'checkpoints': Kind(
+        'SearchCheckpoints', (10.0, 4.0, 2.0, 1.0, 1.0, 1.0),
+        "f.rowid AS id, c.bot_id AS bot_id, c.name AS title, c.checkpoint_number, NULL AS session_id, NULL AS seq",
+        'JOIN Checkpoints c ON c.id = f.rowid',
+        'c.bot_id IN ({ids})',
+    ),
+    'messages': Kind(
+        'SearchMessages', (1.0,),
+        "f.rowid AS id, s.bot_id AS bot_id, NULL AS title, NULL AS checkpoint_number, m.session_id, m.seq",
+        'JOIN SessionMessages m ON m.id = f.rowid JOIN Sessions s ON s.id = m.session_id',
+        's.bot_id IN ({ids})',
+    ),
+}
+
+
+def _strings(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict) and 'content' in value:
+        # Chat messages: the role and other metadata are not worth matching
+        yield from _strings(value['content'])
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _strings(item)
+
+
+def json_text(value):
+    """Searchable text of a stored value: the string values of JSON documents, other text as is"""
+    if value is None:
+        return None
+    parsed = content_store.parse_json(value)
+    if isinstance(parsed, str):
+        return parsed
+    if not isinstance(parsed, (dict, list)):
+        return value
+    return '\n'.join(_strings(parsed))
+
+
+def message_text(message):
+    """Searchable text of a session message (the decoded JSON value)"""
+    return '\n'.join(_strings(message))
+
+
+def index_checkpoint(db, checkpoint_id, values):
+    """Index a new checkpoint from its column values (payloads as plain text); runs in the caller's transaction"""
+    db.execute(
+        f'''
+        INSERT OR REPLACE INTO SearchCheckpoints (rowid, {', '.join(CHECKPOINT_COLUMNS)})
+        VALUES (?, {', '.join('?' * len(CHECKPOINT_COLUMNS))})
+        ''',
+        (checkpoint_id, *(
+            values.get(column) if column in ('name', 'description') else json_text(values.get(column))
+            for column in CHECKPOINT_COLUMNS
+        ))
+    )
+
+
+def update_checkpoint(db, checkpoint_id, values):
+    """Re-index edited plain-text columns (name, description) of a checkpoint"""
+    db.execute(
+        f"UPDATE SearchCheckpoints SET {', '.join(f'{column} = ?' for column in values)} WHERE rowid = ?",
+        (*values.values(), checkpoint_id)
+    )
+
+
+def index_messages(db, rows):
+    """Index (session_id, seq, text) of messages inserted in the caller's transaction"""
+    db.executemany(
+        '''
+        INSERT OR REPLACE INTO SearchMessages (rowid, content)
+        SELECT id, ? FROM SessionMessages WHERE session_id = ? AND seq = ?
+        ''',
+        [(text, session_id, seq) for session_id, seq, text in rows]
+    )
+
+
+def plain_query(text):
+    """FTS5 query matching every word of `text`, the last one as a prefix (search as you type)"""
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search(db, query, kinds, bot_ids=None, limit=20, offset=0):
+    """Ranked hits for an FTS5 query across `kinds`, best first.
+
+    Each kind contributes its own top offset + limit hits, which is all the
+    merged page can need. Raises sqlite3.OperationalError for an invalid query.
+    """
+    selects = []
+    params = []
+    for name in kinds:
+        kind = KINDS[name]
+        where = f'f.{kind.table} MATCH ? AND f.rank MATCH ?'
+        kind_params = [query, f"bm25({', '.join(f'{w:g}' for w in kind.weights)})"]
+        if bot_ids:
+            placeholders = ', '.join('?' * len(bot_ids))
+            where += f' AND {kind.bot_filter.format(ids=placeholders)}'
+            kind_params += list(bot_ids) * kind.bot_filter.count('{ids}')
+        selects.append(
+            f'''
+            SELECT * FROM (
+                SELECT '{name}' AS kind, {kind.select},
+                       snippet(f.{kind.table}, -1, ?, ?, '…', ?) AS snippet, f.rank AS score
+                FROM {kind.table} f {kind.joins}
+                WHERE {where}
+                ORDER BY f.rank LIMIT ?
+            )
+            '''
+        )
+        params += [MATCH_START, MATCH_END, SNIPPET_TOKENS, *kind_params, offset + limit]
+    rows = db.execute(
+        f"{' UNION ALL '.join(selects)} ORDER BY score, kind, id LIMIT ? OFFSET ?",
+        params + [limit, offset]
+    ).fetchall()
+    hits = []
+    for row in rows:
+        hit = {key: row[key] for key in ('kind', 'id', 'bot_id', 'title', 'score') if row[key] is not None}
+        if row['checkpoint_number'] is not None:
+            hit['checkpoint_number'] = row['checkpoint_number']
+        if row['session_id'] is not None:
+            hit['session_id'] = row['session_id']
+            hit['seq'] = row['seq']
+        hit['snippet'] = (
+            html.escape(row['snippet'] or '').replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')
+        )
+        hits.append(hit)
+    return hits
@@ -0,0 +1,152 @@
+"""Row serializers for list responses, compiled once per schema and projection.
+
+Dumping a page through a marshmallow schema builds a schema per request and
+runs every field's serialize machinery for every row. A list page only ever
+holds plain column values, so `row_serializer` works out once, per schema
+and ?fields= projection, which columns pass through unchanged (Int, Str,
+Float, Raw) and which need converting (Bool from SQLite's 0/1, DateTime to
+ISO 8601), and then maps each `sqlite3.Row` or dict straight to the output
+dict. `stream_array` encodes the result in batches so that the response
+never holds the whole array as one string.
+
+A field may also hold `RawJSON`: JSON text that was validated when it was
+stored, which is written into the response as is instead of being parsed and
+encoded again.
+"""
+import datetime
+import functools
+import json
+from operator import itemgetter
+
+from flask import current_app
+from marshmallow import fields as ma_fields
+
+# Items encoded per chunk of a streamed array
+STREAM_BATCH = 500
+
+
+class RawJSON:
+    """UTF-8 bytes of a valid JSON value, written into an encoded item unchanged"""
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+
+def encode_item(encoder, item):
+    """UTF-8 JSON of a dict whose top-level values may be RawJSON"""
+    raw = [(name, value.data) for name, value in item.items() if isinstance(value, RawJSON)]
+    if not raw:
+        return encoder.encode(item).encode('utf8')
+    # Raw fields follow the encoded ones
+    rest = encoder.encode({name: value for name, value in item.items() if not isinstance(value, RawJSON)})
+    body = rest.encode('utf8')[1:-1]
+    fields = [encoder.encode(name).encode('utf8') + b':' + data for name, data in raw]
+    return b'{' + b','.join(([body] if body else []) + fields) + b'}'
+
+
+def _bool(value):
+    return value if value is None else bool(value)
+
+
+def _datetime(value):
+    return value.isoformat() if isinstance(value, (datetime.date, datetime.time)) else value
+
+
+def _fallback(name, field):
+    return lambda value: None if value is None else field._serialize(value, name, None)
+
+
+def _converter(name, field):
+    """None when the column value is already what the field dumps, else a function converting it"""
+    if isinstance(field, (ma_fields.Int, ma_fields.Str, ma_fields.Float, ma_fields.Raw)):
+        return None
+    if isinstance(field, ma_fields.Bool):
+        return _bool
+    if isinstance(field, ma_fields.DateTime) and field.format in (None, 'iso'):
+        return _datetime
+    return _fallback(name, field)
+
+
+class RowSerializer:
+    """Maps rows carrying the columns `names` to dicts as `schema_cls(only=names)` would dump them"""
+
+    def __init__(self, schema_cls, names):
+        declared = schema_cls._declared_fields
+        self.names = tuple(names)
+        self.converters = [
+            (name, converter) for name in self.names
+            if (converter := _converter(name, declared[name])) is not None
+        ]
+
+    def _getter(self, row):
+        # sqlite3.Row is fastest indexed by position, which is the same for the whole result set
+        keys = row.keys() if hasattr(row, 'keys') and not isinstance(row, dict) else None
+        getter = itemgetter(*(keys.index(name) for name in self.names) if keys else self.names)
+        if len(self.names) == 1:
+            return lambda row: (getter(row),)
+        return getter
+
+    def iter(self, rows):
+        """Yield the output dict of each row"""
+        getter = None
+        names, converters = self.names, self.converters
+        for row in rows:
+            if getter is None:
+                getter = self._getter(row)
+            item = dict(zip(names, getter(row)))
+            for name, converter in converters:
+                item[name] = converter(item[name])
+            yield item
+
+
+@functools.lru_cache(maxsize=256)
+def _compiled(schema_cls, names):
+    return RowSerializer(schema_cls, names)
+
+
+def row_serializer(schema_cls, names):
+    """The compiled serializer of `schema_cls` projected to `names` (every row must carry those columns)"""
+    return _compiled(schema_cls, tuple(names))
+
+
+def stream_array(items, encoder, batch=STREAM_BATCH, raw=False):
+    """Yield a JSON array of `items` as UTF-8 chunks of up to `batch` items each; a short array is one chunk.
+
+    With raw, items may hold RawJSON values and are encoded one by one.
+    """
+    def encode(pending):
+        if raw:
+            return b','.join(encode_item(encoder, item) for item in pending)
+        # Encoding a list at once is much faster than item by item; drop its brackets
+        return encoder.encode(pending)[1:-1].encode('utf8')
+
+    pending = []
+    separator = b'['
+    for item in items:
+        pending.append(item)
+        if len(pending) == batch:
+            yield separator + encode(pending)
+            pending.clear()
+            separator = b','
+    if pending:
+        yield separator + encode(pending) + b']'
+    else:
+        yield b'[]' if separator == b'[' else b']'
+
+
+def json_encoder(provider):
+    """A compact encoder following the app's JSON provider settings"""
+    return json.JSONEncoder(
+        ensure_ascii=provider.ensure_ascii,
+        sort_keys=provider.sort_keys,
+        separators=(',', ':'),
+        default=provider.default,
+    )
+
+
+def json_response(item):
+    """Response with the JSON of `item`, a dict whose top-level values may be RawJSON, or a RawJSON itself"""
+    provider = current_app.json
+    body = item.data if isinstance(item, RawJSON) else encode_item(json_encoder(provider), item)
+    return current_app.response_class(body, mimetype=provider.mimetype)
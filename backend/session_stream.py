@@ -0,0 +1,338 @@
+"""Fan-out of newly committed session messages to live watchers.
+
+One broker per process and database polls SessionMessages for rows past the
+highest id it has seen (an index range on the primary key) and hands them to
+the subscriptions watching those sessions, so the database work per poll is
+the same for one watcher or hundreds. Polling rather than in-process signals
+keeps it correct when several worker processes write to the same database;
+writers in this process call wake() after committing to skip the poll delay.
+
+SQLite allows a single writer, so message ids are assigned in commit order
+and a row past the watermark is never committed behind it.
+"""
+import asyncio
+import functools
+import json
+import os
+import threading
+from collections import deque
+
+import storage_codec
+
+CATCH_UP_PAGE = 500
+RETRY = b'retry: 3000\n\n'
+# Comment line: keeps proxies from timing out an idle stream
+KEEPALIVE = b': keepalive\n\n'
+
+
+class Subscription:
+    """Events for one session, buffered between the poller and a watcher"""
+
+    def __init__(self, session_id, max_buffer, listener=None):
+        self.session_id = session_id
+        self.max_buffer = max_buffer
+        self.listener = listener
+        self._events = deque()
+        self._ended = False
+        self._lagged = False
+        self._cond = threading.Condition()
+
+    def push(self, messages=(), ended=False):
+        with self._cond:
+            if len(self._events) + len(messages) > self.max_buffer:
+                # The watcher fell behind; it re-reads from the database instead
+                self._events.clear()
+                self._lagged = True
+            else:
+                self._events.extend(messages)
+            self._ended = self._ended or ended
+            self._cond.notify_all()
+        if self.listener is not None:
+            self.listener()
+
+    def _drain(self):
+        """Return (messages, ended, lagged) and clear the buffer"""
+        events, self._events = list(self._events), deque()
+        lagged, self._lagged = self._lagged, False
+        return events, self._ended, lagged
+
+    def wait(self, timeout):
+        """Block until there is something to drain or the timeout passes"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._events or self._ended or self._lagged, timeout)
+            return self._drain()
+
+
+class SessionBroker:
+    def __init__(self, pool, poll_interval, max_buffer):
+        self.pool = pool
+        self.poll_interval = poll_interval
+        self.max_buffer = max_buffer
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._watermark = None
+        self._thread = None
+
+    def subscribe(self, session_id, listener=None):
+        """Start buffering a session's new messages; listener is called after each push"""
+        subscription = Subscription(session_id, self.max_buffer, listener)
+        with self._lock:
+            if self._watermark is None:
+                # Set before the caller catches up from the database, so no commit
+                # can fall between its catch-up read and the first poll
+                self._watermark = self._read_watermark()
+            self._subscriptions.setdefault(session_id, set()).add(subscription)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='session-stream', daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            watchers = self._subscriptions.get(subscription.session_id)
+            if watchers is not None:
+                watchers.discard(subscription)
+                if not watchers:
+                    del self._subscriptions[subscription.session_id]
+
+    def wake(self):
+        """Poll now instead of at the next interval; called after a local commit"""
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            with self._lock:
+                idle = not self._subscriptions
+                if idle:
+                    self._watermark = None
+            if idle:
+                # Nothing to watch: stay idle until someone subscribes
+                self._wake.wait()
+                continue
+            try:
+                self.poll()
+            except Exception:
+                # A locked or briefly unavailable database must not kill the poller
+                pass
+
+    def _read_watermark(self):
+        conn = self.pool.acquire()
+        try:
+            return conn.execute('SELECT COALESCE(MAX(id), 0) FROM SessionMessages').fetchone()[0]
+        finally:
+            self.pool.release(conn)
+
+    def poll(self):
+        conn = self.pool.acquire()
+        try:
+            rows = conn.execute(
+                'SELECT id, session_id, seq FROM SessionMessages WHERE id > ? ORDER BY id',
+                (self._watermark,)
+            ).fetchall()
+            # Match rows against subscribers only after reading them, so a watcher that
+            # subscribed while the query ran still receives its rows
+            with self._lock:
+                watched = {sid: set(subs) for sid, subs in self._subscriptions.items()}
+            wanted = [row['id'] for row in rows if row['session_id'] in watched]
+            messages = {}
+            for i in range(0, len(wanted), 500):
+                batch = wanted[i:i + 500]
+                for row in conn.execute(
+                    f"SELECT id, message FROM SessionMessages WHERE id IN ({', '.join('?' * len(batch))})",
+                    batch
+                ):
+                    messages[row['id']] = storage_codec.decode_text(row['message'])
+            ended = set()
+            if watched:
+                session_ids = list(watched)
+                ended = {
+                    row['id'] for row in conn.execute(
+                        f'''
+                        SELECT id FROM Sessions
+                        WHERE id IN ({', '.join('?' * len(session_ids))}) AND ended_at IS NOT NULL
+                        ''',
+                        session_ids
+                    )
+                }
+        finally:
+            self.pool.release(conn)
+
+        if rows:
+            self._watermark = rows[-1]['id']
+        grouped = {}
+        for row in rows:
+            if row['id'] in messages:
+                grouped.setdefault(row['session_id'], []).append((row['seq'], messages[row['id']]))
+        for session_id, subscriptions in watched.items():
+            batch = grouped.get(session_id, [])
+            if batch or session_id in ended:
+                for subscription in subscriptions:
+                    subscription.push(batch, ended=session_id in ended)
+
+
+_brokers = {}
+_brokers_lock = threading.Lock()
+
+
+def get_broker(config, pool):
+    """Return this process's broker for the configured database"""
+    key = (os.getpid(), str(config['DATABASE']))
+    broker = _brokers.get(key)
+    if broker is None:
+        with _brokers_lock:
+            broker = _brokers.get(key)
+            if broker is None:
+                broker = SessionBroker(
+                    pool, config['SESSION_STREAM_POLL_INTERVAL'], config['SESSION_STREAM_BUFFER']
+                )
+                _brokers[key] = broker
+    return broker
+
+
+def notify(config):
+    """Wake this process's broker, if it has one, after committing messages"""
+    broker = _brokers.get((os.getpid(), str(config['DATABASE'])))
+    if broker is not None:
+        broker.wake()
+
+
+def fetch_messages(pool, session_id, after, limit=CATCH_UP_PAGE):
+    """One page of committed (seq, message JSON) pairs of a session with seq > after"""
+    conn = pool.acquire()
+    try:
+        rows = conn.execute(
+            '''
+            SELECT seq, message FROM SessionMessages
+            WHERE session_id = ? AND seq > ?
+            ORDER BY seq LIMIT ?
+            ''',
+            (session_id, after, limit)
+        ).fetchall()
+    finally:
+        # Do not hold a connection while the page is being sent
+        pool.release(conn)
+    return [(row['seq'], storage_codec.decode_text(row['message'])) for row in rows]
+
+
+def format_event(data, event=None, event_id=None):
+    """Encode one Server-Sent Event"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event is not None:
+        lines.append(f'event: {event}')
+    lines.extend(f'data: {line}' for line in data.split('\n'))
+    return ('\n'.join(lines) + '\n\n').encode('utf8')
+
+
+def resume_offset(session_id, last_event_id, after):
+    """Sequence number to resume after: Last-Event-ID ("<session>:<seq>") wins over ?after="""
+    session, _, seq = (last_event_id or '').partition(':')
+    if session == str(session_id) and seq.isdigit():
+        return int(seq)
+    return max(0, after or 0)
+
+
+class EventStream:
+    """SSE response body that replays a session after an offset and then follows it.
+
+    Plain iteration blocks a thread between events, as WSGI requires. asgi.py
+    iterates it asynchronously instead, so an idle watcher holds no thread.
+    """
+
+    def __init__(self, broker, pool, session_id, after, heartbeat):
+        self.broker = broker
+        self.pool = pool
+        self.session_id = session_id
+        self.last_seq = after
+        self.heartbeat = heartbeat
+        self._subscription = None
+
+    def _messages(self, messages):
+        for seq, message in messages:
+            # The catch-up read may already have sent it
+            if seq > self.last_seq:
+                self.last_seq = seq
+                yield format_event(message, event_id=f'{self.session_id}:{seq}')
+
+    def _end(self):
+        return format_event(json.dumps({'session_id': self.session_id}), event='end')
+
+    def __iter__(self):
+        # Subscribe before catching up so nothing committed in between is missed
+        self._subscription = self.broker.subscribe(self.session_id)
+        try:
+            yield RETRY
+            catch_up = True
+            while True:
+                while catch_up:
+                    page = fetch_messages(self.pool, self.session_id, self.last_seq)
+                    yield from self._messages(page)
+                    catch_up = len(page) == CATCH_UP_PAGE
+                messages, ended, lagged = self._subscription.wait(self.heartbeat)
+                yield from self._messages(messages)
+                if lagged:
+                    catch_up = True
+                elif ended:
+                    yield self._end()
+                    return
+                elif not messages:
+                    yield KEEPALIVE
+        finally:
+            self.close()
+
+    def __aiter__(self):
+        return self._aiter()
+
+    async def _aiter(self):
+        loop = asyncio.get_running_loop()
+        woken = asyncio.Event()
+        # The first subscriber reads the watermark, which may wait for a pooled connection
+        subscribed = loop.run_in_executor(None, functools.partial(
+            self.broker.subscribe, self.session_id, listener=lambda: loop.call_soon_threadsafe(woken.set)
+        ))
+        try:
+            self._subscription = await asyncio.shield(subscribed)
+        except asyncio.CancelledError:
+            # The client left while waiting; drop the subscription once it exists
+            subscribed.add_done_callback(
+                lambda done: done.exception() is None and self.broker.unsubscribe(done.result())
+            )
+            raise
+        try:
+            yield RETRY
+            catch_up = True
+            while True:
+                while catch_up:
+                    page = await loop.run_in_executor(
+                        None, fetch_messages, self.pool, self.session_id, self.last_seq
+                    )
+                    for chunk in self._messages(page):
+                        yield chunk
+                    catch_up = len(page) == CATCH_UP_PAGE
+                try:
+                    await asyncio.wait_for(woken.wait(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    pass
+                woken.clear()
+                messages, ended, lagged = self._subscription.wait(0)
+                for chunk in self._messages(messages):
+                    yield chunk
+                if lagged:
+                    catch_up = True
+                elif ended:
+                    yield self._end()
+                    return
+                elif not messages:
+                    yield KEEPALIVE
+        finally:
+            self.close()
+
+    def close(self):
+        if self._subscription is not None:
+            self.broker.unsubscribe(self._subscription)
+            self._subscription = None
@@ -0,0 +1,77 @@
+"""Transparent compression for large stored payloads.
+
+Compressed values are written as BLOBs framed with a 5-byte header,
+b'\\x00MIC' followed by a codec id, so readers can tell them apart from plain
+TEXT values and from raw chunk bytes written before compression existed. A
+NUL byte never starts valid UTF-8 JSON or prompt text, so plain values are
+never mistaken for frames.
+
+Values shorter than STORAGE_COMPRESS_MIN_SIZE, or that do not shrink, are
+stored unchanged. Decoding happens only where a value is actually returned.
+"""
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MAGIC = b'\x00MIC'
+
+
+class Codec:
+    def __init__(self, codec_id, name, compress, decompress):
+        self.id = codec_id
+        self.name = name
+        self.compress = compress
+        self.decompress = decompress
+
+
+def _zstd_compress(data, level=3):
+    if zstandard is None:
+        raise RuntimeError("STORAGE_CODEC is 'zstd' but the zstandard package is not installed")
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def _zstd_decompress(data):
+    if zstandard is None:
+        raise RuntimeError("Found zstd-compressed data but the zstandard package is not installed")
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+CODECS = {
+    'zlib': Codec(1, 'zlib', lambda data: zlib.compress(data, 6), zlib.decompress),
+    'zstd': Codec(2, 'zstd', _zstd_compress, _zstd_decompress),
+}
+CODECS_BY_ID = {codec.id: codec for codec in CODECS.values()}
+
+
+def compress(data, codec_name, min_size):
+    """Frame and compress `data` (bytes) with the named codec, or return it unchanged"""
+    if codec_name == 'none' or len(data) < min_size:
+        return data
+    codec = CODECS[codec_name]
+    packed = MAGIC + bytes([codec.id]) + codec.compress(data)
+    return packed if len(packed) < len(data) else data
+
+
+def decompress(value):
+    """Inverse of compress(): unframe compressed bytes, pass anything else through"""
+    if not isinstance(value, bytes) or not value.startswith(MAGIC):
+        return value
+    return CODECS_BY_ID[value[len(MAGIC)]].decompress(value[len(MAGIC) + 1:])
+
+
+def encode_text(text, codec_name, min_size):
+    """Compress a TEXT value; returns the original str when compression is skipped"""
+    if text is None:
+        return None
+    packed = compress(text.encode('utf8'), codec_name, min_size)
+    return packed if packed.startswith(MAGIC) else text
+
+
+def decode_text(value):
+    """Inverse of encode_text()"""
+    if isinstance(value, bytes):
+        return decompress(value).decode('utf8')
+    return value
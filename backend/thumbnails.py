@@ -0,0 +1,263 @@
+"""Resized image derivatives with a size-bounded LRU cache on disk.
+
+A derivative is identified by the SHA-256 of the source BLOB plus the resize
+parameters, so identical images stored under different names share their
+derivatives and a cached file can never go stale. The hash is computed once,
+streamed through sqlite3.Blob, and kept in images.content_hash.
+
+Rendering runs on a per-process thread pool (Pillow releases the GIL while
+decoding, resizing and encoding), and concurrent requests for the same
+derivative share one render. Requests never wait for a render: they answer
+202 and the client asks again, so a failed render is remembered for
+FAILED_RENDER_TTL seconds and reported to the next poll instead of being
+retried by every one. Least recently used files are evicted once the
+cache grows past IMAGE_CACHE_MAX_BYTES; a hit refreshes the file's mtime.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'png': ('PNG', 'image/png'),
+    'webp': ('WEBP', 'image/webp'),
+}
+DEFAULT_FORMAT = 'webp'
+HASH_READ_SIZE = 1024 * 1024
+FAILED_RENDER_TTL = 60
+FAILED_RENDERS_MAX = 1024
+
+
+class ResizeParams:
+    """Validated ?w=, ?h= and ?format= values; w or h of 0 means unconstrained"""
+
+    def __init__(self, width=0, height=0, fmt=None):
+        self.width = width
+        self.height = height
+        self.format = fmt or DEFAULT_FORMAT
+
+    @property
+    def mimetype(self):
+        return FORMATS[self.format][1]
+
+    def key(self):
+        return f'w{self.width}-h{self.height}-{self.format}'
+
+
+class DerivativeCache:
+    """Files named <key>.<format> in one directory, evicted least recently used first"""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None
+
+    def path(self, key, fmt):
+        return self.directory / f'{key}.{fmt}'
+
+    def open(self, key, fmt):
+        """Return an open file for a cached derivative, or None on a miss"""
+        path = self.path(key, fmt)
+        try:
+            handle = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted after we opened it; the open handle still reads fine
+            pass
+        return handle
+
+    def put(self, key, fmt, data):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        # Readers never see a partially written file
+        os.replace(tmp, self.path(key, fmt))
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        with os.scandir(self.directory) as it:
+            return [e for e in it if e.is_file() and not e.name.endswith('.tmp')]
+
+    def _scan_size(self):
+        total = 0
+        for entry in self._entries():
+            try:
+                total += entry.stat().st_size
+            except FileNotFoundError:
+                pass
+        return total
+
+    def _evict(self):
+        # Other processes share the directory, so work from what is on disk
+        entries = []
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        # Evict down to 90% so the next few puts do not rescan
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._size = total
+
+
+def cache_key(content_hash, params):
+    return hashlib.sha256(f'{content_hash}:{params.key()}'.encode('utf8')).hexdigest()
+
+
+def hash_blob(db, image_id):
+    """SHA-256 of an image BLOB, read incrementally"""
+    digest = hashlib.sha256()
+    with db.blobopen('images', 'image_blob', image_id, readonly=True) as blob:
+        while True:
+            data = blob.read(HASH_READ_SIZE)
+            if not data:
+                break
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def resize(source, params):
+    """Decode `source` (a file-like object), fit it inside w x h without upscaling and encode it"""
+    with Image.open(source) as image:
+        if params.width or params.height:
+            box = (params.width or image.width, params.height or image.height)
+            # Lets the JPEG decoder downscale by a power of two while decoding
+            image.draft('RGB', box)
+        image = ImageOps.exif_transpose(image)
+        if params.width or params.height:
+            image.thumbnail(box, Image.Resampling.LANCZOS)
+        pil_format = FORMATS[params.format][0]
+        if pil_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+            image = image.convert('RGBA')
+        out = BytesIO()
+        image.save(out, pil_format, quality=85)
+        return out.getvalue()
+
+
+class Renderer:
+    """Per-process worker pool that renders derivatives into a DerivativeCache"""
+
+    def __init__(self, read_pool, write_pool, cache, workers):
+        self.read_pool = read_pool
+        self.write_pool = write_pool
+        self.cache = cache
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='thumbnails')
+        self._inflight = {}
+        # token -> failed future, oldest first
+        self._failed = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, image_id, content_hash, params):
+        """Future resolving to the derivative's cache key; one render per image and params.
+
+        The future's `submitted` is the time.monotonic() at which the render was queued.
+        """
+        token = (image_id, params.key())
+        with self._lock:
+            future = self._inflight.get(token)
+            if future is not None:
+                return future
+            failed = self._failed.get(token)
+            if failed is not None and time.monotonic() - failed.submitted < FAILED_RENDER_TTL:
+                return failed
+            self._failed.pop(token, None)
+            future = self._executor.submit(self._render, image_id, content_hash, params)
+            future.submitted = time.monotonic()
+            self._inflight[token] = future
+        # Outside the lock: the callback runs right away if the render already finished
+        future.add_done_callback(lambda done: self._finished(token, done))
+        return future
+
+    def _finished(self, token, future):
+        with self._lock:
+            self._inflight.pop(token, None)
+            if future.exception() is not None:
+                self._failed[token] = future
+                if len(self._failed) > FAILED_RENDERS_MAX:
+                    self._failed.popitem(last=False)
+
+    def _render(self, image_id, content_hash, params):
+        conn = self.read_pool.acquire()
+        try:
+            if content_hash is None:
+                content_hash = hash_blob(conn, image_id)
+                self._store_hash(image_id, content_hash)
+            key = cache_key(content_hash, params)
+            cached = self.cache.open(key, params.format)
+            if cached is not None:
+                cached.close()
+                return key
+            with conn.blobopen('images', 'image_blob', image_id, readonly=True) as blob:
+                data = resize(blob, params)
+        finally:
+            self.read_pool.release(conn)
+        self.cache.put(key, params.format, data)
+        return key
+
+    def _store_hash(self, image_id, content_hash):
+        conn = self.write_pool.acquire()
+        try:
+            conn.execute(
+                'UPDATE images SET content_hash = ? WHERE id = ? AND content_hash IS NULL',
+                (content_hash, image_id)
+            )
+            conn.commit()
+        finally:
+            self.write_pool.release(conn)
+
+
+_renderers = {}
+_renderers_lock = threading.Lock()
+
+
+def get_renderer(config, read_pool, write_pool):
+    """Return this process's renderer for the configured database and cache directory"""
+    directory = config['IMAGE_CACHE_DIR'] or Path(config['DATABASE']).parent / 'image_cache'
+    key = (os.getpid(), str(config['DATABASE']), str(directory))
+    renderer = _renderers.get(key)
+    if renderer is None:
+        with _renderers_lock:
+            renderer = _renderers.get(key)
+            if renderer is None:
+                renderer = Renderer(
+                    read_pool, write_pool,
+                    DerivativeCache(directory, config['IMAGE_CACHE_MAX_BYTES']),
+                    config['IMAGE_WORKERS']
+                )
+                _renderers[key] = renderer
+    return renderer
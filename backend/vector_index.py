@@ -0,0 +1,421 @@
+"""Vector index over checkpoint memories for /api/v1/memories/search.
+
+Each entry of a checkpoint's memories list can have one embedding, stored
+L2-normalized as float32 bytes in MemoryVectors (migration 0011). Vectors are
+sent by the client with the checkpoint, or computed by the MEMORY_EMBEDDER
+function when one is configured, so any embedding model can be plugged in.
+
+Each process keeps the vectors of its database in one float32 matrix and
+ranks by cosine similarity (a dot product of unit vectors):
+
+- up to MEMORY_INDEX_EXACT_MAX vectors, and whenever results are filtered by
+  bot, by brute force over every candidate;
+- above it, by an IVF index: k-means centroids partition the vectors into
+  lists stored contiguously, and a query scores only the MEMORY_INDEX_NPROBE
+  lists whose centroids are closest to it. Results are approximate.
+
+The index follows the table incrementally: every search first loads the rows
+with ids above the last one it has into an unclustered tail, which is always
+scanned exactly. The lists are rebuilt in a background thread once the tail
+grows, with fresh centroids whenever the index has doubled in size. A delete,
+including the cascade from a deleted checkpoint, bumps the MemoryVectors
+counter in TableVersions and the next search reloads everything.
+
+With QDRANT_URL set, vectors are also mirrored to the QDRANT_COLLECTION_NAME
+collection after they are committed; searches never depend on it.
+"""
+import importlib
+import logging
+import os
+import threading
+import uuid
+from dataclasses import dataclass
+
+import numpy as np
+
+import content_store
+import search_index
+
+try:
+    from qdrant_client import QdrantClient, models as qdrant_models
+except ImportError:
+    QdrantClient = None
+
+logger = logging.getLogger(__name__)
+
+DTYPE = np.dtype('<f4')
+LOAD_BATCH = 10000
+# k-means trains on up to this many sampled vectors per list
+KMEANS_SAMPLE_PER_LIST = 32
+KMEANS_ITERATIONS = 10
+MAX_LISTS = 4096
+# Rows scored per matrix product while assigning vectors to lists
+ASSIGN_BATCH = 16384
+# Qdrant point ids are derived from (checkpoint id, memory index)
+QDRANT_POINT_NAMESPACE = uuid.UUID('6f1c1a52-8a43-4d0e-9a7e-2b8f1c0d5e37')
+
+
+def normalize(vectors, dim):
+    """Vectors as an L2-normalized float32 matrix; ValueError unless each has `dim` finite components, not all zero"""
+    if len(vectors) == 0:
+        return np.empty((0, dim), DTYPE)
+    try:
+        matrix = np.asarray(vectors, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError(f'Vectors must be lists of {dim} numbers')
+    if matrix.ndim != 2 or matrix.shape[1] != dim:
+        raise ValueError(f'Vectors must be lists of {dim} numbers')
+    if not np.isfinite(matrix).all():
+        raise ValueError('Vectors must be finite')
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    if (norms == 0).any():
+        raise ValueError('Vectors must not be all zeros')
+    return (matrix / norms).astype(DTYPE)
+
+
+def memory_list(value):
+    """Entries of a stored memories payload; [] when it is empty or not a list"""
+    if value is None:
+        return []
+    parsed = content_store.parse_json(value)
+    return parsed if isinstance(parsed, list) else []
+
+
+_embedders = {}
+
+
+def embed(config, texts):
+    """Vectors for `texts` from MEMORY_EMBEDDER, or None when no embedder is configured"""
+    spec = config['MEMORY_EMBEDDER']
+    if not spec:
+        return None
+    if callable(spec):
+        function = spec
+    else:
+        function = _embedders.get(spec)
+        if function is None:
+            module, _, name = spec.partition(':')
+            function = _embedders.setdefault(spec, getattr(importlib.import_module(module), name))
+    return function(list(texts)) if texts else []
+
+
+def embed_memories(config, memories):
+    """Vectors for memory entries from MEMORY_EMBEDDER (None without one), embedding their text values"""
+    return embed(config, [search_index.message_text(memory) for memory in memories])
+
+
+def put_vectors(db, checkpoint_id, bot_id, vectors):
+    """Store a checkpoint's normalized memory vectors, replacing any it had; runs in the caller's transaction"""
+    db.execute('DELETE FROM MemoryVectors WHERE checkpoint_id = ?', (checkpoint_id,))
+    db.executemany(
+        'INSERT INTO MemoryVectors (checkpoint_id, bot_id, memory_index, vector) VALUES (?, ?, ?, ?)',
+        [(checkpoint_id, bot_id, i, vector.tobytes()) for i, vector in enumerate(vectors)]
+    )
+
+
+def _top(scores, k):
+    """Positions of the k highest scores, best first"""
+    if k < len(scores):
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+def _assign(vectors, centroids):
+    """Index of the nearest centroid of each vector"""
+    labels = np.empty(len(vectors), np.int64)
+    for start in range(0, len(vectors), ASSIGN_BATCH):
+        labels[start:start + ASSIGN_BATCH] = np.argmax(vectors[start:start + ASSIGN_BATCH] @ centroids.T, axis=1)
+    return labels
+
+
+def _kmeans(vectors, lists, seed=0):
+    """Spherical k-means centroids, trained on a sample of the unit vectors"""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), lists * KMEANS_SAMPLE_PER_LIST)
+    sample = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+    centroids = sample[rng.choice(sample_size, lists, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        labels = _assign(sample, centroids)
+        counts = np.bincount(labels, minlength=lists)
+        filled = np.flatnonzero(counts)
+        starts = (np.cumsum(counts) - counts)[filled]
+        centroids[filled] = np.add.reduceat(sample[np.argsort(labels, kind='stable')], starts, axis=0)
+        empty = np.flatnonzero(counts == 0)
+        # Restart empty lists from random points
+        centroids[empty] = sample[rng.choice(sample_size, len(empty), replace=False)]
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    return centroids
+
+
+@dataclass(frozen=True)
+class Ivf:
+    centroids: np.ndarray
+    # Rows offsets[i]:offsets[i + 1] of the matrix hold list i; rows from offsets[-1] on are the tail
+    offsets: np.ndarray
+    # Number of vectors the centroids were trained for
+    trained: int
+
+
+class VectorIndex:
+    """The memory vectors of one database, in memory and kept in step with MemoryVectors"""
+
+    def __init__(self, dim, exact_max, nprobe):
+        self.dim = dim
+        self.exact_max = exact_max
+        self.nprobe = nprobe
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._builder = None
+        self._reset(None)
+
+    def __len__(self):
+        return self._size
+
+    def _reset(self, version):
+        self._version = version
+        # Lets a background build notice that the rows it read were replaced
+        self._generation += 1
+        self._last_id = 0
+        self._size = 0
+        # Buffers with spare capacity; rows [0, _size) are in use
+        self._vectors = np.empty((0, self.dim), DTYPE)
+        self._ids = np.empty(0, np.int64)
+        self._bots = np.empty(0, np.int64)
+        self._ivf = None
+
+    def sync(self, db):
+        """Load rows added since the last sync, or everything after a delete"""
+        row = db.execute("SELECT version FROM TableVersions WHERE name = 'MemoryVectors'").fetchone()
+        version = row[0] if row else 0
+        with self._lock:
+            if version != self._version:
+                self._reset(version)
+            cursor = db.cursor()
+            cursor.row_factory = None
+            while True:
+                rows = cursor.execute(
+                    'SELECT id, bot_id, vector FROM MemoryVectors WHERE id > ? ORDER BY id LIMIT ?',
+                    (self._last_id, LOAD_BATCH)
+                ).fetchall()
+                if rows:
+                    self._append(rows)
+                if len(rows) < LOAD_BATCH:
+                    break
+            self._maybe_build()
+
+    def _append(self, rows):
+        self._last_id = rows[-1][0]
+        # Vectors stored while VECTOR_SIZE was different cannot be compared
+        rows = [row for row in rows if len(row[2]) == self.dim * DTYPE.itemsize]
+        end = self._size + len(rows)
+        if end > len(self._ids):
+            self._resize(max(end, 2 * len(self._ids), 1024))
+        self._ids[self._size:end] = [row[0] for row in rows]
+        self._bots[self._size:end] = [row[1] for row in rows]
+        self._vectors[self._size:end] = np.frombuffer(
+            b''.join(row[2] for row in rows), DTYPE
+        ).reshape(len(rows), self.dim)
+        self._size = end
+
+    def _resize(self, capacity):
+        # Always new buffers: searches may still be reading the old ones
+        vectors = np.empty((capacity, self.dim), DTYPE)
+        ids = np.empty(capacity, np.int64)
+        bots = np.empty(capacity, np.int64)
+        vectors[:self._size] = self._vectors[:self._size]
+        ids[:self._size] = self._ids[:self._size]
+        bots[:self._size] = self._bots[:self._size]
+        self._vectors, self._ids, self._bots = vectors, ids, bots
+
+    def _maybe_build(self):
+        if self._size <= self.exact_max or (self._builder is not None and self._builder.is_alive()):
+            return
+        ivf = self._ivf
+        if ivf is not None:
+            clustered = int(ivf.offsets[-1])
+            retrain = self._size >= 2 * ivf.trained
+            if not retrain and self._size - clustered < max(self.exact_max // 4, clustered // 8):
+                return
+        self._builder = threading.Thread(target=self._build, args=(self._generation,), daemon=True)
+        self._builder.start()
+
+    def _build(self, generation):
+        try:
+            with self._lock:
+                size = self._size
+                vectors, ids, bots, ivf = self._vectors[:size], self._ids[:size], self._bots[:size], self._ivf
+            if ivf is None or size >= 2 * ivf.trained:
+                centroids = _kmeans(vectors, min(int(np.sqrt(size)), MAX_LISTS))
+                labels = _assign(vectors, centroids)
+                trained = size
+            else:
+                # Keep the lists of clustered rows and only assign the tail
+                centroids, trained = ivf.centroids, ivf.trained
+                clustered = int(ivf.offsets[-1])
+                labels = np.concatenate((
+                    np.repeat(np.arange(len(centroids)), np.diff(ivf.offsets)),
+                    _assign(vectors[clustered:], centroids),
+                ))
+            order = np.argsort(labels, kind='stable')
+            offsets = np.searchsorted(labels[order], np.arange(len(centroids) + 1))
+            vectors, ids, bots = vectors[order], ids[order], bots[order]
+        except Exception:
+            logger.exception('Building the memory vector index failed')
+            return
+
+        with self._lock:
+            if generation != self._generation:
+                return
+            # Rows appended during the build stay in the tail
+            capacity = max(len(self._ids), self._size)
+            new_vectors = np.empty((capacity, self.dim), DTYPE)
+            new_ids = np.empty(capacity, np.int64)
+            new_bots = np.empty(capacity, np.int64)
+            new_vectors[:size], new_ids[:size], new_bots[:size] = vectors, ids, bots
+            new_vectors[size:self._size] = self._vectors[size:self._size]
+            new_ids[size:self._size] = self._ids[size:self._size]
+            new_bots[size:self._size] = self._bots[size:self._size]
+            self._vectors, self._ids, self._bots = new_vectors, new_ids, new_bots
+            self._ivf = Ivf(centroids, offsets, trained)
+
+    def wait_for_build(self, timeout=None):
+        """Block until the background build, if one is running, has finished"""
+        builder = self._builder
+        if builder is not None:
+            builder.join(timeout)
+
+    def search(self, query, limit, bot_ids=None):
+        """MemoryVectors ids and scores of the `limit` vectors closest to a unit `query`, best first"""
+        # A float64 query would make NumPy convert the whole matrix
+        query = np.asarray(query, DTYPE)
+        with self._lock:
+            size = self._size
+            vectors, ids, bots, ivf = self._vectors[:size], self._ids[:size], self._bots[:size], self._ivf
+        if bot_ids is not None:
+            rows = np.flatnonzero(np.isin(bots, bot_ids))
+            scores = vectors[rows] @ query
+        elif ivf is None:
+            rows = None
+            scores = vectors @ query
+        else:
+            probed = _top(ivf.centroids @ query, self.nprobe)
+            ranges = [(ivf.offsets[i], ivf.offsets[i + 1]) for i in probed] + [(ivf.offsets[-1], size)]
+            rows = np.concatenate([np.arange(start, end) for start, end in ranges])
+            scores = np.concatenate([vectors[start:end] @ query for start, end in ranges])
+        top = _top(scores, limit)
+        return ids[top if rows is None else rows[top]], scores[top]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(config):
+    """Return this process's memory vector index for the configured database"""
+    key = (os.getpid(), str(config['DATABASE']))
+    index = _indexes.get(key)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.setdefault(key, VectorIndex(
+                config['VECTOR_SIZE'], config['MEMORY_INDEX_EXACT_MAX'], config['MEMORY_INDEX_NPROBE']
+            ))
+    return index
+
+
+def search(db, index, query, limit, bot_ids=None):
+    """Memories most similar to a unit query vector, each with its checkpoint and cosine similarity"""
+    index.sync(db)
+    ids, scores = index.search(query, limit, bot_ids)
+    if not len(ids):
+        return []
+    rows = db.execute(
+        f'''
+        SELECT v.id, v.checkpoint_id, v.memory_index, c.bot_id, c.checkpoint_number
+        FROM MemoryVectors v JOIN Checkpoints c ON c.id = v.checkpoint_id
+        WHERE v.id IN ({', '.join('?' * len(ids))})
+        ''',
+        ids.tolist()
+    ).fetchall()
+    found = {row['id']: row for row in rows}
+    checkpoint_ids = sorted({row['checkpoint_id'] for row in rows})
+    checkpoints = content_store.hydrate(db, db.execute(
+        f"SELECT id, memories FROM Checkpoints WHERE id IN ({', '.join('?' * len(checkpoint_ids))})",
+        checkpoint_ids
+    ).fetchall(), ['memories']) if checkpoint_ids else []
+    memories = {checkpoint['id']: memory_list(checkpoint['memories']) for checkpoint in checkpoints}
+
+    hits = []
+    for vector_id, score in zip(ids.tolist(), scores.tolist()):
+        row = found.get(vector_id)
+        if row is None:
+            # Deleted since the index was synced
+            continue
+        entries = memories.get(row['checkpoint_id'], [])
+        hits.append({
+            'checkpoint_id': row['checkpoint_id'],
+            'bot_id': row['bot_id'],
+            'checkpoint_number': row['checkpoint_number'],
+            'memory_index': row['memory_index'],
+            'score': score,
+            'memory': entries[row['memory_index']] if row['memory_index'] < len(entries) else None,
+        })
+    return hits
+
+
+_qdrant_clients = {}
+
+
+def _qdrant(config):
+    """The Qdrant client for QDRANT_URL with the collection created, or None when mirroring is off"""
+    url = config['QDRANT_URL']
+    if not url:
+        return None
+    if QdrantClient is None:
+        raise RuntimeError('QDRANT_URL is set but the qdrant-client package is not installed')
+    key = (os.getpid(), url, config['QDRANT_COLLECTION_NAME'])
+    client = _qdrant_clients.get(key)
+    if client is None:
+        client = QdrantClient(url=url)
+        if not client.collection_exists(config['QDRANT_COLLECTION_NAME']):
+            client.create_collection(
+                config['QDRANT_COLLECTION_NAME'],
+                vectors_config=qdrant_models.VectorParams(
+                    size=config['VECTOR_SIZE'], distance=qdrant_models.Distance.COSINE
+                ),
+            )
+        client = _qdrant_clients.setdefault(key, client)
+    return client
+
+
+def _checkpoint_points(checkpoint_id):
+    return qdrant_models.FilterSelector(filter=qdrant_models.Filter(must=[
+        qdrant_models.FieldCondition(key='checkpoint_id', match=qdrant_models.MatchValue(value=checkpoint_id))
+    ]))
+
+
+def mirror(config, checkpoint_id, bot_id, vectors, replace=False):
+    """Upsert a checkpoint's committed memory vectors to Qdrant when QDRANT_URL is set"""
+    client = _qdrant(config)
+    if client is None:
+        return
+    collection = config['QDRANT_COLLECTION_NAME']
+    if replace:
+        client.delete(collection, points_selector=_checkpoint_points(checkpoint_id))
+    if len(vectors):
+        client.upsert(collection, points=[
+            qdrant_models.PointStruct(
+                id=str(uuid.uuid5(QDRANT_POINT_NAMESPACE, f'{checkpoint_id}:{i}')),
+                vector=vector.tolist(),
+                payload={'checkpoint_id': checkpoint_id, 'bot_id': bot_id, 'memory_index': i},
+            )
+            for i, vector in enumerate(vectors)
+        ])
+
+
+def unmirror(config, checkpoint_id):
+    """Remove a deleted checkpoint's memory vectors from Qdrant when QDRANT_URL is set"""
+    client = _qdrant(config)
+    if client is not None:
+        client.delete(config['QDRANT_COLLECTION_NAME'], points_selector=_checkpoint_points(checkpoint_id))
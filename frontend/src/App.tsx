@@ -22,12 +22,46 @@ import { ContextTab } from "@/components/ContextTab"
 import { PythonIDE } from "@/components/PythonIDE"
 
 // -- Import shared types --
-import { BotInfo, Message, ContextWindowData, Checkpoint, Stack, Session } from "@/types"
+import { BotInfo, Message, ContextWindowData, Checkpoint, CheckpointWithPayloads, Stack, Session, SearchHit } from "@/types"
 import { SessionTab } from "./components/SessionTab"
 
 // You can keep your utility functions and hooks within the same file, or create separate hooks:
 const WORKSPACE_URL = "http://127.0.0.1:5000/api/v1"
 
+// List endpoints are cursor-paginated; follow X-Next-Cursor until the last page
+const fetchAllPages = async <T,>(url: string): Promise<T[]> => {
+  const items: T[] = []
+  let cursor: string | null = null
+  do {
+    const separator = url.includes("?") ? "&" : "?"
+    const response = await fetch(cursor ? `${url}${separator}after=${cursor}` : url)
+    if (!response.ok) {
+      throw new Error(`Failed to fetch ${url}: ${response.status}`)
+    }
+    items.push(...(await response.json()))
+    cursor = response.headers.get("X-Next-Cursor")
+  } while (cursor)
+  return items
+}
+
+// Payloads arrive as JSON values; a payload whose stored text was not JSON stays a string
+const payloadList = <T,>(value: unknown): T[] => (Array.isArray(value) ? value : [])
+
+// The checkpoint list omits the heavy JSON payloads, so load them for the selected checkpoint
+const fetchCheckpointContext = async (botId: number, checkpointNumber: number): Promise<ContextWindowData> => {
+  const response = await fetch(`${WORKSPACE_URL}/bots/${botId}/checkpoints/${checkpointNumber}?payloads=json`)
+  if (!response.ok) {
+    throw new Error(`Failed to fetch checkpoint: ${response.status}`)
+  }
+  const checkpoint: CheckpointWithPayloads = await response.json()
+  return {
+    system_prompt: checkpoint.system_prompt,
+    datasets: payloadList(checkpoint.datasets),
+    memories: payloadList(checkpoint.memories),
+    messages: payloadList(checkpoint.session_history)
+  }
+}
+
 export default function App() {
   // --- Collapsible and Drawer State ---
   const [isSearchOpen, setIsSearchOpen] = React.useState(true)
@@ -76,7 +110,8 @@ export default function App() {
 
   // --- Search States ---
   const [searchTerm, setSearchTerm] = React.useState("")
-  const [searchType, setSearchType] = React.useState<"bot" | "stack">("bot")
+  const [searchType, setSearchType] = React.useState<"bot" | "stack" | "content">("bot")
+  const [searchHits, setSearchHits] = React.useState<SearchHit[] | null>(null)
 
   // --- System Prompt Preview toggles ---
   const [showFullText_default, setShowFullText_default] = React.useState(false)
@@ -94,11 +129,7 @@ export default function App() {
   React.useEffect(() => {
     const fetchBots = async () => {
       try {
-        const response = await fetch(`${WORKSPACE_URL}/bots`)
-        if (!response.ok) {
-          throw new Error(`Failed to fetch bots: ${response.status}`)
-        }
-        const data = await response.json()
+        const data = await fetchAllPages<BotInfo>(`${WORKSPACE_URL}/bots`)
         setAvailableBots(data)
       } catch (e) {
         console.error(e)
@@ -107,11 +138,7 @@ export default function App() {
 
     const fetchStacks = async () => {
       try {
-        const response = await fetch(`${WORKSPACE_URL}/stacks`)
-        if (!response.ok) {
-          throw new Error(`Failed to fetch stacks: ${response.status}`)
-        }
-        const data = await response.json()
+        const data = await fetchAllPages<Stack>(`${WORKSPACE_URL}/stacks`)
         setAvailableStacks(data)
       } catch (e) {
         console.error(e)
@@ -147,21 +174,56 @@ export default function App() {
     }
   };
 
+  // Words are searched on the server, which also looks inside prompts, checkpoints and transcripts
+  React.useEffect(() => {
+    const term = searchTerm.trim()
+    if (!term || /^\d+$/.test(term)) {
+      setSearchHits(null)
+      return
+    }
+    const kind = { bot: "bots", stack: "stacks", content: "checkpoints,messages" }[searchType]
+    const controller = new AbortController()
+    const timer = setTimeout(async () => {
+      try {
+        const params = new URLSearchParams({ q: term, kind, limit: "50" })
+        const response = await fetch(`${WORKSPACE_URL}/search?${params}`, { signal: controller.signal })
+        if (!response.ok) {
+          throw new Error(`Search failed: ${response.status}`)
+        }
+        setSearchHits(await response.json())
+      } catch (error) {
+        if (!controller.signal.aborted) {
+          console.error('Error searching:', error)
+        }
+      }
+    }, 250)
+    return () => {
+      clearTimeout(timer)
+      controller.abort()
+    }
+  }, [searchTerm, searchType])
+
   const filteredItems = React.useMemo(() => {
-    if (searchType === "bot") {
-      return availableBots.filter(
-        (bot) =>
-          bot.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-          bot.id.toString().includes(searchTerm)
-      )
-    } else {
-      return availableStacks.filter(
-        (stack) =>
-          stack.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-          stack.id.toString().includes(searchTerm)
+    const items: (BotInfo | Stack)[] = searchType === "stack" ? availableStacks : availableBots
+    if (searchHits === null) {
+      // Empty or numeric terms match by ID, as before
+      return items.filter(
+        (item) =>
+          item.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
+          item.id.toString().includes(searchTerm)
       )
     }
-  }, [searchTerm, searchType, availableBots, availableStacks])
+    const kind = searchType === "stack" ? "stacks" : "bots"
+    const byId = new Map(items.map((item) => [item.id, item]))
+    return searchHits
+      .filter((hit) => hit.kind === kind && byId.has(hit.id))
+      .map((hit) => byId.get(hit.id)!)
+  }, [searchTerm, searchType, searchHits, availableBots, availableStacks])
+
+  const contentHits = React.useMemo(
+    () => (searchHits ?? []).filter((hit) => hit.kind === "checkpoints" || hit.kind === "messages"),
+    [searchHits]
+  )
 
   // --- Edit/Save Handlers ---
   const handleEdit = (section: keyof typeof editMode) => {
@@ -173,7 +235,7 @@ export default function App() {
   }
 
   // --- Checkpoint Handlers ---
-  const handleSelectCheckpoint = (checkpointId: number) => {
+  const handleSelectCheckpoint = async (checkpointId: number) => {
     try{
       // Your existing logic...
       const newSelectedCheckpoint = checkpointId === selectedCheckpoint ? null : checkpointId;
@@ -184,12 +246,7 @@ export default function App() {
         setBotInfo(prev => ({ ...prev, system_prompt: cp?.system_prompt || "", model: cp?.model || "" }));
 
         if (cp) {
-          setContextWindowData({
-            system_prompt: cp.system_prompt,
-            datasets: cp.datasets ? JSON.parse(cp.datasets) : [],
-            memories: cp.memories ? JSON.parse(cp.memories) : [],
-            messages: cp.session_history ? JSON.parse(cp.session_history) : []
-          });
+          setContextWindowData(await fetchCheckpointContext(cp.bot_id, cp.checkpoint_number));
         }
       } else {
         setContextWindowData({
@@ -240,22 +297,13 @@ export default function App() {
       const botData = await botResponse.json();
       setBotInfo(botData);
 
-      const checkpointsResponse = await fetch(`${WORKSPACE_URL}/bots/${botData.id}/checkpoints`);
-      if (!checkpointsResponse.ok) {
-        throw new Error(`Failed to fetch checkpoints: ${checkpointsResponse.status}`);
-      }
-      const checkpointsData = await checkpointsResponse.json();
+      const checkpointsData = await fetchAllPages<Checkpoint>(`${WORKSPACE_URL}/bots/${botData.id}/checkpoints`);
       setCheckpoints(checkpointsData);
 
       if (checkpointsData.length > 0) {
         const firstCheckpoint: Checkpoint = checkpointsData[0];
         setSelectedCheckpoint(firstCheckpoint.checkpoint_number);
-        setContextWindowData({
-          system_prompt: firstCheckpoint.system_prompt,
-          datasets: firstCheckpoint.datasets ? JSON.parse(firstCheckpoint.datasets) : [],
-          memories: firstCheckpoint.memories ? JSON.parse(firstCheckpoint.memories) : [],
-          messages: firstCheckpoint.session_history ? JSON.parse(firstCheckpoint.session_history) : []
-        });
+        setContextWindowData(await fetchCheckpointContext(botData.id, firstCheckpoint.checkpoint_number));
         await startNewSession(botData.id);
       } else {
         setContextWindowData({
@@ -345,6 +393,7 @@ export default function App() {
             searchType={searchType}
             setSearchType={setSearchType}
             filteredItems={filteredItems}
+            contentHits={contentHits}
             selectedBot={selectedBot}
             handleSelectBot={handleSelectBot}
             selectedStack={selectedStack}
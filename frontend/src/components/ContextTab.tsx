@@ -13,6 +13,11 @@ import ReactMarkdown from "react-markdown"
 import remarkGfm from "remark-gfm"
 
 const WORKSPACE_URL = "http://127.0.0.1:5000/api/v1"
+const THUMBNAIL_WIDTH = 640
+// Matches IMAGE_BULK_MAX on the server
+const THUMBNAIL_BATCH_SIZE = 200
+// Thumbnails still rendering on the server are asked for again, at most this many times
+const THUMBNAIL_POLLS = 10
 
 interface ContextTabProps {
   contextWindowData: ContextWindowData
@@ -77,7 +82,7 @@ export function ContextTab({
   const [images, setImages] = React.useState<{ [key: string]: string | null }>({})
 
   // ---------------------------------------
-  // 3) Single useEffect to Fetch Images 
+  // 3) Single useEffect to Fetch Thumbnails
   //    whenever checkpoint (contextWindowData) changes
   // ---------------------------------------
   React.useEffect(() => {
@@ -85,27 +90,62 @@ export function ContextTab({
 
     const fetchImages = async () => {
       const newImages: { [key: string]: string | null } = {}
-      const allMessages = getAllMessages()
+      const fileNames: { [key: string]: string } = {}
 
-      for (const msg of allMessages) {
+      for (const msg of getAllMessages()) {
         if (Array.isArray(msg.images)) {
           for (const imgName of msg.images) {
-            const fileName = imgName.split(/[\\/]/).pop() || ""
-            try {
-              const res = await fetch(`${WORKSPACE_URL}/images/${fileName}`)
-              if (res.ok) {
-                const blob = await res.blob()
-                newImages[imgName] = URL.createObjectURL(blob)
-              } else {
-                console.error(`Failed to fetch image ${fileName}: ${res.statusText}`)
-              }
-            } catch (error) {
-              console.error(`Error fetching image ${fileName}:`, error)
+            fileNames[imgName] = imgName.split(/[\\/]/).pop() || ""
+          }
+        }
+      }
+
+      // The server resizes and caches thumbnails; fetch them in a few bulk requests
+      const names = [...new Set(Object.values(fileNames))]
+      const thumbnails: { [name: string]: string } = {}
+      const missing = new Set<string>()
+      for (let i = 0; i < names.length; i += THUMBNAIL_BATCH_SIZE) {
+        let batch = names.slice(i, i + THUMBNAIL_BATCH_SIZE)
+        // A 202 lists the thumbnails still rendering under "pending"; ask for those again after Retry-After
+        for (let poll = 0; batch.length > 0 && poll < THUMBNAIL_POLLS && isMounted; poll++) {
+          try {
+            const res = await fetch(`${WORKSPACE_URL}/images/thumbnails`, {
+              method: "POST",
+              headers: { "Content-Type": "application/json" },
+              body: JSON.stringify({ names: batch, w: THUMBNAIL_WIDTH }),
+            })
+            if (!res.ok) {
+              console.error(`Failed to fetch thumbnails: ${res.statusText}`)
+              break
+            }
+            const manifest = await res.json()
+            Object.entries(manifest.images).forEach(([name, image]: [string, any]) => {
+              thumbnails[name] = image.data
+            })
+            Object.keys(manifest.errors).forEach((name) => missing.add(name))
+            batch = manifest.pending ?? []
+            if (batch.length > 0) {
+              const retryAfter = Number(res.headers.get("Retry-After")) || 1
+              await new Promise((resolve) => setTimeout(resolve, retryAfter * 1000))
             }
+          } catch (error) {
+            console.error("Error fetching thumbnails:", error)
+            break
           }
         }
       }
 
+      for (const [imgName, fileName] of Object.entries(fileNames)) {
+        if (thumbnails[fileName]) {
+          newImages[imgName] = thumbnails[fileName]
+        } else if (missing.has(fileName)) {
+          newImages[imgName] = null
+        } else {
+          // Thumbnails unavailable (e.g. no Pillow on the server): use the original image
+          newImages[imgName] = `${WORKSPACE_URL}/images/${encodeURIComponent(fileName)}`
+        }
+      }
+
       if (isMounted) {
         setImages(newImages)
       }
@@ -113,14 +153,8 @@ export function ContextTab({
 
     fetchImages()
 
-    // Cleanup: Revoke all old object URLs on unmount
     return () => {
       isMounted = false
-      Object.values(images).forEach((url) => {
-        if (url) {
-          URL.revokeObjectURL(url)
-        }
-      })
     }
   }, [getAllMessages])
 
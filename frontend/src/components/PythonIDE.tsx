@@ -12,6 +12,8 @@ import AnsiToHtml from 'ansi-to-html'
 
 const WORKSPACE_URL = "http://127.0.0.1:5000/api/v1"
 const ansiConverter = new AnsiToHtml()
+// Characters of output kept in the terminal; older output scrolls away
+const MAX_OUTPUT_CHARS = 1_000_000
 
 // Basic templates
 const DEFAULT_TEMPLATES = {
@@ -49,7 +51,7 @@ export function PythonIDE() {
   const [output, setOutput] = React.useState("")
   const [isRunning, setIsRunning] = React.useState(false)
   const [selectedTemplate, setSelectedTemplate] = React.useState("blank")
-  const [scriptTemplates, setScriptTemplates] = React.useState<Record<string, { name: string; code: string }>>({})
+  const [scriptTemplates, setScriptTemplates] = React.useState<Record<string, { name: string; size: number; modified: string; etag: string }>>({})
   const [isLoading, setIsLoading] = React.useState(true)
   const [showOutput, setShowOutput] = React.useState(true)
 
@@ -80,43 +82,121 @@ export function PythonIDE() {
     fetchScripts()
   }, [])
 
-  const handleTemplateChange = (value: string) => {
+  const handleTemplateChange = async (value: string) => {
     setSelectedTemplate(value)
     if (value in DEFAULT_TEMPLATES) {
       setCode(DEFAULT_TEMPLATES[value as keyof typeof DEFAULT_TEMPLATES])
-    } else {
-      setCode(scriptTemplates[value]?.code || '')
+      return
+    }
+    // The catalog lists metadata only; bodies are fetched on demand and revalidated by ETag
+    try {
+      const response = await axios.get(`${WORKSPACE_URL}/python-ide/scripts/${encodeURIComponent(value)}`, {
+        responseType: 'text'
+      })
+      setCode(response.data)
+    } catch (error) {
+      console.error('Error fetching script:', error)
+      setCode('')
     }
   }
 
+  const eventSourceRef = React.useRef<EventSource | null>(null)
+  const jobIdRef = React.useRef<string | null>(null)
+
+  // Stop following a job's output when the IDE unmounts
+  React.useEffect(() => () => eventSourceRef.current?.close(), [])
+
   const handleRunCode = async () => {
     setIsRunning(true)
     setShowOutput(true) // Show output when running code
+    eventSourceRef.current?.close()
+    setOutput("")
+    let rawOutput = ""
+    const append = (text: string) => {
+      rawOutput += text
+      // Keep the terminal responsive for scripts that print megabytes
+      if (rawOutput.length > MAX_OUTPUT_CHARS) {
+        rawOutput = rawOutput.slice(rawOutput.length - MAX_OUTPUT_CHARS)
+      }
+      setOutput(ansiConverter.toHtml(rawOutput))
+    }
+
+    let jobId: string
     try {
-      const response = await axios.post(`${WORKSPACE_URL}/python-ide/run-python`, {
+      const response = await axios.post(`${WORKSPACE_URL}/python-ide/jobs`, {
         code: code
       })
-      
-      let outputText = response.data.output || ""
-      const errorText = response.data.error || ""
-      
-      if (errorText) {
-        outputText += "\n" + errorText
-      }
-      
-      // Convert ANSI codes to HTML
-      if (response.data.hasAnsiCodes) {
-        const htmlOutput = ansiConverter.toHtml(outputText)
-        setOutput(htmlOutput)
-      } else {
-        setOutput(outputText)
-      }
+      jobId = response.data.job_id
     } catch (error: any) {
       setOutput("Error running code: " + (error.response?.data?.error || error.message))
+      setIsRunning(false)
+      return
+    }
+    jobIdRef.current = jobId
+
+    // EventSource reconnects by itself and resumes after the last output it received
+    const source = new EventSource(`${WORKSPACE_URL}/python-ide/jobs/${jobId}/stream`)
+    eventSourceRef.current = source
+    const onOutput = (event: MessageEvent) => append(JSON.parse(event.data))
+    source.addEventListener("stdout", onOutput)
+    source.addEventListener("stderr", onOutput)
+    source.addEventListener("truncated", () => {
+      append("\n[earlier output was dropped]\n")
+    })
+    source.addEventListener("end", (event: MessageEvent) => {
+      const job = JSON.parse(event.data)
+      if (job.traceback) {
+        append("\n" + job.traceback)
+      } else if (job.error) {
+        append("\n" + job.error + "\n")
+      } else if (job.status === "cancelled") {
+        append("\n[cancelled]\n")
+      }
+      source.close()
+      jobIdRef.current = null
+      setIsRunning(false)
+    })
+    source.onerror = () => {
+      // CLOSED means the browser gave up reconnecting, e.g. the job no longer exists
+      if (source.readyState === EventSource.CLOSED) {
+        append("\nLost the connection to the script's output\n")
+        jobIdRef.current = null
+        setIsRunning(false)
+      }
     }
-    setIsRunning(false)
   }
 
+  const handleStopCode = async () => {
+    if (!jobIdRef.current) return
+    try {
+      await axios.post(`${WORKSPACE_URL}/python-ide/jobs/${jobIdRef.current}/cancel`)
+    } catch (error) {
+      // Already finished: the stream's end event resets the state
+      console.error('Error cancelling script:', error)
+    }
+  }
+
+  const RunButton = () => (
+    isRunning ? (
+      <Button
+        onClick={handleStopCode}
+        variant="destructive"
+        className="flex items-center gap-2"
+      >
+        <Loader2 className="h-4 w-4 animate-spin" />
+        Stop
+      </Button>
+    ) : (
+      <Button
+        onClick={handleRunCode}
+        className="flex items-center gap-2"
+      >
+        <Play className="h-4 w-4" />
+        Run Code
+      </Button>
+    )
+  )
+
   const OutputToggleButton = () => (
     <Button
       variant="outline"
@@ -150,23 +230,7 @@ export function PythonIDE() {
             </Select>
           </div>
           <div className="flex items-center gap-2">
-            <Button 
-              onClick={handleRunCode}
-              disabled={isRunning}
-              className="flex items-center gap-2"
-            >
-              {isRunning ? (
-                <>
-                  <Loader2 className="h-4 w-4 animate-spin" />
-                  Running...
-                </>
-              ) : (
-                <>
-                  <Play className="h-4 w-4" />
-                  Run Code
-                </>
-              )}
-            </Button>
+            <RunButton />
             <OutputToggleButton />
             <Dialog>
               <DialogTrigger asChild>
@@ -191,23 +255,7 @@ export function PythonIDE() {
                         ))}
                       </SelectContent>
                     </Select>
-                    <Button 
-                      onClick={handleRunCode}
-                      disabled={isRunning}
-                      className="flex items-center gap-2"
-                    >
-                      {isRunning ? (
-                        <>
-                          <Loader2 className="h-4 w-4 animate-spin" />
-                          Running...
-                        </>
-                      ) : (
-                        <>
-                          <Play className="h-4 w-4" />
-                          Run Code
-                        </>
-                      )}
-                    </Button>
+                    <RunButton />
                     <OutputToggleButton />
                   </div>
                 </DialogHeader>
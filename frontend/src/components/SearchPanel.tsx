@@ -14,16 +14,17 @@ import { Tabs, TabsContent, TabsList, TabsTrigger } from "@/components/ui/tabs"
 import { Input } from "@/components/ui/input"
 import { ScrollArea } from "@/components/ui/scroll-area"
 import { Button } from "@/components/ui/button"
-import { Stack, BotInfo } from "@/types"
+import { Stack, BotInfo, SearchHit } from "@/types"
 
 interface SearchPanelProps {
   isSearchOpen: boolean
   setIsSearchOpen: (open: boolean) => void
   searchTerm: string
   setSearchTerm: (term: string) => void
-  searchType: "bot" | "stack"
-  setSearchType: (type: "bot" | "stack") => void
+  searchType: "bot" | "stack" | "content"
+  setSearchType: (type: "bot" | "stack" | "content") => void
   filteredItems: (BotInfo | Stack)[]
+  contentHits: SearchHit[]
   selectedBot: BotInfo | null
   handleSelectBot: (botId: number) => void
   selectedStack: number | null
@@ -42,6 +43,7 @@ export function SearchPanel({
   searchType,
   setSearchType,
   filteredItems,
+  contentHits,
   selectedBot,
   handleSelectBot,
   selectedStack,
@@ -72,17 +74,18 @@ export function SearchPanel({
           <CardContent className="space-y-4">
             <Tabs
               defaultValue="bot"
-              onValueChange={(value) => setSearchType(value as "bot" | "stack")}
+              onValueChange={(value) => setSearchType(value as "bot" | "stack" | "content")}
             >
-              <TabsList className="grid w-full grid-cols-2">
+              <TabsList className="grid w-full grid-cols-3">
                 <TabsTrigger value="bot">Bots</TabsTrigger>
                 <TabsTrigger value="stack">Stacks</TabsTrigger>
+                <TabsTrigger value="content">Content</TabsTrigger>
               </TabsList>
 
               {/* Bots Tab */}
               <TabsContent value="bot">
                 <Input
-                  placeholder="Search bots by ID or Name..."
+                  placeholder="Search bots by ID, name, description or prompt..."
                   value={searchTerm}
                   onChange={(e) => setSearchTerm(e.target.value)}
                 />
@@ -123,7 +126,7 @@ export function SearchPanel({
               {/* Stacks Tab */}
               <TabsContent value="stack">
                 <Input
-                  placeholder="Search stacks by ID or Name..."
+                  placeholder="Search stacks by ID, name or description..."
                   value={searchTerm}
                   onChange={(e) => setSearchTerm(e.target.value)}
                 />
@@ -264,6 +267,45 @@ export function SearchPanel({
                   </Collapsible>
                 )}
               </TabsContent>
+
+              {/* Content Tab: checkpoints and session messages */}
+              <TabsContent value="content">
+                <Input
+                  placeholder="Search checkpoints and session transcripts..."
+                  value={searchTerm}
+                  onChange={(e) => setSearchTerm(e.target.value)}
+                />
+                <ScrollArea className="h-[500px] mt-4 border rounded p-2">
+                  {contentHits.length > 0 ? (
+                    contentHits.map((hit) => (
+                      <div
+                        key={`${hit.kind}-${hit.id}`}
+                        className="mb-4 last:mb-0 p-2 border rounded cursor-pointer transition-colors hover:bg-gray-50 dark:hover:bg-gray-800"
+                        onClick={() => hit.bot_id && handleSelectBot(hit.bot_id)}
+                      >
+                        <h3 className="font-bold text-sm text-gray-800 dark:text-gray-100">
+                          {hit.kind === "checkpoints"
+                            ? `Checkpoint #${hit.checkpoint_number}${hit.title ? ` · ${hit.title}` : ""}`
+                            : `Session ${hit.session_id}, message ${hit.seq}`}
+                          {" "}
+                          <span className="text-xs font-normal text-gray-500">(Bot {hit.bot_id})</span>
+                        </h3>
+                        {/* The server escapes snippets and only adds <mark> around matches */}
+                        <p
+                          className="text-sm text-gray-600 dark:text-gray-300 [&_mark]:bg-yellow-200 dark:[&_mark]:bg-yellow-700"
+                          dangerouslySetInnerHTML={{ __html: hit.snippet }}
+                        />
+                      </div>
+                    ))
+                  ) : (
+                    <p className="text-sm text-gray-500">
+                      {searchTerm.trim()
+                        ? "Nothing found. Try a different search term."
+                        : "Type to search checkpoints and session messages."}
+                    </p>
+                  )}
+                </ScrollArea>
+              </TabsContent>
             </Tabs>
           </CardContent>
         </CollapsibleContent>
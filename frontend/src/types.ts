@@ -43,9 +43,16 @@ export interface Message {
     created_at: string
     model: string
     system_prompt: string
-    datasets: string
-    memories: string
-    session_history: string
+    datasets?: string
+    memories?: string
+    session_history?: string
+  }
+  
+  // A checkpoint fetched with ?payloads=json: JSON payloads are values, or strings when the stored text is not JSON
+  export interface CheckpointWithPayloads extends Omit<Checkpoint, "datasets" | "memories" | "session_history"> {
+    datasets?: unknown
+    memories?: unknown
+    session_history?: unknown
   }
   
   export interface Session {
@@ -55,4 +62,17 @@ export interface Message {
     ended_at: string | null
     messages: string
   }
+  
+  // A hit from GET /api/v1/search; snippet is HTML-escaped with matches in <mark>
+  export interface SearchHit {
+    kind: "bots" | "stacks" | "checkpoints" | "messages"
+    id: number
+    bot_id?: number
+    title?: string
+    checkpoint_number?: number
+    session_id?: number
+    seq?: number
+    snippet: string
+    score: number
+  }
   
\ No newline at end of file